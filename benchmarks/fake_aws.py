@@ -0,0 +1,325 @@
+"""
+In-process stand-in for CloudFormation and S3.
+
+The backend answers the API calls of the boto clients from a `before-call` hook, before
+any request is built or sent, so that only brume's own work is measured. Each call waits
+for the simulated `latency`, and is throttled with the probability `throttle_rate`:
+throttled calls are retried with an exponential backoff, like botocore does, until they
+succeed or `max_attempts` is reached. Drift detections complete after a random time of up
+to `drift_time` seconds.
+"""
+
+import itertools
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+import boto3
+import pytz
+from botocore import xform_name
+from botocore.awsrequest import AWSResponse
+
+PAGE_SIZE = 100
+BACKOFF_BASE = 0.01
+BACKOFF_CAP = 1.0
+
+
+class FakeError(Exception):
+    """Error answered by the backend, as a ClientError of the client."""
+
+    def __init__(self, code, message, status_code=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+
+def _page(items, params, key):
+    start = int(params.get("NextToken") or 0)
+    page = {key: items[start:start + PAGE_SIZE]}
+    if start + PAGE_SIZE < len(items):
+        page["NextToken"] = str(start + PAGE_SIZE)
+    return page
+
+
+def _keep_params(params, context, **_kwargs):
+    """Keep the parameters of the call, `before-call` only gets the serialized request."""
+    context["fake_aws_params"] = dict(params)
+
+
+class FakeAWS:
+    """CloudFormation stacks and S3 buckets of a single account, in memory."""
+
+    def __init__(self, latency=0.0, throttle_rate=0.0, max_attempts=5, seed=0, drift_time=0.0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.max_attempts = max_attempts
+        self.drift_time = drift_time
+        self.stacks = {}
+        self.stack_names = {}
+        self.resources = {}
+        self.events = {}
+        self.resource_counts = {}
+        self.drifts = {}
+        self.detections = {}
+        self.buckets = set()
+        self.objects = {}
+        self.calls = Counter()
+        self.throttles = Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.session = None
+
+    def __enter__(self):
+        boto3.setup_default_session()
+        self.session = boto3.DEFAULT_SESSION
+        events = self.session.events
+        events.register("before-parameter-build", _keep_params, unique_id="fake-aws-params")
+        events.register("before-call", self.handle, unique_id="fake-aws")
+        return self
+
+    def __exit__(self, *_exc):
+        self.session.events.unregister("before-parameter-build", unique_id="fake-aws-params")
+        self.session.events.unregister("before-call", unique_id="fake-aws")
+        boto3.DEFAULT_SESSION = None
+
+    # State
+
+    def add_bucket(self, name):
+        self.buckets.add(name)
+
+    def add_stack(self, name, outputs=10, resources=20, breadth=0, depth=0, parent=None):
+        """Add a stack with `breadth` nested stacks on each of `depth` levels."""
+        stack_id = "arn:aws:cloudformation:eu-west-1:123456789012:stack/{}/{}".format(
+            name, uuid.uuid4()
+        )
+        now = datetime.now(pytz.utc)
+        description = dict(
+            StackId=stack_id,
+            StackName=name,
+            StackStatus="CREATE_COMPLETE",
+            CreationTime=now,
+            Parameters=[dict(ParameterKey="Name", ParameterValue=name)],
+            Outputs=[
+                dict(OutputKey="Output{}".format(i), OutputValue="{}-{}".format(name, i))
+                for i in range(outputs)
+            ],
+            Tags=[dict(Key="Benchmark", Value="true")],
+        )
+        if parent is not None:
+            description["ParentId"] = parent["StackId"]
+            description["RootId"] = parent.get("RootId", parent["StackId"])
+        self.stacks[stack_id] = description
+        self.stack_names[name] = stack_id
+        self.resource_counts[stack_id] = resources
+        self.events[stack_id] = []
+        self.resources[stack_id] = []
+        if depth > 0:
+            for i in range(breadth):
+                logical_id = "Nested{}".format(i)
+                child = self.add_stack(
+                    "{}-{}-{}".format(name, logical_id, uuid.uuid4().hex[:12].upper()),
+                    outputs,
+                    resources,
+                    breadth,
+                    depth - 1,
+                    description,
+                )
+                self.resources[stack_id].append(
+                    dict(
+                        LogicalResourceId=logical_id,
+                        PhysicalResourceId=child["StackId"],
+                        ResourceType="AWS::CloudFormation::Stack",
+                        ResourceStatus="CREATE_COMPLETE",
+                        LastUpdatedTimestamp=now,
+                    )
+                )
+        return description
+
+    def add_drift(self, name, logical_id, resource_type="AWS::SNS::Topic", status="MODIFIED"):
+        """Make a resource of the `name` stack drift."""
+        stack_id = self.stack_names[name]
+        self.drifts.setdefault(stack_id, []).append(
+            dict(
+                StackId=stack_id,
+                LogicalResourceId=logical_id,
+                PhysicalResourceId=logical_id,
+                ResourceType=resource_type,
+                StackResourceDriftStatus=status,
+                PropertyDifferences=[
+                    dict(
+                        PropertyPath="/DisplayName",
+                        ExpectedValue=logical_id,
+                        ActualValue="changed",
+                        DifferenceType="NOT_EQUAL",
+                    )
+                ]
+                if status == "MODIFIED"
+                else [],
+                Timestamp=datetime.now(pytz.utc),
+            )
+        )
+
+    def _stack(self, params):
+        name = params.get("StackName")
+        stack_id = self.stack_names.get(name, name)
+        if stack_id not in self.stacks:
+            raise FakeError("ValidationError", "Stack with id {} does not exist".format(name))
+        return self.stacks[stack_id]
+
+    # Dispatch
+
+    def handle(self, model, context, **_kwargs):
+        """Answer an API call: return the HTTP response and the parsed response."""
+        params = context["fake_aws_params"]
+        operation = "{}.{}".format(model.service_model.service_name, model.name)
+        method = getattr(
+            self,
+            "_{}_{}".format(model.service_model.service_name, xform_name(model.name)),
+            None,
+        )
+        with self.lock:
+            self.calls[operation] += 1
+        if method is None:
+            raise NotImplementedError(
+                "{} is not implemented by the fake backend".format(operation)
+            )
+        attempts = 0
+        for attempts in itertools.count():
+            time.sleep(self.latency)
+            with self.lock:
+                throttled = self.random.random() < self.throttle_rate
+            if not throttled:
+                break
+            with self.lock:
+                self.throttles[operation] += 1
+            if attempts + 1 >= self.max_attempts:
+                return self._response(
+                    400, dict(Error=dict(Code="Throttling", Message="Rate exceeded")), attempts
+                )
+            time.sleep(min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempts) * self.random.random())
+        try:
+            with self.lock:
+                parsed = method(params)
+        except FakeError as err:
+            return self._response(
+                err.status_code, dict(Error=dict(Code=err.code, Message=err.message)), attempts
+            )
+        return self._response(200, parsed, attempts)
+
+    @staticmethod
+    def _response(status_code, parsed, attempts):
+        parsed["ResponseMetadata"] = dict(HTTPStatusCode=status_code, RetryAttempts=attempts)
+        return AWSResponse("https://fake", status_code, {}, None), parsed
+
+    # CloudFormation
+
+    def _cloudformation_validate_template(self, _params):
+        return dict(Parameters=[], Description="")
+
+    def _cloudformation_describe_stacks(self, params):
+        if params.get("StackName"):
+            return dict(Stacks=[self._stack(params)])
+        return _page(sorted(self.stacks.values(), key=lambda s: s["StackName"]), params, "Stacks")
+
+    def _cloudformation_list_stack_resources(self, params):
+        resources = self.resources[self._stack(params)["StackId"]]
+        return _page(resources, params, "StackResourceSummaries")
+
+    def _cloudformation_describe_stack_resource(self, params):
+        stack = self._stack(params)
+        for resource in self.resources[stack["StackId"]]:
+            if resource["LogicalResourceId"] == params["LogicalResourceId"]:
+                return dict(StackResourceDetail=dict(resource, StackId=stack["StackId"]))
+        raise FakeError(
+            "ValidationError",
+            "Resource {} does not exist for stack {}".format(
+                params["LogicalResourceId"], stack["StackName"]
+            ),
+        )
+
+    def _cloudformation_describe_stack_events(self, params):
+        return _page(self.events[self._stack(params)["StackId"]], params, "StackEvents")
+
+    def _event(self, stack, logical_id, resource_type, status):
+        return dict(
+            EventId=str(uuid.uuid4()),
+            StackId=stack["StackId"],
+            StackName=stack["StackName"],
+            LogicalResourceId=logical_id,
+            PhysicalResourceId=logical_id,
+            ResourceType=resource_type,
+            ResourceStatus=status,
+            Timestamp=datetime.now(pytz.utc),
+        )
+
+    def _cloudformation_update_stack(self, params):
+        """Update the stack at once: every resource is updated before the call returns."""
+        stack = self._stack(params)
+        stack_type = "AWS::CloudFormation::Stack"
+        events = [self._event(stack, stack["StackName"], stack_type, "UPDATE_IN_PROGRESS")]
+        for i in range(self.resource_counts[stack["StackId"]]):
+            for status in ("UPDATE_IN_PROGRESS", "UPDATE_COMPLETE"):
+                events.append(
+                    self._event(stack, "Resource{}".format(i), "AWS::SNS::Topic", status)
+                )
+        events.append(self._event(stack, stack["StackName"], stack_type, "UPDATE_COMPLETE"))
+        self.events[stack["StackId"]] = list(reversed(events)) + self.events[stack["StackId"]]
+        stack["StackStatus"] = "UPDATE_COMPLETE"
+        stack["LastUpdatedTime"] = datetime.now(pytz.utc)
+        return dict(StackId=stack["StackId"])
+
+    def _cloudformation_detect_stack_drift(self, params):
+        stack = self._stack(params)
+        detection_id = str(uuid.uuid4())
+        self.detections[detection_id] = (
+            stack["StackId"],
+            time.monotonic() + self.drift_time * self.random.random(),
+        )
+        return dict(StackDriftDetectionId=detection_id)
+
+    def _cloudformation_describe_stack_drift_detection_status(self, params):
+        detection_id = params["StackDriftDetectionId"]
+        stack_id, ready_at = self.detections[detection_id]
+        status = dict(
+            StackId=stack_id,
+            StackDriftDetectionId=detection_id,
+            DetectionStatus="DETECTION_IN_PROGRESS",
+            Timestamp=datetime.now(pytz.utc),
+        )
+        if time.monotonic() >= ready_at:
+            drifted = len(self.drifts.get(stack_id, []))
+            status.update(
+                DetectionStatus="DETECTION_COMPLETE",
+                StackDriftStatus="DRIFTED" if drifted else "IN_SYNC",
+                DriftedStackResourceCount=drifted,
+            )
+        return status
+
+    def _cloudformation_describe_stack_resource_drifts(self, params):
+        drifts = [
+            d
+            for d in self.drifts.get(self._stack(params)["StackId"], [])
+            if d["StackResourceDriftStatus"]
+            in params.get("StackResourceDriftStatusFilters", [d["StackResourceDriftStatus"]])
+        ]
+        return _page(drifts, params, "StackResourceDrifts")
+
+    # S3
+
+    def _s3_head_bucket(self, params):
+        if params["Bucket"] not in self.buckets:
+            raise FakeError("404", "Not Found", 404)
+        return {}
+
+    def _s3_put_object(self, params):
+        if params["Bucket"] not in self.buckets:
+            raise FakeError("NoSuchBucket", "The specified bucket does not exist", 404)
+        body = params.get("Body") or b""
+        if hasattr(body, "read"):
+            body = body.read()
+        self.objects[(params["Bucket"], params["Key"])] = len(body)
+        return dict(ETag='"{}"'.format(uuid.uuid4().hex))
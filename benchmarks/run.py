@@ -0,0 +1,289 @@
+"""
+End-to-end benchmarks of the brume commands.
+
+Every scenario runs a real brume command (through click) in a generated project, against
+the in-process CloudFormation and S3 backend of `benchmarks.fake_aws`, and reports the
+number of API calls, the wall time and the peak memory of the command.
+
+    python -m benchmarks.run                         # run every scenario
+    python -m benchmarks.run -s deploy --latency 0.05 --throttle-rate 0.1
+    python -m benchmarks.run --save                  # store the results as the baselines
+    python -m benchmarks.run --compare               # fail on a regression from the baselines
+"""
+
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import click
+from benchmarks.fake_aws import FakeAWS
+from brume import cache, daemon, ratelimit
+from brume import template as template_module
+from brume.cli import cli
+from click.testing import CliRunner
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+STACK_NAME = "bench-stack"
+BUCKET = "bench-bucket"
+
+# scenario -> command and size of the project and of the stacks
+SCENARIOS = {
+    "deploy": dict(
+        args=["deploy"], templates=10, assets=20, breadth=3, depth=2, outputs=10, resources=50
+    ),
+    "upload": dict(args=["upload"], templates=30, assets=100),
+    "outputs": dict(args=["--cache-ttl", "0", "outputs"], breadth=4, depth=3, outputs=20),
+    "parameters": dict(args=["parameters"], breadth=4, depth=3),
+    "status-all": dict(args=["status", "--all"], stacks=500),
+    "outputs-all": dict(args=["outputs", "--all", "--format", "json"], stacks=2000, outputs=20),
+    "drift": dict(args=["drift"], breadth=7, depth=2, drifts=5, drift_time=1.0),
+}
+
+CONFIG = """region: eu-west-1
+stack:
+  stack_name: {stack_name}
+  template_body: templates/Main.yaml
+templates:
+  s3_bucket: {bucket}
+  s3_path: templates
+  local_path: templates
+assets:
+  s3_bucket: {bucket}
+  s3_path: assets
+  local_path: assets
+"""
+
+NESTED_STACK = """  {name}:
+    Type: AWS::CloudFormation::Stack
+    Properties:
+      TemplateURL: https://{bucket}.s3.amazonaws.com/templates/{name}.yaml
+"""
+
+NESTED_TEMPLATE = """Description: {name}
+Resources:
+  Topic:
+    Type: AWS::SNS::Topic
+"""
+
+
+def _scaled(value, scale):
+    return max(1, int(value * scale)) if value else 0
+
+
+def make_project(directory, templates=1, assets=0, **_sizes):
+    """Write a project with a main template nesting `templates - 1` templates."""
+    os.makedirs(os.path.join(directory, "templates"))
+    os.makedirs(os.path.join(directory, "assets"))
+    with open(os.path.join(directory, "brume.yml"), "w") as _file:
+        _file.write(CONFIG.format(stack_name=STACK_NAME, bucket=BUCKET))
+    names = ["Nested{}".format(i) for i in range(templates - 1)]
+    with open(os.path.join(directory, "templates", "Main.yaml"), "w") as _file:
+        _file.write("Resources:\n")
+        for name in names:
+            _file.write(NESTED_STACK.format(name=name, bucket=BUCKET))
+        if not names:
+            _file.write("  Topic:\n    Type: AWS::SNS::Topic\n")
+    for name in names:
+        with open(os.path.join(directory, "templates", name + ".yaml"), "w") as _file:
+            _file.write(NESTED_TEMPLATE.format(name=name))
+    for i in range(assets):
+        with open(os.path.join(directory, "assets", "asset{}.sh".format(i)), "w") as _file:
+            _file.write("#!/bin/sh\necho {}\n".format(i) * 20)
+
+
+def make_backend(
+    backend, stacks=0, breadth=0, depth=0, outputs=10, resources=20, drifts=0, **_sizes
+):
+    """
+    Create the bucket, the stack of the project with `drifts` drifted resources and
+    `stacks` other stacks.
+    """
+    backend.add_bucket(BUCKET)
+    backend.add_stack(STACK_NAME, outputs, resources, breadth, depth)
+    for i in range(drifts):
+        backend.add_drift(STACK_NAME, "Resource{}".format(i))
+    for i in range(stacks):
+        backend.add_stack("bench-other-{:05d}".format(i), outputs, resources)
+
+
+def _invoke(args):
+    """Run a brume command as a new process would: without any warm state."""
+    daemon.reset()
+    ratelimit.reset()
+    template_module._parsed.clear()  # pylint: disable=protected-access
+    template_module._validations.clear()  # pylint: disable=protected-access
+    result = CliRunner().invoke(cli, args, catch_exceptions=False)
+    if result.exit_code != 0:
+        click.secho(result.output, err=True)
+        raise click.ClickException(
+            "brume {} exited with {}".format(" ".join(args), result.exit_code)
+        )
+
+
+def run_scenario(name, latency=0.0, throttle_rate=0.0, scale=1.0, repeat=3):
+    """Run a scenario `repeat` times, return its API calls, wall time and peak memory."""
+    sizes = {
+        k: (_scaled(v, scale) if k in ("templates", "assets", "stacks", "resources") else v)
+        for k, v in SCENARIOS[name].items()
+    }
+    directory = tempfile.mkdtemp()
+    cwd, cache_directory = os.getcwd(), cache.directory
+    durations = []
+    try:
+        project = os.path.join(directory, "project")
+        make_project(project, **sizes)
+        os.chdir(project)
+        for run in range(repeat + 1):
+            cache.directory = os.path.join(directory, "cache-{}".format(run))
+            with FakeAWS(
+                latency=latency,
+                throttle_rate=throttle_rate,
+                drift_time=sizes.get("drift_time", 0.0),
+            ) as backend:
+                make_backend(backend, **sizes)
+                if run < repeat:
+                    start = time.perf_counter()
+                    _invoke(sizes["args"])
+                    durations.append(time.perf_counter() - start)
+                else:
+                    # memory is traced in a separate run, tracing slows the command down
+                    tracemalloc.start()
+                    _invoke(sizes["args"])
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+    finally:
+        os.chdir(cwd)
+        cache.directory = cache_directory
+        shutil.rmtree(directory)
+    return dict(
+        api_calls=sum(backend.calls.values()),
+        calls=dict(sorted(backend.calls.items())),
+        throttles=sum(backend.throttles.values()),
+        wall_time=statistics.median(durations),
+        peak_memory=peak,
+        settings=dict(latency=latency, throttle_rate=throttle_rate, scale=scale),
+    )
+
+
+def compare(name, result, baseline, tolerance):
+    """Return the regressions of `result` from `baseline`."""
+    if result["settings"] != baseline.get("settings"):
+        click.secho(
+            "[WARNING] {}: the baseline was run with other settings {}, not compared".format(
+                name, baseline.get("settings")
+            ),
+            err=True,
+            fg="yellow",
+        )
+        return []
+    regressions = []
+    if result["api_calls"] > baseline["api_calls"]:
+        regressions.append(
+            "{}: {} API calls instead of {}".format(
+                name, result["api_calls"], baseline["api_calls"]
+            )
+        )
+    for metric in ("wall_time", "peak_memory"):
+        if result[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append(
+                "{}: {} {:.3f} is {:.0%} above the baseline {:.3f}".format(
+                    name,
+                    metric,
+                    result[metric],
+                    result[metric] / baseline[metric] - 1,
+                    baseline[metric],
+                )
+            )
+    return regressions
+
+
+def print_results(results):
+    click.echo(
+        "{:<12} {:>9} {:>9} {:>10} {:>12}".format(
+            "SCENARIO", "API CALLS", "THROTTLES", "WALL TIME", "PEAK MEMORY"
+        )
+    )
+    for name, result in results.items():
+        click.echo(
+            "{:<12} {:>9} {:>9} {:>9.3f}s {:>10.1f}MB".format(
+                name,
+                result["api_calls"],
+                result["throttles"],
+                result["wall_time"],
+                result["peak_memory"] / 1024.0 / 1024.0,
+            )
+        )
+
+
+@click.command()
+@click.option(
+    "-s",
+    "--scenario",
+    "scenarios",
+    multiple=True,
+    type=click.Choice(sorted(SCENARIOS)),
+    help="Scenario to run (defaults to every scenario).",
+)
+@click.option("--latency", type=float, default=0.0, help="Simulated latency of the API calls.")
+@click.option(
+    "--throttle-rate", type=float, default=0.0, help="Probability of an API call to be throttled."
+)
+@click.option("--scale", type=float, default=1.0, help="Multiply the sizes of the scenarios.")
+@click.option("--repeat", type=int, default=3, help="Number of timed runs of each scenario.")
+@click.option("-o", "--output", default=None, help="Write the results as JSON to this file.")
+@click.option("--save", is_flag=True, help="Store the results as the baselines.")
+@click.option("--compare", "compare_baselines", is_flag=True, help="Compare with the baselines.")
+@click.option(
+    "--tolerance",
+    type=float,
+    default=0.5,
+    help="Tolerated increase of the wall time and peak memory when comparing.",
+)
+def main(
+    scenarios, latency, throttle_rate, scale, repeat, output, save, compare_baselines, tolerance
+):
+    """Benchmark the brume commands against a simulated CloudFormation and S3."""
+    os.environ.update(
+        AWS_ACCESS_KEY_ID="benchmark",
+        AWS_SECRET_ACCESS_KEY="benchmark",
+        AWS_DEFAULT_REGION="eu-west-1",
+    )
+    results = {
+        name: run_scenario(name, latency, throttle_rate, scale, repeat)
+        for name in scenarios or sorted(SCENARIOS)
+    }
+    print_results(results)
+    if output:
+        with open(output, "w") as _file:
+            json.dump(results, _file, indent=2, sort_keys=True)
+    if save:
+        baselines = {}
+        if os.path.isfile(BASELINES):
+            with open(BASELINES, "r") as _file:
+                baselines = json.load(_file)
+        baselines.update(results)
+        with open(BASELINES, "w") as _file:
+            json.dump(baselines, _file, indent=2, sort_keys=True)
+            _file.write("\n")
+    if compare_baselines:
+        with open(BASELINES, "r") as _file:
+            baselines = json.load(_file)
+        regressions = [
+            regression
+            for name, result in results.items()
+            if name in baselines
+            for regression in compare(name, result, baselines[name], tolerance)
+        ]
+        for regression in regressions:
+            click.secho("[ERROR] {}".format(regression), err=True, fg="red")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,182 @@
+"""
+Asyncio engine of the AWS API calls.
+
+With `--engine asyncio` (or `$BRUME_ENGINE`), the walk of the nested stacks for their
+outputs and the bulk export of outputs and parameters run as coroutines on a single
+event loop, instead of pools of threads: every stack of a level, and every region,
+is requested at once, up to `MAX_IN_FLIGHT` concurrent calls.
+
+The calls are sent with aiobotocore when it is installed (`pip install brume[async]`).
+Otherwise the clients of `brume.boto_client` are used from a pool of
+`FALLBACK_MAX_WORKERS` threads, with the same coroutines.
+
+This module requires Python 3.7: it is only imported once the engine is selected.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from brume import profiling, ratelimit
+from brume.boto_client import boto_client
+from brume.export import stack_record
+from brume.inventory import stack_matches
+
+try:
+    from aiobotocore.session import get_session
+except ImportError:
+    get_session = None
+
+MAX_IN_FLIGHT = 256
+FALLBACK_MAX_WORKERS = 32
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _threads():
+    global _executor  # pylint: disable=global-statement
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FALLBACK_MAX_WORKERS)
+        return _executor
+
+
+class ThreadedClient:
+    """Client of `brume.boto_client` whose calls are awaited from the threads of a pool."""
+
+    def __init__(self, client):
+        self.client = client
+        self.meta = client.meta
+
+    async def call(self, operation, **kwargs):
+        method = partial(getattr(self.client, operation), **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(_threads(), method)
+
+
+@asynccontextmanager
+async def client(service, region=None):
+    """Yield an asynchronous client of `service` in `region`."""
+    if get_session is None:
+        yield ThreadedClient(boto_client(service, region))
+        return
+    async with get_session().create_client(service, region_name=region) as native:
+        ratelimit.instrument(native, acquire=False)
+        if profiling.enabled:
+            profiling.instrument(native)
+        yield native
+
+
+async def _acquire(native, operation):
+    """Wait for a token of the rate limiter without blocking the event loop."""
+    limiter = ratelimit.bucket(
+        native.meta.service_model.service_name, native.meta.method_to_api_mapping[operation]
+    )
+    if not ratelimit.enabled or limiter is None:
+        return
+    wait = limiter.try_acquire(ratelimit.current_priority())
+    while wait:
+        await asyncio.sleep(wait)
+        wait = limiter.try_acquire(ratelimit.current_priority())
+
+
+async def call(aws_client, operation, **kwargs):
+    """Call `operation` (e.g. `describe_stacks`) with an asynchronous client."""
+    if isinstance(aws_client, ThreadedClient):
+        return await aws_client.call(operation, **kwargs)
+    await _acquire(aws_client, operation)
+    return await getattr(aws_client, operation)(**kwargs)
+
+
+async def paginate(aws_client, operation, result_key, **kwargs):
+    """Yield the `result_key` items of every page of `operation`, following the NextToken."""
+    while True:
+        page = await call(aws_client, operation, **kwargs)
+        for item in page.get(result_key, []):
+            yield item
+        if not page.get("NextToken"):
+            return
+        kwargs["NextToken"] = page["NextToken"]
+
+
+async def _walk(cfn, outputs, stack, collector, semaphore):
+    async with semaphore:
+        description = (await call(cfn, "describe_stacks", StackName=stack))["Stacks"][0]
+        collector(outputs, description)
+        resources = [
+            s
+            async for s in paginate(
+                cfn, "list_stack_resources", "StackResourceSummaries", StackName=stack
+            )
+            if s["ResourceType"] == "AWS::CloudFormation::Stack"
+        ]
+    await asyncio.gather(
+        *(
+            _walk(
+                cfn,
+                outputs.setdefault(s["LogicalResourceId"], {}),
+                s["PhysicalResourceId"],
+                collector,
+                semaphore,
+            )
+            for s in resources
+        )
+    )
+
+
+def walk_stacks(region, outputs, stack, collector):
+    """
+    Map `collector` (outputs, description) on `stack` and its nested stacks, the nested
+    stacks being collected under their logical id, and return the aggregated `outputs`.
+
+    Every nested stack is requested as soon as its parent is described.
+    """
+
+    async def _main():
+        async with client("cloudformation", region) as cfn:
+            await _walk(cfn, outputs, stack, collector, asyncio.Semaphore(MAX_IN_FLIGHT))
+
+    run(_main())
+    return outputs
+
+
+async def _export_region(put, region, kind, prefix, tags, nested, done):
+    try:
+        async with client("cloudformation", region) as cfn:
+            async for stack in paginate(cfn, "describe_stacks", "Stacks"):
+                if stack_matches(stack, prefix, tags, nested):
+                    await put(stack_record(region, stack, kind))
+    except Exception as err:  # pylint: disable=broad-except
+        await put(err)
+    finally:
+        await put(done)
+
+
+def export_regions(records, regions, kind, prefix, tags, nested, done):
+    """
+    Put the export record of every stack of `regions` matching `prefix` and `tags` in the
+    `records` queue, an error in place of the records of a failed region, then `done`
+    once per region.
+
+    The records are put from the default executor of the loop: a full queue only
+    suspends the coroutine of its region, never the event loop.
+    """
+
+    async def _main():
+        loop = asyncio.get_running_loop()
+
+        def put(item):
+            return loop.run_in_executor(None, records.put, item)
+
+        await asyncio.gather(
+            *(_export_region(put, r, kind, prefix, tags, nested, done) for r in regions)
+        )
+
+    run(_main())
+
+
+def run(coroutine):
+    """Run `coroutine` on a new event loop and return its result."""
+    return asyncio.run(coroutine)
@@ -8,19 +8,38 @@ import os
 
 import click
 import crayons
-from brume.boto_client import s3_client
+from brume import profiling, transfer
 
 
-def send_assets(region, local_path, s3_bucket, s3_path=""):
+def asset_keys(local_path, s3_path=""):
     """
-    Send directory '{local_path}' under 's3://{s3_bucket}/{s3_path}'.
+    Yield the path of every file of directory '{local_path}' and its key under '{s3_path}'.
     """
     for (dirpath, _dirnames, filenames) in os.walk(local_path):
         for filename in filenames:
             sourcepath = os.path.join(dirpath, filename)
-            key = s3_path + "/" + os.path.relpath(sourcepath, local_path)
+            yield sourcepath, s3_path + "/" + os.path.relpath(sourcepath, local_path)
+
+
+@profiling.timed("assets")
+def send_assets(region, local_path, s3_bucket, s3_path="", cancelled=None):
+    """
+    Send directory '{local_path}' under 's3://{s3_bucket}/{s3_path}'.
+
+    The remaining files are not sent once the `cancelled` event is set.
+    """
+    for sourcepath, key in asset_keys(local_path, s3_path):
+        if cancelled is not None and cancelled.is_set():
+            click.echo("Cancelled the upload of the remaining assets")
+            return
+        with click.open_file(sourcepath, "rb") as asset:
+            body = asset.read()
+        if transfer.uploaded(region, s3_bucket, key, body):
             click.echo(
-                "Publishing {} to {}".format(crayons.yellow(sourcepath), s3_bucket + "/" + key)
+                "{} is already published to {}".format(
+                    crayons.yellow(sourcepath), s3_bucket + "/" + key
+                )
             )
-            with click.open_file(sourcepath) as asset:
-                s3_client(region).put_object(Bucket=s3_bucket, Body=asset.read(), Key=key)
+            continue
+        click.echo("Publishing {} to {}".format(crayons.yellow(sourcepath), s3_bucket + "/" + key))
+        transfer.put_object(region, s3_bucket, key, body)
@@ -1,14 +1,88 @@
 """Boto clients."""
 
+import os
+import threading
+
 import boto3
+import click
 from botocore.exceptions import ClientError
+from brume import profiling, ratelimit
+
+ENGINES = ["threads", "asyncio"]
+# brume.aio runs on asyncio features of Python 3.7
+ASYNCIO_MIN_VERSION = (3, 7)
+
+# keep the clients of every service and region for the lifetime of the process (brume serve)
+cache_clients = False
+
+# engine of the concurrent AWS API calls, set by the --engine option
+engine = "threads"
+
+_clients = {}
+_sessions = {}
+_accounts = {}
+_lock = threading.Lock()
+
+
+def uses_asyncio():
+    """Return True if the asyncio engine (`brume.aio`) is selected."""
+    return engine == "asyncio"
+
+
+def identity():
+    """Return the AWS profile and access key of the current credentials."""
+    return os.getenv("AWS_PROFILE"), os.getenv("AWS_ACCESS_KEY_ID")
+
+
+def _session():
+    """Return the boto session for the current AWS profile and credentials."""
+    current = identity()
+    if current not in _sessions:
+        _sessions[current] = boto3.session.Session()
+    return current, _sessions[current]
 
 
 def boto_client(service, region=None):
     """
     Instanciate boto client for specified service and region
     """
-    return boto3.client(service, region_name=region)
+    if cache_clients:
+        with _lock:
+            current, session = _session()
+            key = (service, region) + current
+            if key not in _clients:
+                _clients[key] = session.client(service, region_name=region)
+            client = _clients[key]
+    else:
+        client = boto3.client(service, region_name=region)
+    ratelimit.instrument(client)
+    if profiling.enabled:
+        profiling.instrument(client)
+    return client
+
+
+def account_id():
+    """Return the id of the AWS account of the current credentials, fetched once per identity."""
+    current = identity()
+    with _lock:
+        account = _accounts.get(current)
+    if account is None:
+        account = boto_client("sts").get_caller_identity()["Account"]
+        with _lock:
+            _accounts[current] = account
+    return account
+
+
+def does_not_exist(error):
+    """Return True if a ClientError reports that the stack (or resource) does not exist."""
+    return "does not exist" in error.response["Error"]["Message"]
+
+
+def exit_if_stack_missing(error, stack):
+    """Exit with an error message if a ClientError reports that `stack` does not exist."""
+    if does_not_exist(error):
+        click.secho("Stack [{}] does not exist".format(stack), err=True, fg="red")
+        exit(1)
 
 
 def cfn_client(region):
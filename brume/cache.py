@@ -0,0 +1,66 @@
+"""
+On-disk cache shared across brume invocations.
+
+Entries are JSON files stored under `directory`, valid for `ttl` seconds.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_CACHE_TTL = 300
+directory = None
+ttl = DEFAULT_CACHE_TTL
+
+# bypass the cached entries, they are refreshed
+refresh = False
+
+
+def configure():
+    """Read the cache directory and the lifetime of its entries from the environment."""
+    global directory, ttl  # pylint: disable=global-statement,invalid-name
+    directory = os.getenv(
+        "BRUME_CACHE_DIR",
+        os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "brume"),
+    )
+    ttl = int(os.getenv("BRUME_CACHE_TTL", str(DEFAULT_CACHE_TTL)))
+
+
+configure()
+
+
+def _path(namespace, keys):
+    digest = hashlib.sha1(json.dumps(keys, default=str).encode("utf-8")).hexdigest()
+    return os.path.join(directory, namespace, digest + ".json")
+
+
+def get(namespace, *keys):
+    """Return the value cached under `keys`, or None if it is missing or expired."""
+    if refresh or ttl <= 0:
+        return None
+    try:
+        with open(_path(namespace, keys), "r") as _file:
+            entry = json.load(_file)
+    except (IOError, ValueError):
+        return None
+    if time.time() - entry["cached_at"] > ttl:
+        return None
+    return entry["value"]
+
+
+def put(namespace, value, *keys):
+    """Cache `value` under `keys`."""
+    if ttl <= 0:
+        return value
+    path = _path(namespace, keys)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as _file:
+            json.dump({"cached_at": time.time(), "keys": keys, "value": value}, _file, default=str)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        pass
+    return value
@@ -3,17 +3,29 @@ Brume CLI module.
 """
 
 import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from glob import glob
 from os import path
 
 import click
-from brume import VERSION, config
+import crayons
+from brume import VERSION, cache, config, daemon, events, gc, lock, profiling, snapshot
+from brume import boto_client, transfer
 from brume.assets import send_assets
 from brume.boto_client import bucket_exists
 from brume.checker import check_templates
+from brume.dashboard import status_dashboard
+from brume.drift import detect_drift, print_drift_report
+from brume.export import dump_yaml, export_stacks
+from brume.inventory import parse_tags
+from brume.parallel import run_concurrently
+from brume.project import Project, is_project
 from brume.stack import Stack
-from brume.template import Template
-from yaml import safe_dump
+from brume.teardown import delete_stacks, parse_age, stacks_to_delete
+from brume import template as template_module
+from brume.template import Template, reachable_templates
 
 
 class Context:
@@ -24,6 +36,7 @@ class Context:
     def __init__(self):
         self.config = dict()
         self.stack = None
+        self.project = None
         self.debug = False
         self.region = None
 
@@ -34,16 +47,119 @@ pass_ctx = click.make_pass_decorator(Context, ensure=True)
 def config_callback(ctx, _, value):
     """
     Initialize context object
+
+    Loading the configuration is left to the `cli` callback when the configuration file
+    does not exist, since some commands do not need one (`brume serve`).
     """
-    ctx = ctx.ensure_object(Context)
     config.configuration_file = value
+    if config.lock is not None or path.isfile(config.brume_config_file()):
+        load_context(ctx)
+    return value
+
+
+def load_context(ctx):
+    """Load the configuration and the stack or project into the context object."""
+    ctx = ctx.ensure_object(Context)
     ctx.config = config.Config.load()
     if ctx.region is None:
         ctx.region = ctx.config["region"]
-    ctx.stack = Stack(ctx.region, ctx.config["stack"])
+    if is_project(ctx.config):
+        ctx.project = Project(ctx.region, ctx.config)
+    else:
+        ctx.stack = Stack(ctx.region, ctx.config["stack"])
+
+
+def via_daemon_callback(ctx, _, value):
+    """Forward the command to the daemon started with `brume serve`."""
+    if value:
+        ctx.exit(daemon.forward([arg for arg in sys.argv[1:] if arg != "--via-daemon"]))
+    return value
+
+
+def refresh_callback(_ctx, _, value):
+    """Bypass the cached stack outputs."""
+    cache.refresh = value
+    return value
+
+
+def all_templates_callback(_ctx, _, value):
+    """Select every template instead of the templates reachable from the main templates."""
+    template_module.reachable_only = not value
+    return value
+
+
+def lock_callback(_ctx, _, value):
+    """Load the configuration from a lock file."""
+    if value is not None:
+        config.lock = lock.load(value)
+    return value
+
+
+def snapshot_callback(_ctx, _, value):
+    """Resolve outputs and parameters from a snapshot of the region."""
+    snapshot.enabled = value
+    return value
+
+
+def engine_callback(_ctx, _, value):
+    """Select the engine of the concurrent AWS API calls."""
+    if value == "asyncio" and sys.version_info < boto_client.ASYNCIO_MIN_VERSION:
+        click.secho("[ERROR] The asyncio engine requires Python 3.7 or later", err=True, fg="red")
+        exit(1)
+    boto_client.engine = value
+    return value
+
+
+def journal_callback(_ctx, _, value):
+    """Record the uploads in a transfer journal to resume them."""
+    transfer.journal_path = value
+    return value
+
+
+def profile_callback(ctx, _, value):
+    """Record the time spent in each phase and the AWS API calls of the command."""
+    if value and not profiling.enabled:
+        profiling.enable(value if isinstance(value, str) else None)
+        ctx.call_on_close(profiling.report)
+    elif isinstance(value, str):
+        profiling.enable(value)
+    return value
+
+
+def cache_ttl_callback(_ctx, _, value):
+    """Set the lifetime of the cached stack outputs."""
+    if value is not None:
+        cache.ttl = value
     return value
 
 
+PIPELINE_MAX_WORKERS = 8
+
+# commands that do not need a configuration file
+CONFIG_FREE_COMMANDS = ["serve"]
+
+# commands that can operate on every stack of a multi-stack project
+PROJECT_COMMANDS = [
+    "config",
+    "deploy",
+    "validate",
+    "upload",
+    "check",
+    "status",
+    "outputs",
+    "parameters",
+    "delete",
+    "gc",
+    "freeze",
+]
+
+
+def exit_no_stack_selected():
+    """Exit when a command needs a single stack and none is selected in a project."""
+    click.secho("[ERROR] Select a stack of the project with --stack", err=True, fg="red")
+    exit(1)
+
+
 @click.group()
 @click.version_option(VERSION, "-v", "--version")
 @click.help_option("-h", "--help")
@@ -55,16 +171,130 @@ def config_callback(ctx, _, value):
     help="Configuration file (defaults to {}).".format(config.DEFAULT_BRUME_CONFIG),
     callback=config_callback,
 )
-def cli():
+@click.option(
+    "--via-daemon",
+    is_flag=True,
+    is_eager=True,
+    expose_value=False,
+    callback=via_daemon_callback,
+    help="Run the command on the daemon started with `brume serve`.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    is_eager=True,
+    expose_value=False,
+    callback=profile_callback,
+    help="Print the time spent in each phase and the AWS API calls on stderr.",
+)
+@click.option(
+    "--profile-out",
+    is_eager=True,
+    expose_value=False,
+    callback=profile_callback,
+    help="Also write a JSON trace (.json) or a cProfile dump (any other extension) "
+    "to this file, implies --profile.",
+)
+@click.option(
+    "--refresh",
+    is_flag=True,
+    is_eager=True,
+    expose_value=False,
+    callback=refresh_callback,
+    help="Ignore cached stack outputs and fetch them again.",
+)
+@click.option(
+    "--cache-ttl",
+    type=int,
+    is_eager=True,
+    expose_value=False,
+    callback=cache_ttl_callback,
+    help="Lifetime of cached stack outputs in seconds, 0 disables the cache "
+    "(defaults to {}).".format(cache.DEFAULT_CACHE_TTL),
+)
+@click.option(
+    "--all-templates",
+    is_flag=True,
+    expose_value=False,
+    callback=all_templates_callback,
+    help="Validate and upload every template of templates.local_path, even unused ones.",
+)
+@click.option(
+    "--from-lock",
+    is_eager=True,
+    expose_value=False,
+    callback=lock_callback,
+    help="Load the configuration resolved by `brume freeze` from this lock file.",
+)
+@click.option(
+    "--snapshot",
+    is_flag=True,
+    is_eager=True,
+    expose_value=False,
+    callback=snapshot_callback,
+    help="Resolve outputs and parameters from a snapshot of every stack of the region.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(boto_client.ENGINES),
+    default="threads",
+    envvar="BRUME_ENGINE",
+    is_eager=True,
+    expose_value=False,
+    callback=engine_callback,
+    help="Run the concurrent AWS API calls on threads or on an asyncio event loop "
+    "(defaults to threads).",
+)
+@click.option(
+    "--journal",
+    envvar="BRUME_JOURNAL",
+    is_eager=True,
+    expose_value=False,
+    callback=journal_callback,
+    help="Record the uploads in this transfer journal, to skip or resume them when "
+    "the command is run again.",
+)
+@click.option(
+    "-s",
+    "--stack",
+    "stack_key",
+    default=None,
+    help="Stack of a multi-stack project to operate on.",
+)
+@click.option(
+    "--events-out",
+    default=None,
+    help="Write stack events as NDJSON to this file (- for stdout, the other messages "
+    "then go to stderr).",
+)
+@click.option(
+    "--human-events/--no-human-events",
+    default=True,
+    help="Print stack events as a table (disabled when events are written to stdout).",
+)
+@pass_ctx
+def cli(ctx, stack_key, events_out, human_events):
     """Set global cli option"""
-    pass
+    events.configure(events_out, human_events)
+    click.get_current_context().call_on_close(events.close)
+    invoked_subcommand = click.get_current_context().invoked_subcommand
+    if not ctx.config and invoked_subcommand not in CONFIG_FREE_COMMANDS:
+        load_context(click.get_current_context())
+    if ctx.project is None:
+        return
+    if stack_key:
+        ctx.stack = ctx.project.select(stack_key)
+        # rendered again with the outputs of the dependencies of the stack
+        ctx.config = config.Config.config
+    elif invoked_subcommand not in PROJECT_COMMANDS + CONFIG_FREE_COMMANDS:
+        exit_no_stack_selected()
 
 
 @cli.command("config")
 @pass_ctx
 def config_cmd(ctx):
     """Print the current stack configuration."""
-    click.echo(safe_dump(ctx.config, default_flow_style=False))
+    click.echo(dump_yaml(ctx.config))
 
 
 @cli.command()
@@ -84,26 +314,102 @@ def update(ctx):
 
 
 @cli.command()
+@click.option(
+    "-p",
+    "--parallelism",
+    type=int,
+    default=None,
+    help="Maximum number of stacks or regions deployed at the same time.",
+)
+@click.option(
+    "--regions",
+    default=None,
+    help="Comma-separated list of regions to deploy the stack to (defaults to `regions`).",
+)
 @pass_ctx
-def deploy(ctx):
+def deploy(ctx, parallelism, regions):
     """Create or update a CloudFormation stack."""
+    regions = regions_config(ctx.config, regions.split(",") if regions else None)
+    if regions and ctx.stack is None:
+        click.secho(
+            "[ERROR] Multi-region deployments are not supported for multi-stack projects",
+            err=True,
+            fg="red",
+        )
+        exit(1)
+    if regions:
+        validate_templates(ctx.config)
+        deploy_regions(ctx.config, regions, parallelism or len(regions))
+        return
     validate_and_upload(ctx.region, ctx.config)
+    if ctx.stack is None:
+        ctx.project.deploy(parallelism)
+        return
     ctx.stack.create_or_update()
     ctx.stack.outputs()
 
 
 @cli.command()
+@click.option("--prefix", default=None, help="Delete the stacks with this prefix.")
+@click.option("--tag", "tags", multiple=True, help="Delete the stacks with this Key=Value tag.")
+@click.option(
+    "--older-than", default=None, help="Only delete stacks not updated for this long (e.g. 7d)."
+)
+@click.option(
+    "-p", "--parallelism", type=int, default=10, help="Maximum number of concurrent deletions."
+)
+@click.option("-y", "--yes", is_flag=True, help="Do not ask for confirmation.")
 @pass_ctx
-def delete(ctx):
+def delete(ctx, prefix, tags, older_than, parallelism, yes):
     """Delete the CloudFormation stack."""
-    ctx.stack.delete()
+    if not (prefix or tags):
+        if ctx.stack is None:
+            exit_no_stack_selected()
+        ctx.stack.delete()
+        return
+    stacks = stacks_to_delete(
+        ctx.region, prefix, parse_tags(tags), parse_age(older_than) if older_than else None
+    )
+    if not stacks:
+        click.echo("No stack to delete")
+        return
+    click.echo("\n".join(sorted(s["StackName"] for s in stacks)))
+    if not yes:
+        click.confirm("Delete these {} stacks?".format(len(stacks)), abort=True)
+    failed = delete_stacks(ctx.region, stacks, parallelism)
+    for name, reason in sorted(failed.items()):
+        click.secho("Stack [{}] could not be deleted: {}".format(name, reason), err=True, fg="red")
+    if failed:
+        exit(1)
 
 
 @cli.command()
+@click.option("--all", "all_stacks", is_flag=True, help="Get the status of every stack.")
+@click.option("--prefix", default=None, help="Get the status of the stacks with this prefix.")
+@click.option(
+    "--tag", "tags", multiple=True, help="Get the status of the stacks with this Key=Value tag."
+)
+@click.option("--nested", is_flag=True, help="Include nested stacks.")
+@click.option("--watch", type=int, default=None, help="Refresh the status every WATCH seconds.")
 @pass_ctx
-def status(ctx):
+def status(ctx, all_stacks, prefix, tags, nested, watch):
     """Get the status of a CloudFormation stack."""
-    ctx.stack.status()
+    if all_stacks or prefix or tags:
+        status_dashboard(ctx.region, prefix, parse_tags(tags), nested, watch)
+    elif ctx.stack is None:
+        exit_no_stack_selected()
+    else:
+        ctx.stack.status()
+
+
+@cli.command()
+@pass_ctx
+def drift(ctx):
+    """Detect the drift of a CloudFormation stack and its nested stacks."""
+    report = detect_drift(ctx.region, ctx.stack.get_stacks(recursive=True))
+    print_drift_report(report)
+    if any(r["Reason"] for r in report):
+        exit(1)
 
 
 output_option = click.option(
@@ -116,60 +422,244 @@ output_option = click.option(
 )
 
 
+def export_options(func):
+    """Options to export the outputs or parameters of many stacks."""
+    options = [
+        click.option("--all", "all_stacks", is_flag=True, help="Export every stack."),
+        click.option("--prefix", default=None, help="Export the stacks with this prefix."),
+        click.option(
+            "--tag", "tags", multiple=True, help="Export the stacks with this Key=Value tag."
+        ),
+        click.option("--nested", is_flag=True, help="Include nested stacks."),
+        click.option(
+            "--regions",
+            default=None,
+            help="Comma-separated list of regions to export (defaults to the stack region).",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def export_or_print(
+    ctx,
+    kind,
+    values,
+    output_format,
+    all_stacks=False,
+    prefix=None,
+    tags=(),
+    nested=False,
+    regions=None,
+):
+    """
+    Export the stacks selected by the export options as one record per stack,
+    or print the `values` of the current stack (None when no stack is selected).
+    """
+    if all_stacks or prefix or tags:
+        regions = regions.split(",") if regions else [ctx.region]
+        export_stacks(regions, kind, output_format, prefix, parse_tags(tags), nested)
+        return
+    if values is None:
+        exit_no_stack_selected()
+    if output_format == "yaml":
+        click.echo(dump_yaml(values()))
+    elif output_format == "json":
+        click.echo(json.dumps(values(), indent=True))
+
+
 @cli.command("outputs")
 @pass_ctx
 @output_option
-def outputs_cmd(ctx, output_format=None):
+@export_options
+def outputs_cmd(ctx, all_stacks, prefix, tags, nested, regions, output_format=None):
     """Get the full list of outputs of a CloudFormation stack."""
-    stack_outputs = ctx.stack.outputs()
-    if output_format == "yaml":
-        click.echo(safe_dump(stack_outputs, default_flow_style=False))
-    elif output_format == "json":
-        click.echo(json.dumps(stack_outputs, indent=True))
+    export_or_print(
+        ctx,
+        "outputs",
+        ctx.stack.outputs if ctx.stack else None,
+        output_format,
+        all_stacks=all_stacks,
+        prefix=prefix,
+        tags=tags,
+        nested=nested,
+        regions=regions,
+    )
 
 
 @cli.command()
 @pass_ctx
 @output_option
-def parameters(ctx, output_format=None):
+@export_options
+def parameters(ctx, all_stacks, prefix, tags, nested, regions, output_format=None):
     """Get the full list of parameters of a CloudFormation stack."""
-    stack_params = ctx.stack.params()
-    if output_format == "yaml":
-        click.echo(safe_dump(stack_params, default_flow_style=False))
-    elif output_format == "json":
-        click.echo(json.dumps(stack_params, indent=True))
+    export_or_print(
+        ctx,
+        "parameters",
+        ctx.stack.params if ctx.stack else None,
+        output_format,
+        all_stacks=all_stacks,
+        prefix=prefix,
+        tags=tags,
+        nested=nested,
+        regions=regions,
+    )
 
 
 @cli.command()
 @pass_ctx
 def validate(ctx):
     """Validate CloudFormation templates."""
-    error = False
-    for t in collect_templates(ctx.config):
-        valid = t.validate()
-        if not valid:
-            error = True
-    if error:
-        exit(1)
+    validate_templates(ctx.config)
 
 
 @cli.command()
 @pass_ctx
 def upload(ctx):
     """Upload CloudFormation templates and assets to S3."""
-    process_assets(ctx.region, ctx.config)
-    return [t.upload() for t in collect_templates(ctx.config)]
+    templates = collect_templates(ctx.config)
+    run_pipeline(
+        templates,
+        Template.upload,
+        lambda cancelled: process_assets(ctx.region, ctx.config, cancelled),
+    )
+    return templates
 
 
 @cli.command()
 @pass_ctx
 def check(ctx):
     """Check CloudFormation templates."""
-    check_templates(ctx.config["stack"]["template_body"])
+    if ctx.stack is not None:
+        check_templates(ctx.stack.template_body)
+        return
+    for template_body in template_bodies(ctx.config):
+        check_templates(template_body)
+
+
+@cli.command("gc")
+@click.option(
+    "--prefix",
+    default=None,
+    help="Collect every object under this prefix, except under the prefixes of the existing "
+    "stacks (defaults to the s3_path of the project only).",
+)
+@click.option(
+    "--older-than", default=None, help="Only delete objects not modified for this long (e.g. 7d)."
+)
+@click.option("--dry-run", is_flag=True, help="Print the objects to delete and exit.")
+@click.option("-y", "--yes", is_flag=True, help="Do not ask for confirmation.")
+@pass_ctx
+def gc_cmd(ctx, prefix, older_than, dry_run, yes):
+    """Delete the templates and assets uploaded to S3 that are not used anymore."""
+    if prefix is not None and not prefix.strip("/"):
+        click.secho("[ERROR] The bucket root cannot be collected", err=True, fg="red")
+        exit(1)
+    older_than = parse_age(older_than) if older_than else None
+    garbage = collect_project_garbage(ctx.region, ctx.config, prefix, older_than)
+    count = sum(len(objects) for objects in garbage.values())
+    size = sum(obj["Size"] for objects in garbage.values() for obj in objects)
+    if not count:
+        click.echo("No object to delete")
+        return
+    if dry_run:
+        click.echo("{} objects ({} bytes) would be deleted".format(count, size))
+        return
+    if not yes:
+        click.confirm("Delete these {} objects ({} bytes)?".format(count, size), abort=True)
+    failed = {}
+    for bucket, objects in garbage.items():
+        for key, reason in gc.delete_objects(
+            ctx.region, bucket, [obj["Key"] for obj in objects]
+        ).items():
+            failed["s3://{}/{}".format(bucket, key)] = reason
+    for key, reason in sorted(failed.items()):
+        click.secho("Object [{}] could not be deleted: {}".format(key, reason), err=True, fg="red")
+    if failed:
+        exit(1)
+    click.echo("{} objects deleted".format(count))
+
+
+@cli.command()
+@click.option(
+    "-o",
+    "--output",
+    default=lock.DEFAULT_LOCK_FILE,
+    help="Lock file (defaults to {}).".format(lock.DEFAULT_LOCK_FILE),
+)
+@pass_ctx
+def freeze(ctx, output):
+    """Write the resolved configuration to a lock file."""
+    if ctx.project is not None:
+        # resolve the outputs of every stack of the project
+        config.deferred_stacks = set()
+        ctx.config = config.Config.load(reload=True)
+    lock.freeze(
+        output,
+        config.brume_config_file(),
+        ctx.config,
+        [t.local_file_path for t in collect_templates(ctx.config)],
+        config.resolved_outputs,
+    )
+
 
+@cli.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    default=daemon.DEFAULT_SOCKET,
+    help="Unix socket to listen on (defaults to $BRUME_SOCKET or {}).".format(
+        daemon.DEFAULT_SOCKET
+    ),
+)
+def serve(socket_path):
+    """Run the commands sent by `brume --via-daemon`."""
+    daemon.serve(cli, socket_path)
 
-def process_assets(region, conf):
-    """Upload project assets to S3."""
+
+def collect_project_garbage(region, conf, prefix=None, older_than=None):
+    """
+    Return the garbage objects of the buckets of the project, by bucket.
+
+    Without `prefix`, only the `s3_path` of the templates and assets are collected.
+    """
+    stacks = gc.live_stacks(region)
+    keys = gc.live_keys(conf, collect_templates(conf))
+    references, strings = gc.referenced_keys(region, stacks)
+    for bucket, referenced in references.items():
+        keys.setdefault(bucket, set()).update(referenced)
+    stack_names = {s["StackName"] for s in stacks} if prefix is not None else None
+    garbage = {}
+    for bucket, s3_paths in sorted(gc.upload_prefixes(conf).items()):
+        prefixes = [prefix.strip("/") + "/"] if prefix else gc.collected_prefixes(s3_paths)
+        if not prefixes:
+            click.secho(
+                "[WARN] Not collecting s3://{}: its s3_path is the bucket root".format(bucket),
+                err=True,
+                fg="red",
+            )
+        garbage[bucket] = []
+        for collected in prefixes:
+            click.echo("Collecting s3://{}/{}".format(bucket, collected))
+            garbage[bucket].extend(
+                gc.collect_garbage(
+                    region,
+                    bucket,
+                    collected,
+                    keys.get(bucket, set()) | strings,
+                    s3_paths,
+                    stack_names,
+                    older_than,
+                )
+            )
+        for obj in garbage[bucket]:
+            click.echo("  {} ({} bytes)".format(obj["Key"], obj["Size"]))
+    return garbage
+
+
+def process_assets(region, conf, cancelled=None):
+    """Upload project assets to S3, until the `cancelled` event is set."""
     if "assets" not in conf:
         return
     assets_config = conf["assets"]
@@ -180,35 +670,185 @@ def process_assets(region, conf):
         click.echo(
             "Processing assets from {} to s3://{}/{}".format(local_path, s3_bucket, s3_path)
         )
-        send_assets(region, local_path, s3_bucket, s3_path)
+        send_assets(region, local_path, s3_bucket, s3_path, cancelled)
     else:
         click.echo("Bucket does not exist {}".format(s3_bucket))
 
 
+def template_bodies(conf):
+    """Return the main templates of the stacks of the configuration."""
+    if is_project(conf):
+        return sorted({s["template_body"] for s in conf["stacks"].values()})
+    return [conf["stack"]["template_body"]]
+
+
 def collect_templates(conf):
     """
     Convert every template into a brume.Template.
 
     The type of the templates is determined based on the `template_body`
-    property of the configuration file.
+    property of the stacks of the configuration file.
+    Only the templates reachable from the main templates through nested stacks are
+    collected, unless `--all-templates` is used.
+    When the configuration is loaded from a lock file, its templates are used.
     """
-    _file, ext = path.splitext(conf["stack"]["template_body"])
-    template_paths = glob(path.join(conf["templates"].get("local_path", ""), "*" + ext))
+    if config.lock is not None:
+        return [Template(t, conf["templates"]) for t in sorted(config.lock["templates"])]
+    extensions = sorted({path.splitext(t)[1] for t in template_bodies(conf)})
+    template_paths = [
+        t
+        for ext in extensions
+        for t in glob(path.join(conf["templates"].get("local_path", ""), "*" + ext))
+    ]
+    if template_module.reachable_only:
+        template_paths = reachable_templates(template_bodies(conf), template_paths) or template_paths
     return [Template(t, conf["templates"]) for t in template_paths]
 
 
-def validate_and_upload(region, conf):
-    """Validate and upload CloudFormation templates to S3."""
+def run_pipeline(templates, process, background=None):
+    """
+    Run `process` on every template concurrently, and `background` alongside them.
+
+    `process` returns False when a template is invalid: the work that has not started
+    yet is then cancelled, `background` is told to stop with the `threading.Event` it is
+    called with, and brume exits once the running work is done. An error of `process`
+    cancels the work the same way, then is raised.
+    """
+    cancelled = threading.Event()
+    with ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS) as executor:
+        pending = [executor.submit(background, cancelled)] if background else []
+        futures = [executor.submit(process, t) for t in templates]
+
+        def _cancel():
+            cancelled.set()
+            for f in futures + pending:
+                f.cancel()
+
+        valid = True
+        try:
+            for future in as_completed(futures):
+                if future.cancelled() or future.result() is not False:
+                    continue
+                valid = False
+                _cancel()
+        except BaseException:
+            _cancel()
+            raise
+        if not valid:
+            exit(1)
+        for f in pending:
+            f.result()
+
+
+def validate_templates(conf):
+    """Validate CloudFormation templates concurrently, exit if any of them is invalid."""
     templates = collect_templates(conf)
-    error = False
-    for t in templates:
-        if not t.validate():
-            error = True
-    if error:
+    run_pipeline(templates, Template.validate)
+    return templates
+
+
+def _validate_and_upload_template(template):
+    if not template.validate():
+        return False
+    template.upload()
+    return True
+
+
+def validate_and_upload(region, conf):
+    """
+    Validate and upload CloudFormation templates and assets to S3.
+
+    Each template is uploaded as soon as it is valid, and the assets are uploaded
+    alongside the templates.
+    """
+    run_pipeline(
+        collect_templates(conf),
+        _validate_and_upload_template,
+        lambda cancelled: process_assets(region, conf, cancelled),
+    )
+
+
+def regions_config(conf, regions=None):
+    """
+    Return a dict of the regions to deploy the stack to, with their configuration overrides.
+
+    The `regions` block of the configuration file is either a list of regions or a dict
+    of regions with `templates`, `assets` and `stack` overrides (e.g. a bucket in each
+    region, the parameters specific to a region).
+    """
+    configured = conf.get("regions") or {}
+    if isinstance(configured, list):
+        configured = {region: {} for region in configured}
+    return {region: configured.get(region) or {} for region in regions or configured}
+
+
+def region_config(conf, region, overrides):
+    """
+    Return the configuration `conf` for `region` with its `overrides`.
+
+    The `parameters` and `tags` of a `stack` override are merged with those of the stack.
+    """
+    regional = dict(conf)
+    regional["region"] = region
+    regional["templates"] = dict(conf["templates"], region=region)
+    regional["templates"].update(overrides.get("templates", {}))
+    if "assets" in conf:
+        regional["assets"] = dict(conf["assets"])
+        regional["assets"].update(overrides.get("assets", {}))
+    stack = overrides.get("stack", {})
+    regional["stack"] = dict(conf["stack"], **stack)
+    for key in ("parameters", "tags"):
+        if key in stack:
+            regional["stack"][key] = dict(conf["stack"].get(key) or {}, **stack[key])
+    return regional
+
+
+def inherited_parameters(conf, region, overrides):
+    """
+    Return the names of the stack parameters of the configured region that are deployed
+    unchanged to another `region`, without a `stack` override.
+    """
+    if region == conf.get("region"):
+        return []
+    overridden = overrides.get("stack", {}).get("parameters") or {}
+    return sorted(set(conf["stack"].get("parameters") or {}) - set(overridden))
+
+
+def deploy_regions(conf, regions, parallelism):
+    """
+    Upload the templates and assets and deploy the stack to every region of `regions`
+    concurrently, then print a summary of the deployments.
+    """
+    for region in sorted(regions):
+        inherited = inherited_parameters(conf, region, regions[region])
+        if inherited:
+            click.secho(
+                "[WARN] Parameters of {} deployed unchanged to {}: {}".format(
+                    conf.get("region"), region, ", ".join(inherited)
+                ),
+                err=True,
+                fg="red",
+            )
+
+    def _deploy(region):
+        regional = region_config(conf, region, regions[region])
+        for t in collect_templates(regional):
+            t.upload()
+        process_assets(region, regional)
+        stack = Stack(region, regional["stack"], label=region, templates=regional["templates"])
+        stack.create_or_update(allow_no_op=True)
+        return stack.is_deployed()
+
+    results = {
+        region: error is None and deployed
+        for region, deployed, error in run_concurrently(_deploy, sorted(regions), parallelism)
+    }
+    click.echo()
+    for region in sorted(results):
+        status = crayons.green("deployed") if results[region] else crayons.red("failed")
+        click.echo("{:20s} {}".format(region, status))
+    if not all(results.values()):
         exit(1)
-    for t in templates:
-        t.upload()
-    process_assets(region, conf)
 
 
 if __name__ == "__main__":
@@ -3,13 +3,21 @@ Configuration.
 
 """
 
+import hashlib
+import json
 import os
+import re
+import tempfile
 
 import click
-import delegator
 import jinja2
 import yaml
-from brume.output import stack_outputs
+from brume import boto_client, cache, exports, git, profiling, snapshot
+from brume.boto_client import cfn_client
+from brume.output import StackOutputs
+from brume.parallel import run_concurrently
+from jinja2 import nodes
+from jinja2.runtime import Context
 
 DEFAULT_BRUME_CONFIG = "brume.yml"
 configuration_file = None
@@ -22,16 +30,145 @@ def brume_config_file():
     return configuration_file or DEFAULT_BRUME_CONFIG
 
 
-# current outputs of loaded stacks
+# current outputs of loaded stacks, and the credentials they are fetched with
 stack_outputs_definition = {}
+_outputs_identity = None
+
+# values of the `cfn` lookups resolved while rendering the configuration, and of the
+# `export` lookups under EXPORTS_KEY (not a valid stack name)
+resolved_outputs = {}
+EXPORTS_KEY = "Fn::ImportValue"
+
+# content of the lock file the configuration is loaded from (`--from-lock`)
+lock = None
+
+# stacks of a multi-stack project that have not been deployed yet, their outputs are
+# rendered as placeholders until they are deployed
+ALL_STACKS = object()
+deferred_stacks = set()
+
+PENDING_OUTPUT = "<pending output of {}>"
+PENDING_OUTPUT_RE = re.compile(r"<pending output of ([^>]+)>")
+PROJECT_RE = re.compile(r"^stacks\s*:", re.MULTILINE)
+REGION_RE = re.compile(r"^region\s*:\s*['\"]?([a-z0-9-]+)['\"]?\s*$", re.MULTILINE)
+
+# region of the configuration being rendered, the default region of the `export` lookups:
+# its literal `region`, or the region of its previous rendering
+config_region = None
+PREFETCH_MAX_WORKERS = 8
+
+
+def _stack_outputs(region, stack_name):
+    """Return the StackOutputs of `stack_name` in `region`, created on first use."""
+    stack_snapshot = snapshot.get(region) if snapshot.enabled else None
+    current = stack_outputs_definition.get((region, stack_name))
+    if current is None or stack_snapshot is not None and current.snapshot is not stack_snapshot:
+        stack_outputs_definition[(region, stack_name)] = StackOutputs(
+            cfn_client(region), stack_name, stack_snapshot
+        )
+    return stack_outputs_definition[(region, stack_name)]
 
 
-def _check_key_exists(key, container, stack_name):
-    if key not in container:
-        click.secho(
-            "[ERROR] No key {} variable in stack {}".format(key, stack_name), err=True, fg="red"
-        )
-        exit(1)
+def expire_outputs():
+    """
+    Forget the outputs fetched by a previous command (`brume serve`): the stacks found
+    are kept for the same credentials, their outputs are fetched again.
+    """
+    global _outputs_identity  # pylint: disable=global-statement,invalid-name
+    if _outputs_identity != boto_client.identity():
+        stack_outputs_definition.clear()
+        _outputs_identity = boto_client.identity()
+    for outputs in stack_outputs_definition.values():
+        outputs.expire()
+
+
+def _is_deferred(stack_name):
+    return deferred_stacks is ALL_STACKS or stack_name in deferred_stacks
+
+
+def _parse_lookups(environment, source):
+    """Return the literal `cfn` lookups and the names of the templates included by a source."""
+    tree = environment.parse(source)
+    lookups = [
+        (call.args[0].value, call.args[1].value, [a.value for a in call.args[2:]])
+        for call in tree.find_all(nodes.Call)
+        if isinstance(call.node, nodes.Name)
+        and call.node.name == "cfn"
+        and len(call.args) >= 3
+        and all(isinstance(a, nodes.Const) for a in call.args)
+    ]
+    includes = [
+        node.template.value
+        for node in tree.find_all((nodes.Extends, nodes.Include, nodes.Import, nodes.FromImport))
+        if isinstance(node.template, nodes.Const)
+    ]
+    return dict(lookups=lookups, includes=includes)
+
+
+def _cached_lookups(environment, source):
+    """
+    Return the lookups and includes of a source, cached on disk by the hash of the source
+    next to the compiled templates, so that it is only parsed again when it changes.
+    """
+    if "cfn(" not in source and "{%" not in source:
+        return dict(lookups=[], includes=[])
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()
+    path = os.path.join(cache.directory, "jinja", "lookups-{}.json".format(digest))
+    try:
+        with open(path, "r") as _file:
+            return json.load(_file)
+    except (IOError, ValueError):
+        pass
+    parsed = _parse_lookups(environment, source)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as _file:
+            json.dump(parsed, _file)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        pass
+    return parsed
+
+
+def cfn_lookups(environment, source):
+    """
+    Return the `cfn` lookups whose arguments are all literals, of a template source and of
+    the templates it includes, as a list of `(region, stack_name, keys)` tuples.
+    """
+    lookups = []
+    sources = [source]
+    seen = set()
+    while sources:
+        parsed = _cached_lookups(environment, sources.pop())
+        lookups.extend((region, stack, tuple(keys)) for region, stack, keys in parsed["lookups"])
+        for name in parsed["includes"]:
+            if name in seen or environment.loader is None:
+                continue
+            seen.add(name)
+            try:
+                sources.append(environment.loader.get_source(environment, name)[0])
+            except jinja2.exceptions.TemplateNotFound:
+                # reported when the configuration is rendered
+                continue
+    return lookups
+
+
+def prefetch_outputs(lookups):
+    """Fetch the stacks needed by `lookups` concurrently, one stack tree per thread."""
+    keys_by_stack = {}
+    for region, stack_name, keys in lookups:
+        if not _is_deferred(stack_name):
+            keys_by_stack.setdefault((region, stack_name), set()).add(keys)
+    for region, stack_name in keys_by_stack:
+        _stack_outputs(region, stack_name)
+
+    def _prefetch(stack):
+        for keys in sorted(keys_by_stack[stack]):
+            stack_outputs_definition[stack].prefetch(*keys)
+
+    for _ in run_concurrently(_prefetch, keys_by_stack, PREFETCH_MAX_WORKERS):
+        pass
 
 
 def cloudformation(region, stack_name, key, *sub_keys):
@@ -39,35 +176,56 @@ def cloudformation(region, stack_name, key, *sub_keys):
     Return the value of the `key` in outputs of specified stack `stack_name`.
 
     If `sub_keys` is specified, return the value of the `sub_keys` found in the value of the `key`
-    in outputs of specified stack `stack_name`.
+    in outputs of specified stack `stack_name`. Only the nested stacks named by `key` and
+    `sub_keys` are fetched.
+
+    If `stack_name` is a deferred stack of a multi-stack project, return a placeholder
+    that is resolved once the stack is deployed.
     """
-    if stack_name not in stack_outputs_definition:
-        stack_outputs_definition[stack_name] = stack_outputs(region=region, stack_name=stack_name)
-    current_definition = stack_outputs_definition[stack_name]
-    _check_key_exists(key, current_definition, stack_name)
-    current_definition = current_definition[key]
+    if _is_deferred(stack_name):
+        return PENDING_OUTPUT.format(stack_name)
+    try:
+        value = _stack_outputs(region, stack_name).lookup(key, *sub_keys)
+        resolved_outputs.setdefault(stack_name, {})[".".join((key,) + sub_keys)] = value
+        return value
+    except KeyError as err:
+        click.secho(
+            "[ERROR] No key {} variable in stack {}".format(err.args[0], stack_name),
+            err=True,
+            fg="red",
+        )
+        exit(1)
 
-    for subKey in sub_keys:
-        _check_key_exists(subKey, current_definition, stack_name)
-        current_definition = current_definition[subKey]
 
-    return current_definition
+def is_git_repo():
+    """Check that the current directory is in a git repository."""
+    return git.find_git_dir() is not None
 
 
-def is_installed(cmd):
-    """Check that ``cmd`` is installed and available in $PATH."""
-    c = delegator.run([cmd])
-    if c.err:
-        return False
-    return True
+class Lazy:
+    """A value of the template context, computed the first time the template uses it."""
 
+    def __init__(self, func):
+        self.func = func
+        self.computed = False
+        self.value = None
 
-def is_git_repo():
-    """Check that the current directory is a functioning git repository."""
-    c = delegator.run("git status")
-    if "fatal: Not a git repository" in c.err:
-        return False
-    return True
+    def get(self):
+        """Return the value, computing it on first use."""
+        if not self.computed:
+            self.value = self.func()
+            self.computed = True
+        return self.value
+
+
+class LazyContext(Context):
+    """Jinja context that computes the `Lazy` values when they are used."""
+
+    def resolve_or_missing(self, key):
+        value = super(LazyContext, self).resolve_or_missing(key)
+        if isinstance(value, Lazy):
+            return value.get()
+        return value
 
 
 class Config:
@@ -76,15 +234,30 @@ class Config:
     config = {}
 
     @staticmethod
-    def cfn(region, stack_name, key, second_key=None, third_key=None):
+    def cfn(region, stack_name, key, *sub_keys):
         """Return the value of the `key` output of stack_name cloud formation stack.
-           cfn methods will lookup recursively in nested stack if second_key (and third_key) is provided.
+           cfn methods will lookup recursively in nested stacks if sub_keys are provided.
+        """
+        return cloudformation(region, stack_name, key, *sub_keys)
+
+    @staticmethod
+    def export(name, region=None):
         """
-        if second_key is None:
-            return cloudformation(region, stack_name, key)
-        if third_key is None:
-            return cloudformation(region, stack_name, key, second_key)
-        return cloudformation(region, stack_name, key, second_key, third_key)
+        Return the value of the `name` CloudFormation export of `region` (defaults to the
+        region of the configuration, which must then be a literal or already rendered).
+        """
+        region = region or config_region
+        if region is None:
+            click.secho(
+                "[ERROR] No region for export {0}: the region of the configuration is not "
+                "known before it is rendered, use export('{0}', region)".format(name),
+                err=True,
+                fg="red",
+            )
+            exit(1)
+        value = exports.export_value(name, region)
+        resolved_outputs.setdefault(EXPORTS_KEY, {})[name] = value
+        return value
 
     @staticmethod
     def env(key, default=None):
@@ -107,25 +280,25 @@ class Config:
         YAML complains if the commit message contains single quotes, so we
         remove those.
         """
-        c = delegator.run("git log -1 --pretty=%s")
-        return c.out.strip().replace("'", "")
+        metadata = git.metadata() or {}
+        return metadata.get("subject", "").replace("'", "")
 
     @staticmethod
     def _git_commit():
         """Return the SHA1 of the latest Git commit (HEAD)."""
-        c = delegator.run("git rev-parse --short HEAD")
-        return c.out.strip()
+        metadata = git.metadata() or {}
+        return metadata.get("sha1", "")[: git.SHORT_SHA1_LENGTH]
 
     @staticmethod
     def _git_branch():
         """Return the name of the current Git branch."""
-        c = delegator.run("git rev-parse --abbrev-ref HEAD")
-        return c.out.strip()
+        metadata = git.metadata() or {}
+        return metadata.get("branch", "")
 
     @staticmethod
     def git_config():
         """Return the Git configuration if the current directory is a Git repo."""
-        if not is_installed("git"):
+        if not git.is_installed():
             click.secho("[WARN] git is not installed or not in $PATH", err=True, fg="red")
             return {}
         if not is_git_repo():
@@ -138,44 +311,102 @@ class Config:
         )
 
     @classmethod
-    def load(cls, config_file=None):
+    def load(cls, config_file=None, reload=False):
         """
         Return the YAML configuration for a project based on the `config_file` template.
 
-        By default, the template exposes the `env` function.
+        By default, the template exposes the `env`, `cfn` and `export` functions.
         The `git_branch` and `git_commit` values are exposed only when a `.git` folder
         exists in the current directory
+
+        When the configuration declares a `stacks` block (multi-stack project), it is
+        first rendered without any `cfn` lookup to find the stacks of the project, then
+        rendered again with the outputs of the project stacks deferred.
+        Use `reload` to render the configuration again, e.g. once deferred stacks are deployed.
+
+        The outputs of the `cfn` lookups with literal arguments are fetched concurrently
+        before rendering.
+
+        When a lock file is loaded, its already rendered configuration is used instead.
         """
+        global deferred_stacks, config_region  # pylint: disable=global-statement,invalid-name
         config_file = config_file or brume_config_file()
-        if not Config.config:
-            template = Config.render(config_file)
-            template_env = dict(
-                cfn=Config.cfn,
-                env=Config.env,
-                git=Config.git_config(),
-                git_branch=Config._git_branch(),
-                git_commit=Config._git_commit(),
-            )
-            try:
-                Config.config = yaml.safe_load(template.render(**template_env))
-            except jinja2.exceptions.UndefinedError as err:
-                click.secho(
-                    "[ERROR] {0} in {1}".format(err.message, config_file), err=True, fg="red"
-                )
-                exit(1)
-            except KeyError as err:
-                click.secho("[ERROR] {0} in {1}".format(err, config_file), err=True, fg="red")
-                exit(1)
+        if lock is not None:
+            Config.config = lock["config"]
+        elif not Config.config or reload:
+            with profiling.phase("config.load"):
+                template = Config.render(config_file)
+                source = Config.source(template)
+                match = REGION_RE.search(source)
+                config_region = match.group(1) if match else Config.config.get("region")
+                if not Config.config and PROJECT_RE.search(source):
+                    deferred_stacks = ALL_STACKS
+                    project = Config._render_config(template, config_file)
+                    deferred_stacks = {
+                        s["stack_name"] for s in project.get("stacks", {}).values()
+                    }
+                with profiling.phase("config.prefetch"):
+                    prefetch_outputs(cfn_lookups(template.environment, source))
+                Config.config = Config._render_config(template, config_file)
         return Config.config
 
+    @staticmethod
+    def _render_config(template, config_file):
+        """
+        Render the configuration template and parse it as YAML.
+
+        The Git metadata is only read when the template uses it.
+        """
+        template_env = dict(
+            cfn=Config.cfn,
+            export=Config.export,
+            env=Config.env,
+            git=Lazy(Config.git_config),
+            git_branch=Lazy(Config._git_branch),
+            git_commit=Lazy(Config._git_commit),
+        )
+        try:
+            return yaml.safe_load(template.render(**template_env))
+        except jinja2.exceptions.UndefinedError as err:
+            click.secho("[ERROR] {0} in {1}".format(err.message, config_file), err=True, fg="red")
+            exit(1)
+        except KeyError as err:
+            click.secho("[ERROR] {0} in {1}".format(err, config_file), err=True, fg="red")
+            exit(1)
+
+    @staticmethod
+    def source(template):
+        """Return the source of a loaded Jinja template."""
+        with open(template.filename, "r") as _file:
+            return _file.read()
+
+    @staticmethod
+    def bytecode_cache():
+        """Return the cache of compiled configuration templates, None if it is not writable."""
+        directory = os.path.join(cache.directory, "jinja")
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            return None
+        return jinja2.FileSystemBytecodeCache(directory)
+
     @staticmethod
     def render(config_file):
-        """Render config_file as a Jinja template."""
+        """
+        Render config_file as a Jinja template.
+
+        Compiled templates are cached on disk, so that the configuration (and the templates it
+        includes) is only parsed and compiled again when it changes.
+        """
         path, filename = os.path.split(os.path.abspath(config_file))
+        environment = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(path or "./"),
+            undefined=jinja2.StrictUndefined,
+            bytecode_cache=Config.bytecode_cache(),
+        )
+        environment.context_class = LazyContext
         try:
-            return jinja2.Environment(
-                loader=jinja2.FileSystemLoader(path or "./"), undefined=jinja2.StrictUndefined
-            ).get_template(filename)
+            return environment.get_template(filename)
         except jinja2.exceptions.TemplateNotFound:
             click.secho(
                 "[ERROR] No such file or directory: {0}".format(config_file), err=True, fg="red"
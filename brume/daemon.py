@@ -0,0 +1,236 @@
+"""
+Long-running brume daemon.
+
+`brume serve` runs the brume commands sent over a local Unix socket in a single process,
+so that the imports, boto clients, parsed templates, template validations, exports
+indexes and nested stacks of the looked up stacks stay warm from one command to the next.
+`brume --via-daemon <command>` forwards a command to the daemon and prints its output
+with the same exit code.
+
+The protocol is line-delimited JSON: the client sends a single request
+`{"args": [...], "cwd": ..., "env": {...}, "tty": ...}` and the daemon answers with
+`{"stream": "stdout" or "stderr", "data": ...}` frames followed by `{"exit": code}`.
+Commands are run one at a time.
+"""
+
+import copy
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+
+import click
+from brume import boto_client, cache, config, events, exports, git, profiling, snapshot
+from brume import transfer
+from brume import template as template_module
+
+DEFAULT_SOCKET = os.getenv("BRUME_SOCKET", os.path.join(cache.directory, "brume.sock"))
+
+# module attributes set by a command and its options, restored before each command
+COMMAND_STATE = [
+    (
+        config,
+        [
+            "configuration_file",
+            "resolved_outputs",
+            "lock",
+            "deferred_stacks",
+        ],
+    ),
+    (config.Config, ["config"]),
+    (cache, ["refresh"]),
+    (snapshot, ["enabled"]),
+    (template_module, ["reachable_only"]),
+    (transfer, ["journal_path"]),
+    (boto_client, ["engine"]),
+]
+
+_lock = threading.Lock()
+
+
+def _send(connection, frame, lock):
+    with lock:
+        connection.write((json.dumps(frame) + "\n").encode("utf-8"))
+        connection.flush()
+
+
+class _Stream(io.TextIOBase):
+    """Text stream sending what is written to the client as frames."""
+
+    encoding = "utf-8"
+    errors = "strict"
+
+    def __init__(self, connection, name, tty, lock):
+        super().__init__()
+        self.connection = connection
+        self.name = name
+        self.tty = tty
+        self.lock = lock
+
+    def write(self, data):
+        if not isinstance(data, str):
+            raise TypeError("write() argument must be str")
+        if data:
+            _send(self.connection, {"stream": self.name, "data": data}, self.lock)
+        return len(data)
+
+    def isatty(self):
+        return self.tty
+
+
+def _exit_code(code):
+    """Return the exit code of a SystemExit code, printing its message if any."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    click.echo(code, err=True)
+    return 1
+
+
+def _state():
+    return {
+        (module, name): copy.deepcopy(getattr(module, name))
+        for module, names in COMMAND_STATE
+        for name in names
+    }
+
+
+# the state of the modules before any command is run
+_defaults = _state()
+
+
+def reset():
+    """Restore the state left by the previous command."""
+    for (module, name), value in _defaults.items():
+        setattr(module, name, copy.deepcopy(value))
+    snapshot.invalidate()
+    git._metadata.clear()  # pylint: disable=protected-access
+    profiling.reset()
+    transfer.reset()
+    events.close()
+
+
+def run(command, request, connection):
+    """Run `command` with the arguments, directory and environment of `request`."""
+    frames_lock = threading.Lock()
+    with _lock:
+        reset()
+        cwd, environ = os.getcwd(), dict(os.environ)
+        streams = sys.stdin, sys.stdout, sys.stderr
+        try:
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["env"])
+            cache.configure()
+            config.expire_outputs()
+            exports.expire()
+            sys.stdin = io.StringIO()
+            sys.stdout = _Stream(connection, "stdout", request.get("tty", False), frames_lock)
+            sys.stderr = _Stream(connection, "stderr", request.get("tty", False), frames_lock)
+            try:
+                command.main(args=request["args"], prog_name="brume")
+            except SystemExit as err:
+                return _exit_code(err.code)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+                return 1
+            return 0
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = streams
+            os.environ.clear()
+            os.environ.update(environ)
+            cache.configure()
+            os.chdir(cwd)
+
+
+class _Server(socketserver.UnixStreamServer):
+    """Unix socket server running brume commands."""
+
+    def __init__(self, command, socket_path):
+        self.command = command
+        super().__init__(socket_path, _Handler)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode("utf-8"))
+        code = run(self.server.command, request, self.wfile)
+        _send(self.wfile, {"exit": code}, threading.Lock())
+
+
+def make_server(command, socket_path=DEFAULT_SOCKET):
+    """Return a server running `command` for the clients of `socket_path`."""
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            # stale socket of a daemon that did not stop cleanly
+            os.remove(socket_path)
+        else:
+            click.secho(
+                "[ERROR] A brume daemon is already listening on {}".format(socket_path),
+                err=True,
+                fg="red",
+            )
+            exit(1)
+        finally:
+            probe.close()
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+    umask = os.umask(0o077)
+    try:
+        return _Server(command, socket_path)
+    finally:
+        os.umask(umask)
+
+
+def serve(command, socket_path=DEFAULT_SOCKET):
+    """Run the commands sent to `socket_path` until interrupted or terminated."""
+    boto_client.cache_clients = True
+    server = make_server(command, socket_path)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    click.echo("Listening on {}".format(socket_path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+def forward(args, socket_path=DEFAULT_SOCKET):
+    """Run a command on the daemon listening on `socket_path` and return its exit code."""
+    streams = dict(stdout=sys.stdout, stderr=sys.stderr)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        click.secho(
+            "[ERROR] No brume daemon listening on {}, start one with `brume serve`".format(
+                socket_path
+            ),
+            err=True,
+            fg="red",
+        )
+        return 1
+    request = dict(
+        args=args, cwd=os.getcwd(), env=dict(os.environ), tty=streams["stdout"].isatty()
+    )
+    with client, client.makefile("rwb") as connection:
+        connection.write((json.dumps(request) + "\n").encode("utf-8"))
+        connection.flush()
+        for line in connection:
+            frame = json.loads(line.decode("utf-8"))
+            if "exit" in frame:
+                return frame["exit"]
+            streams[frame["stream"]].write(frame["data"])
+            streams[frame["stream"]].flush()
+    click.secho("[ERROR] Connection to the brume daemon lost", err=True, fg="red")
+    return 1
@@ -0,0 +1,43 @@
+"""
+Status dashboard of many stacks.
+
+"""
+
+import time
+
+import click
+from brume.color import Color
+from brume.inventory import last_updated, select_stacks
+
+
+def print_status_table(stacks):
+    """Print a table of the status, last update and drift status of `stacks`."""
+    stacks = sorted(stacks, key=lambda s: s["StackName"])
+    width = max([len(s["StackName"]) for s in stacks] + [len("Stack")])
+    click.echo("{:{}s} {:36s} {:23s} {}".format("Stack", width, "Status", "Last updated", "Drift"))
+    for stack in stacks:
+        click.echo(
+            "{:{}s} {:36s} {:23s} {}".format(
+                stack["StackName"],
+                width,
+                Color.for_status(stack["StackStatus"]),
+                last_updated(stack).strftime("%Y-%m-%d %H:%M:%S UTC"),
+                stack.get("DriftInformation", {}).get("StackDriftStatus", "NOT_CHECKED"),
+            )
+        )
+
+
+def status_dashboard(region, prefix=None, tags=None, nested=False, watch=None):
+    """
+    Print the status of every stack of `region` matching `prefix` and `tags`.
+
+    If `watch` is set, refresh the dashboard every `watch` seconds.
+    """
+    while True:
+        stacks = list(select_stacks(region, prefix=prefix, tags=tags, nested=nested))
+        if watch:
+            click.clear()
+        print_status_table(stacks)
+        if not watch:
+            return
+        time.sleep(watch)
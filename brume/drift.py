@@ -0,0 +1,148 @@
+"""
+Drift detection of a stack and its nested stacks.
+
+Drift detection is started on every stack at once and a single poller waits for all the
+detections, so that checking a tree of stacks takes about as long as its slowest stack.
+"""
+
+import time
+
+import click
+import crayons
+from brume.boto_client import cfn_client
+from brume.color import Color
+from brume.inventory import stack_name
+from brume.parallel import run_concurrently
+
+DRIFT_MAX_WORKERS = 8
+POLL_MIN_SLEEP = 2
+POLL_MAX_SLEEP = 15
+DRIFTED_STATUSES = ["MODIFIED", "DELETED"]
+
+
+def start_detections(client, stacks):
+    """
+    Start the drift detection of every stack of `stacks` concurrently.
+
+    Return a dict of the detection ids by stack, and a dict of the stacks whose
+    detection could not be started with the reason of the failure.
+    """
+
+    def _detect(stack):
+        return client.detect_stack_drift(StackName=stack)["StackDriftDetectionId"]
+
+    detections, failed = {}, {}
+    for stack, detection_id, error in run_concurrently(_detect, stacks, DRIFT_MAX_WORKERS):
+        if error is None:
+            detections[stack] = detection_id
+        else:
+            failed[stack] = str(error)
+    return detections, failed
+
+
+def wait_for_detections(client, detection_ids, min_sleep=POLL_MIN_SLEEP, max_sleep=POLL_MAX_SLEEP):
+    """
+    Wait until no detection of `detection_ids` is in progress and return their status by id.
+
+    The pending detections are all polled at each round. The poller sleeps `min_sleep`
+    seconds after a round where a detection completed, and backs off up to `max_sleep`
+    seconds while none does.
+    """
+
+    def _status(detection_id):
+        return client.describe_stack_drift_detection_status(StackDriftDetectionId=detection_id)
+
+    pending = set(detection_ids)
+    statuses = {}
+    sleep_time = min_sleep
+    while pending:
+        time.sleep(sleep_time)
+        completed = 0
+        for detection_id, status, error in run_concurrently(_status, pending, DRIFT_MAX_WORKERS):
+            if error is not None:
+                status = dict(DetectionStatus="DETECTION_FAILED", DetectionStatusReason=str(error))
+            if status["DetectionStatus"] != "DETECTION_IN_PROGRESS":
+                statuses[detection_id] = status
+                completed += 1
+        pending.difference_update(statuses)
+        sleep_time = min_sleep if completed else min(max_sleep, sleep_time * 2)
+    return statuses
+
+
+def resource_drifts(client, stack):
+    """Return the modified and deleted resources of `stack`, following the pagination."""
+    drifts = []
+    kwargs = dict(StackName=stack, StackResourceDriftStatusFilters=DRIFTED_STATUSES)
+    while True:
+        response = client.describe_stack_resource_drifts(**kwargs)
+        drifts.extend(response["StackResourceDrifts"])
+        if not response.get("NextToken"):
+            return drifts
+        kwargs["NextToken"] = response["NextToken"]
+
+
+def detect_drift(region, stacks, min_sleep=POLL_MIN_SLEEP, max_sleep=POLL_MAX_SLEEP):
+    """
+    Detect the drift of every stack of `stacks` (names or ids).
+
+    Return a report with a record per stack: its `StackDriftStatus`, the reason of the
+    failure when the detection failed, and its drifted `Resources`.
+    """
+    client = cfn_client(region)
+    detections, failed = start_detections(client, stacks)
+    statuses = wait_for_detections(client, detections.values(), min_sleep, max_sleep)
+    report = {
+        stack: dict(StackName=stack_name(stack), StackDriftStatus="UNKNOWN", Reason=reason)
+        for stack, reason in failed.items()
+    }
+    for stack, detection_id in detections.items():
+        status = statuses[detection_id]
+        report[stack] = dict(
+            StackName=stack_name(stack),
+            StackDriftStatus=status.get("StackDriftStatus", "UNKNOWN"),
+            Reason=status.get("DetectionStatusReason")
+            if status["DetectionStatus"] == "DETECTION_FAILED"
+            else None,
+        )
+    drifted = [s for s in detections if report[s]["StackDriftStatus"] == "DRIFTED"]
+    for stack, drifts, error in run_concurrently(
+        lambda s: resource_drifts(client, s), drifted, DRIFT_MAX_WORKERS
+    ):
+        report[stack]["Resources"] = drifts or []
+        if error is not None:
+            report[stack]["Reason"] = str(error)
+    return [report[stack] for stack in stacks]
+
+
+def print_drift_report(report):
+    """Print a line per stack, followed by a line per drifted resource and property."""
+    width = max([len(r["StackName"]) for r in report] + [len("Stack")])
+    click.echo("{:{}s} {}".format("Stack", width, "Drift"))
+    for record in report:
+        click.echo(
+            "{:{}s} {}{}".format(
+                record["StackName"],
+                width,
+                Color.for_status(record["StackDriftStatus"]),
+                " ({})".format(record["Reason"]) if record["Reason"] else "",
+            )
+        )
+        for resource in record.get("Resources", []):
+            click.echo(
+                "  {} {} {}".format(
+                    Color.for_status(resource["StackResourceDriftStatus"]),
+                    crayons.yellow(resource["LogicalResourceId"]),
+                    resource["ResourceType"],
+                )
+            )
+            for difference in resource.get("PropertyDifferences", []):
+                click.echo(
+                    "    {} {}: expected {}, actual {}".format(
+                        difference["DifferenceType"],
+                        difference["PropertyPath"],
+                        difference["ExpectedValue"],
+                        difference["ActualValue"],
+                    )
+                )
+    drifted = sum(1 for r in report if r["StackDriftStatus"] == "DRIFTED")
+    click.echo("{} of {} stacks drifted".format(drifted, len(report)))
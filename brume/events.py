@@ -0,0 +1,118 @@
+"""
+Stack events sinks.
+
+Events tailed from CloudFormation are sent to every configured sink: the human-readable
+log on the terminal and/or a structured NDJSON stream (one JSON document per event).
+"""
+
+import io
+import json
+import sys
+import threading
+
+import click
+from brume.color import Color
+
+# sinks every tailed event is sent to
+_sinks = []
+
+
+class HumanSink:
+    """Print events as a table on the terminal."""
+
+    @staticmethod
+    def start(stack):
+        """Print the headers of the events table."""
+        click.echo(
+            stack.log_prefix
+            + "{:23s} {:36s} {:30s} {:30s} {}".format(
+                "Timestamp", "Status", "Resource", "Type", "Reason"
+            )
+        )
+
+    @staticmethod
+    def emit(stack, event):
+        """Print an event."""
+        click.echo(
+            stack.log_prefix
+            + "{:23s} {:36s} {:30s} {:30s} {}".format(
+                event["Timestamp"].strftime("%Y-%m-%d %H:%M:%S UTC"),
+                Color.for_status(event["ResourceStatus"]),
+                event["LogicalResourceId"],
+                event["ResourceType"],
+                event.get("ResourceStatusReason", ""),
+            )
+        )
+
+    def flush(self):
+        """Nothing to flush, events are printed as they come."""
+
+    def close(self):
+        """Nothing to close."""
+
+
+class JsonSink:
+    """
+    Write events as NDJSON to a file or to stdout, through a buffer.
+
+    When the events are written to stdout, every other message of the command is printed
+    on stderr until the sink is closed, so that stdout is a valid NDJSON stream.
+    """
+
+    def __init__(self, path, buffer_size=64 * 1024):
+        if path == "-":
+            self.stream, sys.stdout = sys.stdout, sys.stderr
+            self.owned = False
+        else:
+            self.stream = io.open(path, "a", buffering=buffer_size, encoding="utf-8")
+            self.owned = True
+        self.lines = []
+        self.lock = threading.Lock()
+
+    def start(self, stack):
+        """Nothing to write when tailing starts."""
+
+    def emit(self, stack, event):
+        """Buffer an event as a JSON document."""
+        record = dict(event, Region=stack.region, Timestamp=event["Timestamp"].isoformat())
+        line = json.dumps(record, sort_keys=True, default=str)
+        with self.lock:
+            self.lines.append(line)
+
+    def flush(self):
+        """Write the buffered events."""
+        with self.lock:
+            lines, self.lines = self.lines, []
+            if lines:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+
+    def close(self):
+        """Write the buffered events and close the file."""
+        self.flush()
+        if self.owned:
+            self.stream.close()
+        else:
+            sys.stdout = self.stream
+
+
+def configure(events_out=None, human=True):
+    """Configure the sinks tailed events are sent to."""
+    close()
+    if human and events_out != "-":
+        _sinks.append(HumanSink())
+    if events_out:
+        _sinks.append(JsonSink(events_out))
+
+
+def sinks():
+    """Return the configured sinks, the human-readable log by default."""
+    if not _sinks:
+        _sinks.append(HumanSink())
+    return _sinks
+
+
+def close():
+    """Flush and close every sink."""
+    while _sinks:
+        _sinks.pop().close()
@@ -0,0 +1,108 @@
+"""
+Bulk export of the outputs and parameters of many stacks.
+
+The stacks of every region are listed concurrently with a paginated `describe_stacks`,
+which returns the outputs and parameters of up to 100 stacks per call, and one record
+per stack is written as soon as its page is fetched: the memory used does not depend on
+the number of stacks.
+"""
+
+import json
+import queue
+import threading
+
+import click
+import yaml
+from botocore.exceptions import ClientError
+from brume import boto_client
+from brume.inventory import select_stacks
+
+# use libyaml when it is available
+SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# records fetched but not written yet
+QUEUE_SIZE = 1000
+
+_DONE = object()
+
+
+def dump_yaml(data, explicit_start=False):
+    """Serialize `data` as YAML."""
+    return yaml.dump(
+        data, Dumper=SafeDumper, default_flow_style=False, explicit_start=explicit_start
+    )
+
+
+def stack_record(region, stack, kind):
+    """Return the export record of a stack description, with its `kind` (outputs/parameters)."""
+    if kind == "outputs":
+        values = {o["OutputKey"]: o["OutputValue"] for o in stack.get("Outputs", [])}
+    else:
+        values = {p["ParameterKey"]: p["ParameterValue"] for p in stack.get("Parameters", [])}
+    record = dict(Region=region, StackName=stack["StackName"], StackId=stack["StackId"])
+    if stack.get("ParentId"):
+        record["ParentId"] = stack["ParentId"]
+    record[kind.capitalize()] = values
+    return record
+
+
+def _fetch(records, region, kind, prefix, tags, nested):
+    try:
+        for stack in select_stacks(region, prefix=prefix, tags=tags, nested=nested):
+            records.put(stack_record(region, stack, kind))
+    except Exception as err:  # pylint: disable=broad-except
+        records.put(err)
+    finally:
+        records.put(_DONE)
+
+
+def stack_records(regions, kind, prefix=None, tags=None, nested=False):
+    """
+    Yield the export record of every stack of `regions` matching `prefix` and `tags`.
+
+    The regions are listed concurrently, by a thread per region or by the coroutines of
+    a single thread with the asyncio engine, and the records are yielded in the order
+    they are fetched. Raise the first error met once every region is listed.
+    """
+    records = queue.Queue(maxsize=QUEUE_SIZE)
+    if boto_client.uses_asyncio():
+        from brume import aio  # pylint: disable=import-outside-toplevel
+
+        threading.Thread(
+            target=aio.export_regions,
+            args=(records, regions, kind, prefix, tags, nested, _DONE),
+            daemon=True,
+        ).start()
+    else:
+        for region in regions:
+            threading.Thread(
+                target=_fetch, args=(records, region, kind, prefix, tags, nested), daemon=True
+            ).start()
+    pending = len(regions)
+    error = None
+    while pending:
+        record = records.get()
+        if record is _DONE:
+            pending -= 1
+        elif isinstance(record, Exception):
+            error = error or record
+        else:
+            yield record
+    if error is not None:
+        raise error
+
+
+def export_stacks(regions, kind, output_format, prefix=None, tags=None, nested=False):
+    """
+    Write the outputs or parameters of the matching stacks of `regions`, one record per stack:
+    a JSON document per line (NDJSON) or a YAML document per stack.
+    """
+    try:
+        for record in stack_records(regions, kind, prefix=prefix, tags=tags, nested=nested):
+            if output_format == "json":
+                click.echo(json.dumps(record, sort_keys=True))
+            else:
+                click.echo(dump_yaml(record, explicit_start=True), nl=False)
+    except ClientError as err:
+        click.secho("[ERROR] {}".format(err), err=True, fg="red")
+        exit(1)
@@ -0,0 +1,78 @@
+"""
+CloudFormation exports.
+
+The exports of a region are indexed by name from a single paginated `list_exports`
+sweep, cached on disk like the stack outputs for the AWS account and region, so that
+resolving many exports only costs one or two calls.
+"""
+
+import threading
+import time
+
+import click
+from brume import cache
+from brume.boto_client import account_id, cfn_client
+
+# (account, region) -> ({export name: value}, True if listed by the current command,
+# time it was listed)
+_indexes = {}
+_lock = threading.Lock()
+
+
+def list_exports(client):
+    """Return every export of the region of `client` as a dict."""
+    paginator = client.get_paginator("list_exports")
+    return {e["Name"]: e["Value"] for page in paginator.paginate() for e in page["Exports"]}
+
+
+def exports_index(region=None, refresh=False):
+    """
+    Return the exports of `region` (defaults to the current region) indexed by name.
+
+    With `refresh`, the exports are listed again unless the index was already listed by
+    the current command.
+    """
+    client = cfn_client(region)
+    key = (account_id(), client.meta.region_name)
+    with _lock:
+        if key not in _indexes or ((refresh or cache.refresh) and not _indexes[key][1]):
+            index = None if refresh else cache.get("exports", *key)
+            listed = index is None
+            if listed:
+                index = cache.put("exports", list_exports(client), *key)
+            _indexes[key] = (index, listed, time.time() if listed else None)
+        return _indexes[key][0]
+
+
+def expire():
+    """
+    Forget the indexes read by a previous command (`brume serve`): the indexes it listed
+    are kept for the lifetime of the cache entries, like on disk.
+    """
+    now = time.time()
+    with _lock:
+        for key, (index, _, listed_at) in list(_indexes.items()):
+            if listed_at is None or now - listed_at >= cache.ttl:
+                del _indexes[key]
+            else:
+                _indexes[key] = (index, False, listed_at)
+
+
+def export_value(name, region=None):
+    """
+    Return the value of the `name` export of `region`.
+
+    The exports are listed again when the name is not found in the cached index,
+    in case it was exported since. Exit if there is no such export.
+    """
+    index = exports_index(region)
+    if name not in index:
+        index = exports_index(region, refresh=True)
+    if name not in index:
+        click.secho(
+            "[ERROR] No export {} in the {} region".format(name, region or "current"),
+            err=True,
+            fg="red",
+        )
+        exit(1)
+    return index[name]
@@ -0,0 +1,191 @@
+"""
+Garbage collection of the templates and assets uploaded to S3.
+
+By default, only the `s3_path` prefixes of the templates and assets of the project are
+collected: an object there is live when it is a template or an asset of the project, or
+when the template or the parameters of an existing stack reference it, by URL (nested
+stack `TemplateURL`, asset URLs) or by key (e.g. the `S3Key` of a Lambda function).
+Every other object is garbage, as are the `.copy` templates uploaded for validation.
+
+With an explicit prefix (never the bucket root), the sibling prefixes are collected too:
+the objects under the prefix of an existing stack (`s3_path` is usually the stack name,
+so that each environment uploads under its own prefix) are live as well.
+"""
+
+import re
+from datetime import datetime
+from urllib.parse import unquote
+
+import pytz
+from botocore.exceptions import ClientError
+from brume import ratelimit
+from brume.assets import asset_keys
+from brume.boto_client import cfn_client, does_not_exist, s3_client
+from brume.inventory import select_stacks
+from brume.parallel import run_concurrently
+from brume.template import TEMPLATE_COPY_SUFFIX, parse_template, template_strings
+
+DELETE_BATCH_SIZE = 1000
+DELETE_MAX_WORKERS = 4
+REFERENCES_MAX_WORKERS = 8
+
+S3_URL_RE = re.compile(
+    r"https://(?P<host_bucket>[a-z0-9.-]+)\.s3[a-z0-9.-]*\.amazonaws\.com/(?P<host_key>[^\s\"'\\]+)"
+    r"|https://s3[a-z0-9.-]*\.amazonaws\.com/(?P<path_bucket>[a-z0-9.-]+)/(?P<path_key>[^\s\"'\\]+)"
+    r"|s3://(?P<s3_bucket>[a-z0-9.-]+)/(?P<s3_key>[^\s\"'\\]+)"
+)
+
+
+def _under(key, prefix):
+    return bool(prefix.strip("/")) and key.lstrip("/").startswith(prefix.strip("/") + "/")
+
+
+def collected_prefixes(s3_paths):
+    """
+    Return the prefixes to collect for the `s3_paths` of a bucket, without the prefixes
+    nested in another one and without the bucket root.
+    """
+    prefixes = sorted({p.strip("/") + "/" for p in s3_paths if p.strip("/")})
+    return [p for p in prefixes if not any(_under(p, other) for other in prefixes if other != p)]
+
+
+def live_keys(conf, templates):
+    """Return the keys of the templates and assets of the project, by bucket."""
+    keys = {}
+    for template in templates:
+        keys.setdefault(template.s3_bucket, set()).add(template.s3_key)
+    if "assets" in conf:
+        assets = conf["assets"]
+        keys.setdefault(assets["s3_bucket"], set()).update(
+            key.lstrip("/") for _, key in asset_keys(assets["local_path"], assets["s3_path"])
+        )
+    return keys
+
+
+def upload_prefixes(conf):
+    """Return the `s3_path` of the templates and assets of the project, by bucket."""
+    prefixes = {}
+    for section in ("templates", "assets"):
+        if section in conf:
+            prefixes.setdefault(conf[section]["s3_bucket"], set()).add(
+                conf[section].get("s3_path", "")
+            )
+    return prefixes
+
+
+@ratelimit.priority(ratelimit.BACKGROUND)
+def live_stacks(region):
+    """Return the descriptions of the existing stacks of `region`, nested stacks included."""
+    return list(select_stacks(region, nested=True))
+
+
+def s3_references(text):
+    """Return the (bucket, key) of the S3 URLs found in `text`."""
+    references = set()
+    for match in S3_URL_RE.finditer(text):
+        groups = match.groupdict()
+        for kind in ("host", "path", "s3"):
+            if groups[kind + "_bucket"]:
+                references.add((groups[kind + "_bucket"], unquote(groups[kind + "_key"])))
+    return references
+
+
+def referenced_keys(region, stacks):
+    """
+    Return the keys referenced by URL in the templates and parameters of `stacks`, by
+    bucket, and every string of these templates and parameters, which may name a key of
+    any bucket (e.g. `S3Key`).
+    """
+    client = cfn_client(region)
+
+    @ratelimit.priority(ratelimit.BACKGROUND)
+    def _strings(stack):
+        try:
+            body = client.get_template(StackName=stack["StackId"])["TemplateBody"]
+        except ClientError as e:
+            if does_not_exist(e):
+                return set()
+            raise e
+        template = parse_template(body) if isinstance(body, str) else body
+        parameters = [p.get("ParameterValue") for p in stack.get("Parameters", [])]
+        return set(template_strings([template, parameters]))
+
+    keys = {}
+    strings = set()
+    for _, values, error in run_concurrently(_strings, stacks, REFERENCES_MAX_WORKERS):
+        if error is not None:
+            # an unknown reference could be deleted
+            raise error
+        for value in values:
+            strings.add(value.lstrip("/"))
+            for bucket, key in s3_references(value):
+                keys.setdefault(bucket, set()).add(key)
+    return keys, strings
+
+
+def list_objects(region, bucket, prefix):
+    """Yield every object of `bucket` under `prefix`, page by page."""
+    paginator = s3_client(region).get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            yield obj
+
+
+def is_garbage(key, keys, own_prefixes, prefix=None, stacks=()):
+    """
+    Return True if `key` is neither a live key, nor, when collecting the sibling prefixes
+    under `prefix`, under the prefix of a stack of `stacks`.
+
+    The keys under `own_prefixes` (the `s3_path` of the project) must be live keys, and
+    the `.copy` templates are always garbage.
+    """
+    if key.endswith(TEMPLATE_COPY_SUFFIX):
+        return True
+    if key.lstrip("/") in keys:
+        return False
+    if prefix is None or any(_under(key, p) for p in own_prefixes):
+        return True
+    return key.lstrip("/")[len(prefix.lstrip("/")):].split("/", 1)[0] not in stacks
+
+
+def collect_garbage(region, bucket, prefix, keys, own_prefixes, stacks=None, older_than=None):
+    """
+    Return the garbage objects of `bucket` under `prefix` not modified since `older_than`.
+
+    The sibling prefixes of the existing `stacks` are kept when `stacks` is given, for an
+    explicit prefix: otherwise `prefix` is one of the `own_prefixes` of the project.
+    """
+    limit = datetime.now(pytz.utc) - older_than if older_than else None
+    sibling_prefix = prefix if stacks is not None else None
+    return [
+        obj
+        for obj in list_objects(region, bucket, prefix)
+        if is_garbage(obj["Key"], keys, own_prefixes, sibling_prefix, stacks or ())
+        and (limit is None or obj["LastModified"] < limit)
+    ]
+
+
+def delete_objects(region, bucket, keys):
+    """
+    Delete `keys` from `bucket` with `DeleteObjects` calls of up to 1000 keys.
+
+    Return a dict of the keys that could not be deleted with the reason of the failure.
+    """
+    client = s3_client(region)
+    batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+
+    def _delete(batch):
+        response = client.delete_objects(
+            Bucket=bucket, Delete=dict(Objects=[dict(Key=k) for k in batch], Quiet=True)
+        )
+        return {e["Key"]: e["Message"] for e in response.get("Errors", [])}
+
+    failed = {}
+    for batch, errors, error in run_concurrently(
+        _delete, [tuple(b) for b in batches], DELETE_MAX_WORKERS
+    ):
+        if error is not None:
+            failed.update({key: str(error) for key in batch})
+        else:
+            failed.update(errors)
+    return failed
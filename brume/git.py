@@ -0,0 +1,125 @@
+"""
+Git metadata of the current repository.
+
+The metadata is read directly from the `.git` directory (HEAD, refs, packed-refs and
+loose objects) and falls back to a single `git` command when an object is packed.
+It is read once per process.
+"""
+
+import os
+import shutil
+import zlib
+
+import delegator
+from brume import profiling
+
+SHORT_SHA1_LENGTH = 7
+
+_metadata = {}
+
+
+def find_git_dir(path=None):
+    """Return the `.git` directory of the repository containing `path`, or None."""
+    path = os.path.abspath(path or os.getcwd())
+    while True:
+        git_path = os.path.join(path, ".git")
+        if os.path.isdir(git_path):
+            return git_path
+        if os.path.isfile(git_path):
+            # worktrees and submodules: .git is a file pointing to the git directory
+            with open(git_path, "r") as _file:
+                content = _file.read().strip()
+            if content.startswith("gitdir:"):
+                return os.path.normpath(os.path.join(path, content[len("gitdir:"):].strip()))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def _common_dir(git_dir):
+    """Return the directory holding the refs and objects shared by every worktree."""
+    commondir = os.path.join(git_dir, "commondir")
+    if not os.path.isfile(commondir):
+        return git_dir
+    with open(commondir, "r") as _file:
+        return os.path.normpath(os.path.join(git_dir, _file.read().strip()))
+
+
+def _resolve_ref(git_dir, ref):
+    """Return the SHA1 a ref points to, from the loose refs or packed-refs, or None."""
+    for directory in (git_dir, _common_dir(git_dir)):
+        ref_path = os.path.join(directory, ref)
+        if os.path.isfile(ref_path):
+            with open(ref_path, "r") as _file:
+                return _file.read().strip()
+    packed_refs = os.path.join(_common_dir(git_dir), "packed-refs")
+    if os.path.isfile(packed_refs):
+        with open(packed_refs, "r") as _file:
+            for line in _file:
+                if line.startswith(("#", "^")):
+                    continue
+                sha1, _, name = line.strip().partition(" ")
+                if name == ref:
+                    return sha1
+    return None
+
+
+def _commit_subject(git_dir, sha1):
+    """Return the subject of a commit stored as a loose object, or None if it is packed."""
+    object_path = os.path.join(_common_dir(git_dir), "objects", sha1[:2], sha1[2:])
+    try:
+        with open(object_path, "rb") as _file:
+            content = zlib.decompress(_file.read())
+    except (IOError, zlib.error):
+        return None
+    _header, _, commit = content.partition(b"\0")
+    _headers, _, message = commit.decode("utf-8", "replace").partition("\n\n")
+    return message.split("\n", 1)[0].strip()
+
+
+def _read_head(git_dir):
+    """Return the current branch and commit SHA1 from HEAD."""
+    with open(os.path.join(git_dir, "HEAD"), "r") as _file:
+        head = _file.read().strip()
+    if head.startswith("ref:"):
+        ref = head[len("ref:"):].strip()
+        return ref.replace("refs/heads/", "", 1), _resolve_ref(git_dir, ref)
+    # detached HEAD
+    return "HEAD", head
+
+
+def _git_log():
+    """Return the current branch, commit SHA1 and subject with a single git command."""
+    c = delegator.run("git log -1 --format=%H%n%D%n%s")
+    sha1, decorations, subject = (c.out.split("\n") + ["", "", ""])[:3]
+    branch = "HEAD"
+    for decoration in decorations.split(", "):
+        if decoration.startswith("HEAD -> "):
+            branch = decoration[len("HEAD -> "):]
+    return branch, sha1.strip(), subject.strip()
+
+
+def is_installed():
+    """Return True if git is installed and available in $PATH."""
+    return shutil.which("git") is not None
+
+
+@profiling.timed("git")
+def metadata():
+    """
+    Return a dict with the current branch, commit SHA1 and commit subject, or None if
+    the current directory is not in a Git repository.
+    """
+    cwd = os.getcwd()
+    if cwd not in _metadata:
+        git_dir = find_git_dir(cwd)
+        if git_dir is None:
+            _metadata[cwd] = None
+            return None
+        branch, sha1 = _read_head(git_dir)
+        subject = _commit_subject(git_dir, sha1) if sha1 else None
+        if subject is None and is_installed():
+            branch, sha1, subject = _git_log()
+        _metadata[cwd] = dict(branch=branch, sha1=sha1 or "", subject=subject or "")
+    return _metadata[cwd]
@@ -0,0 +1,64 @@
+"""
+Stacks inventory.
+
+List the stacks of a region with a paginated `describe_stacks`, that returns the
+status, outputs, parameters and tags of up to 100 stacks per call.
+"""
+
+import click
+from brume.boto_client import cfn_client
+
+
+def parse_tags(tags):
+    """Return a dict of tags from a list of `Key=Value` strings."""
+    parsed = {}
+    for tag in tags or []:
+        key, sep, value = tag.partition("=")
+        if not sep:
+            raise click.BadParameter("{} is not a Key=Value tag".format(tag))
+        parsed[key] = value
+    return parsed
+
+
+def describe_all_stacks(region):
+    """Yield the description of every stack of `region`, page by page."""
+    paginator = cfn_client(region).get_paginator("describe_stacks")
+    for page in paginator.paginate():
+        for stack in page["Stacks"]:
+            yield stack
+
+
+def stack_tags(stack):
+    """Return the tags of a stack description as a dict."""
+    return {t["Key"]: t["Value"] for t in stack.get("Tags", [])}
+
+
+def stack_name(stack_id):
+    """Return the name of a stack from its ARN."""
+    return stack_id.split("/")[1] if stack_id.startswith("arn:") else stack_id
+
+
+def last_updated(stack):
+    """Return the last time a stack was updated (or created)."""
+    return stack.get("LastUpdatedTime") or stack["CreationTime"]
+
+
+def stack_matches(stack, prefix=None, tags=None, nested=False):
+    """Return True if a stack description matches `prefix` and `tags` (and `nested`)."""
+    if not nested and stack.get("ParentId"):
+        return False
+    if prefix and not stack["StackName"].startswith(prefix):
+        return False
+    current_tags = stack_tags(stack)
+    return all(current_tags.get(k) == v for k, v in (tags or {}).items())
+
+
+def select_stacks(region, prefix=None, tags=None, nested=False):
+    """
+    Yield the description of the stacks of `region` matching `prefix` and `tags`.
+
+    Nested stacks are excluded unless `nested` is True.
+    """
+    for stack in describe_all_stacks(region):
+        if stack_matches(stack, prefix, tags, nested):
+            yield stack
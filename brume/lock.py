@@ -0,0 +1,83 @@
+"""
+Resolved configuration lock file.
+
+`brume freeze` writes the rendered configuration, the hashes of the configuration file and
+of the templates and the resolved `cfn` outputs to a lock file, that later commands load
+with `--from-lock` instead of rendering the configuration and resolving the outputs again.
+A lock file written for another version of the configuration file is rejected.
+"""
+
+import hashlib
+import json
+
+import click
+
+DEFAULT_LOCK_FILE = "brume.lock.json"
+LOCK_VERSION = 2
+
+
+def file_hash(path):
+    """Return the SHA256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as _file:
+        for chunk in iter(lambda: _file.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def freeze(lock_file, config_file, conf, template_paths, outputs):
+    """Write the resolved configuration to `lock_file`."""
+    lock = dict(
+        version=LOCK_VERSION,
+        config_file=config_file,
+        config_hash=file_hash(config_file),
+        config=conf,
+        templates={path: file_hash(path) for path in sorted(template_paths)},
+        outputs=outputs,
+    )
+    with open(lock_file, "w") as _file:
+        json.dump(lock, _file, indent=2, sort_keys=True, default=str)
+        _file.write("\n")
+    click.echo("Configuration frozen in {}".format(lock_file))
+
+
+def load(lock_file):
+    """
+    Return the content of `lock_file`, exit if the configuration file changed since it was
+    written and warn about the changed templates.
+    """
+    try:
+        with open(lock_file, "r") as _file:
+            lock = json.load(_file)
+    except (IOError, ValueError) as err:
+        click.secho("[ERROR] Cannot load lock file {}: {}".format(lock_file, err), err=True, fg="red")
+        exit(1)
+    if lock.get("version") != LOCK_VERSION:
+        click.secho("[ERROR] Unsupported lock file {}".format(lock_file), err=True, fg="red")
+        exit(1)
+    try:
+        config_changed = file_hash(lock["config_file"]) != lock["config_hash"]
+    except IOError:
+        # the configuration file is not needed with a lock file
+        config_changed = False
+    if config_changed:
+        click.secho(
+            "[ERROR] {} changed since {} was written, run `brume freeze` again".format(
+                lock["config_file"], lock_file
+            ),
+            err=True,
+            fg="red",
+        )
+        exit(1)
+    for path, digest in lock["templates"].items():
+        try:
+            changed = file_hash(path) != digest
+        except IOError:
+            changed = True
+        if changed:
+            click.secho(
+                "[WARN] Template {} changed since {} was written".format(path, lock_file),
+                err=True,
+                fg="red",
+            )
+    return lock
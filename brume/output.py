@@ -3,9 +3,35 @@ Output stack utility.
 
 """
 
-import click
+from concurrent.futures import ThreadPoolExecutor
+
 from botocore.exceptions import ClientError
-from brume.boto_client import cfn_client
+from brume import boto_client, cache, profiling
+from brume.boto_client import cfn_client, does_not_exist, exit_if_stack_missing
+
+WALKER_MAX_WORKERS = 8
+
+
+def nested_stacks(client, stack):
+    """
+    :param client: cloudformation client
+    :param stack: stack name or id
+    :return: the nested stack resources of the stack
+    """
+    paginator = client.get_paginator("list_stack_resources")
+    return [
+        s
+        for page in paginator.paginate(StackName=stack)
+        for s in page["StackResourceSummaries"]
+        if s["ResourceType"] == "AWS::CloudFormation::Stack"
+    ]
+
+
+def _visit(client, outputs, stack, collector):
+    """Collect the description of a stack and return its nested stack resources."""
+    description = client.describe_stacks(StackName=stack)["Stacks"][0]
+    collector(outputs, description)
+    return nested_stacks(client, stack)
 
 
 def _stack_walker(client, outputs, stack, collector):
@@ -16,28 +42,157 @@ def _stack_walker(client, outputs, stack, collector):
     :param collector: function (outputs, description)
     :return: aggregated output
     Map collector function on stack and nested stack.
+
+    The stacks are walked breadth-first: every stack of a nesting level is visited
+    concurrently on the same client (or by `brume.aio` with the asyncio engine).
     """
+    level = [(outputs, stack)]
     try:
-        description = client.describe_stacks(StackName=stack)["Stacks"][0]
-        collector(outputs, description)
-        substacks = [
-            s
-            for s in client.describe_stack_resources(StackName=stack)["StackResources"]
-            if s["ResourceType"] == "AWS::CloudFormation::Stack"
-        ]
-        for s in substacks:
-            outputs[s["LogicalResourceId"]] = {}
-            _stack_walker(
-                client, outputs[s["LogicalResourceId"]], s["PhysicalResourceId"], collector
-            )
+        if boto_client.uses_asyncio():
+            from brume import aio  # pylint: disable=import-outside-toplevel
+
+            return aio.walk_stacks(client.meta.region_name, outputs, stack, collector)
+        with ThreadPoolExecutor(max_workers=WALKER_MAX_WORKERS) as executor:
+            while level:
+                substacks = executor.map(lambda n: _visit(client, n[0], n[1], collector), level)
+                next_level = []
+                for (current, _), resources in zip(level, list(substacks)):
+                    for s in resources:
+                        substack_outputs = current[s["LogicalResourceId"]] = {}
+                        next_level.append((substack_outputs, s["PhysicalResourceId"]))
+                level = next_level
         return outputs
     except ClientError as e:
-        if "does not exist" in e.response["Error"]["Message"]:
-            click.secho("Stack [{}] does not exist".format(stack), err=True, fg="red")
-            exit(1)
-        else:
+        exit_if_stack_missing(e, stack)
+        raise e
+
+
+class StackOutputs:
+    """
+    Outputs of a stack, and of its nested stacks, fetched lazily.
+
+    Only the stacks needed by a lookup are described: the outputs of the stack itself,
+    then the nested stacks named by the lookup keys.
+    """
+
+    def __init__(self, client, stack, snapshot=None):
+        self.client = client
+        self.stack = stack
+        self.snapshot = snapshot
+        self._outputs = None
+        self._description = None
+        self._version = None
+        self._nested = {}
+
+    def expire(self):
+        """
+        Forget the fetched outputs, so that the next lookup fetches them again.
+
+        The nested stacks found are kept as long as the stack is not updated.
+        """
+        if self._version is None:
+            # never described: the nested stacks cannot be checked
+            self._nested = {}
+        self._outputs = None
+        self._description = None
+        self.snapshot = None
+        for nested in self._nested.values():
+            if nested is not None:
+                nested.expire()
+
+    def _describe(self):
+        """Fetch the outputs of the stack, raise a ClientError if it cannot be described."""
+        if self._outputs is None and self.snapshot is not None:
+            self._outputs = self.snapshot.outputs(self.stack, nested=False)
+        if self._outputs is None:
+            description = self.client.describe_stacks(StackName=self.stack)["Stacks"][0]
+            if _version(description) != self._version:
+                self._nested = {}
+            outputs = {}
+            _output_collector(outputs, description)
+            self._description = description
+            self._version = _version(description)
+            self._outputs = outputs
+
+    def _describe_or_exit(self):
+        """Fetch the outputs of the stack, exit if it does not exist."""
+        try:
+            self._describe()
+        except ClientError as e:
+            exit_if_stack_missing(e, self.stack)
             raise e
 
+    @property
+    def outputs(self):
+        """Return the outputs of the stack, without its nested stacks."""
+        self._describe_or_exit()
+        return self._outputs
+
+    def nested(self, logical_id):
+        """Return the StackOutputs of the `logical_id` nested stack, None if there is none."""
+        if self._outputs is None and self._version is not None:
+            # expired: the nested stacks are only kept if the stack was not updated since
+            self._describe()
+        if logical_id not in self._nested and self.snapshot is not None:
+            child = self.snapshot.children(self.stack).get(logical_id)
+            self._nested[logical_id] = (
+                StackOutputs(self.client, child["StackId"], self.snapshot) if child else None
+            )
+        if logical_id not in self._nested:
+            try:
+                resource = self.client.describe_stack_resource(
+                    StackName=self.stack, LogicalResourceId=logical_id
+                )["StackResourceDetail"]
+            except ClientError as e:
+                if not does_not_exist(e):
+                    raise e
+                resource = None
+            if resource is None or resource["ResourceType"] != "AWS::CloudFormation::Stack":
+                self._nested[logical_id] = None
+            else:
+                self._nested[logical_id] = StackOutputs(
+                    self.client, resource["PhysicalResourceId"]
+                )
+        return self._nested[logical_id]
+
+    def lookup(self, key, *sub_keys):
+        """
+        Return the value of `key` in the outputs, descending into the nested stacks
+        named by `key` and `sub_keys`. Raise a KeyError if a key is not found.
+        """
+        if not sub_keys and key in self.outputs:
+            return self.outputs[key]
+        nested = self.nested(key)
+        if nested is None:
+            raise KeyError(key)
+        if sub_keys:
+            return nested.lookup(*sub_keys)
+        return nested.to_dict()
+
+    def prefetch(self, *keys):
+        """
+        Fetch the stacks needed to look up `keys`, so that the lookup does not call AWS.
+
+        Errors are ignored here, they are reported by the lookup.
+        """
+        stack = self
+        try:
+            stack._describe()
+            for key in keys[:-1]:
+                stack = stack.nested(key)
+                if stack is None:
+                    return
+                stack._describe()
+        except ClientError:
+            return
+
+    def to_dict(self):
+        """Return the outputs of the stack and of all its nested stacks."""
+        if self.snapshot is not None:
+            return self.snapshot.outputs(self.stack)
+        self._describe_or_exit()
+        return _cached_outputs(self.client, self._description)
+
 
 def _output_collector(outputs, description):
     """
@@ -47,6 +202,37 @@ def _output_collector(outputs, description):
         outputs[o["OutputKey"]] = o["OutputValue"]
 
 
+def _version(description):
+    """Return the version (last update) of a described stack."""
+    return description.get("LastUpdatedTime") or description["CreationTime"]
+
+
+def _cached_outputs(client, description):
+    """
+    Return the outputs of a described stack and of its nested stacks, cached on disk for
+    the current version (last update) of the stack.
+    """
+    region = client.meta.region_name
+    version = _version(description)
+    outputs = cache.get("outputs", region, description["StackId"], version)
+    if outputs is None:
+        outputs = _stack_walker(client, {}, description["StackId"], _output_collector)
+        cache.put("outputs", outputs, region, description["StackId"], version)
+    return outputs
+
+
+@profiling.timed("outputs")
 def stack_outputs(region, stack_name):
-    """Return specified stack outputs."""
-    return _stack_walker(cfn_client(region=region), {}, stack_name, _output_collector)
+    """
+    Return specified stack outputs.
+
+    The outputs are cached on disk for the current version of the stack, so that checking
+    whether the cache is still valid only costs a `describe_stacks`.
+    """
+    client = cfn_client(region=region)
+    try:
+        description = client.describe_stacks(StackName=stack_name)["Stacks"][0]
+    except ClientError as e:
+        exit_if_stack_missing(e, stack_name)
+        raise e
+    return _cached_outputs(client, description)
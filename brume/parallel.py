@@ -0,0 +1,32 @@
+"""
+Bounded concurrent execution.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def _call(func, item):
+    try:
+        return func(item), None
+    except (Exception, SystemExit) as err:  # pylint: disable=broad-except
+        return None, err
+
+
+def run_concurrently(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Call `func` on every element of `items` with at most `max_workers` threads.
+
+    Yield `(item, result, error)` tuples as soon as each call returns, `error` being the
+    exception raised by `func` (`SystemExit` included) or `None`.
+    """
+    items = list(items)
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        futures = {executor.submit(_call, func, item): item for item in items}
+        for future in as_completed(futures):
+            result, error = future.result()
+            yield futures[future], result, error
@@ -0,0 +1,238 @@
+"""
+Profiling of brume commands.
+
+When enabled with `--profile`, brume records the wall time spent in each phase of a
+command (configuration rendering, template validation, uploads, stack events polling)
+and counts and times every AWS API call by service, operation and outcome, including
+the retries and throttles reported by botocore.
+"""
+
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import click
+
+THROTTLING_ERRORS = [
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "TooManyRequestsException",
+    "SlowDown",
+]
+
+enabled = False
+output = None
+
+_lock = threading.Lock()
+_started = None
+_profiler = None
+# phase name -> [count, total seconds]
+_phases = {}
+# (service, operation, outcome) -> [count, total seconds]
+_calls = {}
+# (service, operation) -> [retries, throttles]
+_retries = {}
+_trace = []
+
+
+def enable(profile_out=None):
+    """Start recording; a cProfile is also run unless `profile_out` is a JSON trace."""
+    global enabled, output, _started, _profiler  # pylint: disable=global-statement
+    enabled = True
+    output = profile_out or output
+    _started = _started or time.time()
+    if output and not output.endswith(".json") and _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def reset():
+    """Stop recording and forget the recorded phases and API calls."""
+    global enabled, output, _started, _profiler  # pylint: disable=global-statement
+    if _profiler is not None:
+        _profiler.disable()
+    enabled = False
+    output = _started = _profiler = None
+    with _lock:
+        for table in (_phases, _calls, _retries):
+            table.clear()
+        del _trace[:]
+
+
+def _record(table, key, elapsed):
+    with _lock:
+        entry = table.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+
+@contextmanager
+def phase(name):
+    """Record the wall time spent in the `name` phase."""
+    if not enabled:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        elapsed = time.time() - start
+        _record(_phases, name, elapsed)
+        with _lock:
+            _trace.append(
+                dict(type="phase", name=name, start=start - _started, duration=elapsed)
+            )
+
+
+def timed(name):
+    """Decorator recording the wall time of every call of the function as `name` phase."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _operation(model):
+    return model.service_model.service_name, model.name
+
+
+def _before_call(model, context, **_kwargs):
+    if enabled:
+        context["brume_start"] = time.time()
+
+
+def _after_call(model, context, parsed, **_kwargs):
+    start = context.get("brume_start")
+    if start is None:
+        return
+    service, operation = _operation(model)
+    error = parsed.get("Error", {}).get("Code")
+    outcome = error or "ok"
+    elapsed = time.time() - start
+    _record(_calls, (service, operation, outcome), elapsed)
+    retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+    if retries:
+        with _lock:
+            _retries.setdefault((service, operation), [0, 0])[0] += retries
+    with _lock:
+        _trace.append(
+            dict(
+                type="call",
+                service=service,
+                operation=operation,
+                outcome=outcome,
+                retries=retries,
+                start=start - _started,
+                duration=elapsed,
+            )
+        )
+
+
+def _after_call_error(model, context, exception, **_kwargs):
+    start = context.get("brume_start")
+    if start is None:
+        return
+    service, operation = _operation(model)
+    _record(_calls, (service, operation, type(exception).__name__), time.time() - start)
+
+
+def _needs_retry(response, operation, **_kwargs):
+    if not enabled or response is None:
+        return
+    error = response[1].get("Error", {}).get("Code")
+    if error in THROTTLING_ERRORS:
+        key = (operation.service_model.service_name, operation.name)
+        with _lock:
+            _retries.setdefault(key, [0, 0])[1] += 1
+
+
+def instrument(client):
+    """Register the API call accounting hooks on a boto client, at most once."""
+    events = client.meta.events
+    events.register("before-call", _before_call, unique_id="brume-profiling-before-call")
+    events.register("after-call", _after_call, unique_id="brume-profiling-after-call")
+    events.register(
+        "after-call-error", _after_call_error, unique_id="brume-profiling-after-call-error"
+    )
+    events.register("needs-retry", _needs_retry, unique_id="brume-profiling-needs-retry")
+    return client
+
+
+def summary():
+    """Return the recorded phases and API calls as a dict."""
+    with _lock:
+        return dict(
+            duration=time.time() - _started,
+            phases=[
+                dict(name=name, count=count, duration=total)
+                for name, (count, total) in sorted(_phases.items())
+            ],
+            calls=[
+                dict(
+                    service=service,
+                    operation=operation,
+                    outcome=outcome,
+                    count=count,
+                    duration=total,
+                    retries=_retries.get((service, operation), [0, 0])[0],
+                    throttles=_retries.get((service, operation), [0, 0])[1],
+                )
+                for (service, operation, outcome), (count, total) in sorted(_calls.items())
+            ],
+            trace=list(_trace),
+        )
+
+
+def print_summary(profile):
+    """Print the phases and API calls of a summary on stderr."""
+    click.secho("Profile: {:.3f}s".format(profile["duration"]), err=True, bold=True)
+    if profile["phases"]:
+        click.echo("  {:<30} {:>7} {:>10}".format("PHASE", "COUNT", "TIME"), err=True)
+    for p in profile["phases"]:
+        click.echo(
+            "  {:<30} {:>7} {:>9.3f}s".format(p["name"], p["count"], p["duration"]), err=True
+        )
+    if profile["calls"]:
+        click.echo(
+            "  {:<50} {:>7} {:>10} {:>7} {:>9}".format(
+                "API CALL", "COUNT", "TIME", "RETRIES", "THROTTLES"
+            ),
+            err=True,
+        )
+    for c in profile["calls"]:
+        name = "{}.{} [{}]".format(c["service"], c["operation"], c["outcome"])
+        click.echo(
+            "  {:<50} {:>7} {:>9.3f}s {:>7} {:>9}".format(
+                name, c["count"], c["duration"], c["retries"], c["throttles"]
+            ),
+            err=True,
+        )
+    click.echo(
+        "  Total: {} API calls".format(sum(c["count"] for c in profile["calls"])), err=True
+    )
+
+
+def report():
+    """Print the profile and write the cProfile dump or JSON trace, if any."""
+    if not enabled:
+        return
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(output)
+    profile = summary()
+    print_summary(profile)
+    if output and output.endswith(".json"):
+        with open(output, "w") as _file:
+            json.dump(profile, _file, indent=2)
@@ -0,0 +1,154 @@
+"""
+Multi-stack projects.
+
+A project declares several stacks in the `stacks` block of the configuration file.
+Stacks depend on each other either explicitly (`depends_on`) or through `cfn` lookups of
+the outputs of another stack of the project, and are deployed in topological waves.
+"""
+
+import click
+import crayons
+from brume import config, snapshot
+from brume.config import Config
+from brume.parallel import run_concurrently
+from brume.stack import Stack
+
+DEFAULT_PARALLELISM = 4
+
+
+def _pending_stacks(node):
+    """Return the names of the stacks whose outputs are still pending in `node`."""
+    if isinstance(node, dict):
+        return set().union(*[_pending_stacks(v) for v in node.values()])
+    if isinstance(node, list):
+        return set().union(*[_pending_stacks(v) for v in node])
+    if isinstance(node, str):
+        return set(config.PENDING_OUTPUT_RE.findall(node))
+    return set()
+
+
+def is_project(conf):
+    """Return True if the configuration describes a multi-stack project."""
+    return "stacks" in conf
+
+
+class Project:
+    """A set of CloudFormation stacks deployed together."""
+
+    def __init__(self, region, conf):
+        self.region = region
+        self.stacks = conf["stacks"]
+        self.parallelism = conf.get("parallelism", DEFAULT_PARALLELISM)
+
+    def dependencies(self):
+        """Return a dict of the stacks each stack of the project depends on."""
+        keys_by_name = {conf["stack_name"]: key for key, conf in self.stacks.items()}
+        dependencies = {}
+        for key, conf in self.stacks.items():
+            depends_on = set(conf.get("depends_on", []))
+            unknown = depends_on - set(self.stacks)
+            if unknown:
+                click.secho(
+                    "[ERROR] Stack {} depends on unknown stacks: {}".format(
+                        key, ", ".join(sorted(unknown))
+                    ),
+                    err=True,
+                    fg="red",
+                )
+                exit(1)
+            depends_on.update(
+                keys_by_name[name] for name in _pending_stacks(conf) if name in keys_by_name
+            )
+            dependencies[key] = depends_on
+        return dependencies
+
+    def waves(self):
+        """
+        Return the stacks of the project grouped in waves.
+
+        Every stack of a wave only depends on stacks of the previous waves.
+        """
+        dependencies = self.dependencies()
+        waves = []
+        done = set()
+        while len(done) < len(dependencies):
+            wave = sorted(k for k, deps in dependencies.items() if k not in done and deps <= done)
+            if not wave:
+                click.secho(
+                    "[ERROR] Circular dependency between stacks: {}".format(
+                        ", ".join(sorted(set(dependencies) - done))
+                    ),
+                    err=True,
+                    fg="red",
+                )
+                exit(1)
+            waves.append(wave)
+            done.update(wave)
+        return waves
+
+    def stack(self, key, label=None):
+        """Return the brume.Stack for the `key` stack of the project."""
+        if key not in self.stacks:
+            click.secho("[ERROR] No stack {} in project".format(key), err=True, fg="red")
+            exit(1)
+        return Stack(self.region, self.stacks[key], label=label)
+
+    def select(self, key):
+        """
+        Return the brume.Stack for the `key` stack of the project, with the `cfn` lookups of
+        the stacks it depends on resolved against their current outputs.
+
+        The lookups of the other stacks of the project that are not deployed yet stay
+        deferred, so that a single stack of a fresh project can be deployed.
+        """
+        stack = self.stack(key)
+        dependencies = {self.stacks[k]["stack_name"] for k in self.dependencies()[key]}
+        siblings = [
+            conf["stack_name"]
+            for conf in self.stacks.values()
+            if conf["stack_name"] not in dependencies
+        ]
+        config.deferred_stacks = {
+            name
+            for name, exists, error in run_concurrently(stack.exists, siblings, self.parallelism)
+            if error is not None or not exists
+        }
+        self.stacks = Config.load(reload=True)["stacks"]
+        return self.stack(key)
+
+    def _deploy_stack(self, key):
+        stack = self.stack(key, label=key)
+        stack.create_or_update(allow_no_op=True)
+        return stack.is_deployed()
+
+    def deploy(self, parallelism=None):
+        """
+        Create or update every stack of the project.
+
+        Independent stacks are deployed concurrently, at most `parallelism` at a time.
+        Once a wave is deployed, the configuration is rendered again so that the next
+        stacks get the fresh outputs of the stacks they depend on.
+        """
+        parallelism = parallelism or self.parallelism
+        for wave in self.waves():
+            self.stacks = Config.load(reload=True)["stacks"]
+            click.echo(
+                "Deploying stacks {}".format(", ".join(str(crayons.yellow(k)) for k in wave))
+            )
+            failed = [
+                key
+                for key, deployed, error in run_concurrently(self._deploy_stack, wave, parallelism)
+                if error is not None or not deployed
+            ]
+            if failed:
+                click.secho(
+                    "[ERROR] Failed to deploy stacks: {}".format(", ".join(sorted(failed))),
+                    err=True,
+                    fg="red",
+                )
+                exit(1)
+            snapshot.invalidate()
+            for key in wave:
+                name = self.stacks[key]["stack_name"]
+                config.deferred_stacks.discard(name)
+                config.stack_outputs_definition.pop((self.region, name), None)
@@ -0,0 +1,189 @@
+"""
+Rate limiting of the AWS API calls.
+
+Every attempt of a call of an instrumented client, retries included, takes a token from
+the bucket of its operation before it is sent, so that concurrent brume features share the
+per-account API limits of CloudFormation instead of causing throttling storms. A throttled
+attempt halves the rate of its operation, which then grows back with every successful
+call (AIMD).
+
+Calls have a priority: interactive work (`Stack.tail`) takes the tokens before normal
+work, which takes them before background work (template validation, garbage collection).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from brume.profiling import THROTTLING_ERRORS
+
+INTERACTIVE, NORMAL, BACKGROUND = 0, 1, 2
+
+# calls per second by operation; a bucket holds the tokens of BURST_SECONDS at this rate
+DEFAULT_RATE = 20.0
+BURST_SECONDS = 5
+RATES = {
+    "cloudformation.DescribeStackEvents": 10.0,
+    "cloudformation.DescribeStacks": 20.0,
+    "cloudformation.ValidateTemplate": 10.0,
+    "cloudformation.DescribeStackDriftDetectionStatus": 20.0,
+}
+# services without a low per-account limit
+UNLIMITED_SERVICES = ["s3"]
+MIN_RATE = 0.5
+# rate recovered by every successful call, as a fraction of the configured rate
+RATE_INCREASE = 0.05
+
+enabled = True
+
+_buckets = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class TokenBucket:
+    """Token bucket with an adaptive rate and prioritized waiters."""
+
+    def __init__(self, rate, burst=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or BURST_SECONDS * rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.condition = threading.Condition()
+        self.waiting = [0, 0, 0]
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self, priority):
+        """Take a token and return 0, or return the seconds to wait before trying again."""
+        self._refill()
+        ahead = any(self.waiting[:priority])
+        if self.tokens >= 1 and not ahead:
+            self.tokens -= 1
+            return 0
+        return 1.0 / self.rate if ahead else (1 - self.tokens) / self.rate
+
+    def acquire(self, priority=NORMAL):
+        """Wait for a token, after the waiters of a higher priority."""
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                wait = self._take(priority)
+                while wait:
+                    self.condition.wait(wait)
+                    wait = self._take(priority)
+            finally:
+                self.waiting[priority] -= 1
+                self.condition.notify_all()
+
+    def try_acquire(self, priority=NORMAL):
+        """Take a token without waiting and return 0, or return the seconds to wait for one."""
+        with self.condition:
+            return self._take(priority)
+
+    def penalize(self):
+        """Halve the rate and drop the burst after a throttled call."""
+        with self.condition:
+            self._refill()
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+    def reward(self):
+        """Grow the rate back after a successful call."""
+        with self.condition:
+            if self.rate < self.max_rate:
+                self._refill()
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_INCREASE)
+
+
+def bucket(service, operation):
+    """Return the token bucket of an operation, or None if the operation is not limited."""
+    if service in UNLIMITED_SERVICES:
+        return None
+    key = "{}.{}".format(service, operation)
+    with _lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(RATES.get(key, DEFAULT_RATE))
+        return _buckets[key]
+
+
+def reset():
+    """Forget the rates learned from the throttled calls."""
+    with _lock:
+        _buckets.clear()
+
+
+def current_priority():
+    """Return the priority of the API calls of the current thread."""
+    return getattr(_local, "priority", NORMAL)
+
+
+@contextmanager
+def priority(level):
+    """Run the API calls of the current thread with the priority `level`."""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def _bucket(model):
+    return bucket(model.service_model.service_name, model.name)
+
+
+def _acquire(service, operation):
+    limiter = bucket(service, operation) if enabled else None
+    if limiter is not None:
+        limiter.acquire(current_priority())
+
+
+def _before_call(model, **_kwargs):
+    _acquire(model.service_model.service_name, model.name)
+
+
+def _request_created(request, operation_name, event_name, **_kwargs):
+    """Take a token for the retries of a call, its first attempt took one in `before-call`."""
+    if request.context.get("retries", {}).get("attempt", 1) > 1:
+        _acquire(event_name.split(".")[1], operation_name)
+
+
+def _after_call(model, parsed, **_kwargs):
+    limiter = _bucket(model)
+    if limiter is not None and parsed.get("Error", {}).get("Code") not in THROTTLING_ERRORS:
+        limiter.reward()
+
+
+def _needs_retry(response, operation, **_kwargs):
+    """Penalize every throttled attempt, the last one included (not retried)."""
+    if response is None or response[1].get("Error", {}).get("Code") not in THROTTLING_ERRORS:
+        return
+    limiter = _bucket(operation)
+    if limiter is not None:
+        limiter.penalize()
+
+
+def instrument(client, acquire=True):
+    """
+    Register the rate limiting hooks on a boto client, at most once.
+
+    Without `acquire`, the caller takes the tokens of the calls itself (see `brume.aio`),
+    and the retries are not limited: only the rates are adapted to the throttled calls.
+    """
+    events = client.meta.events
+    if acquire:
+        # first, so that the calls answered by a `before-call` hook are limited too
+        events.register_first(
+            "before-call", _before_call, unique_id="brume-ratelimit-before-call"
+        )
+        events.register(
+            "request-created", _request_created, unique_id="brume-ratelimit-request-created"
+        )
+    events.register("after-call", _after_call, unique_id="brume-ratelimit-after-call")
+    events.register("needs-retry", _needs_retry, unique_id="brume-ratelimit-needs-retry")
+    return client
@@ -0,0 +1,109 @@
+"""
+Region-wide snapshot of the stacks.
+
+When enabled, the description of every stack of a region (nested stacks included) is
+fetched once with a paginated `describe_stacks` and indexed in memory, then outputs and
+parameters are resolved from this index instead of a few calls per stack.
+"""
+
+import threading
+
+import click
+from brume.boto_client import cfn_client
+from brume.inventory import describe_all_stacks
+from brume.output import nested_stacks
+
+# resolve outputs and parameters from a snapshot of the region
+enabled = False
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def get(region):
+    """Return the snapshot of `region`, taken on first use."""
+    with _lock:
+        if region not in _snapshots:
+            _snapshots[region] = Snapshot(region, describe_all_stacks(region))
+        return _snapshots[region]
+
+
+def invalidate(region=None):
+    """Forget the snapshot of `region` (of every region by default), e.g. after a deployment."""
+    with _lock:
+        if region is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(region, None)
+
+
+def _logical_id(parent, child):
+    """
+    Return the logical id of a nested stack in its parent, derived from the name
+    CloudFormation gives nested stacks (`<parent>-<LogicalId>-<suffix>`), or None.
+    """
+    prefix = parent["StackName"] + "-"
+    if not child["StackName"].startswith(prefix):
+        return None
+    logical_id, sep, _suffix = child["StackName"][len(prefix):].rpartition("-")
+    return logical_id if sep and logical_id else None
+
+
+class Snapshot:
+    """Stacks of a region indexed by name, id and parent."""
+
+    def __init__(self, region, stacks):
+        self.region = region
+        self.by_name = {}
+        self.by_id = {}
+        self.by_parent = {}
+        for stack in stacks:
+            self.by_name[stack["StackName"]] = stack
+            self.by_id[stack["StackId"]] = stack
+            if stack.get("ParentId"):
+                self.by_parent.setdefault(stack["ParentId"], []).append(stack)
+        self._children = {}
+
+    def find(self, stack):
+        """Return the description of a stack from its name or id."""
+        description = self.by_id.get(stack) or self.by_name.get(stack)
+        if description is None:
+            click.secho("Stack [{}] does not exist".format(stack), err=True, fg="red")
+            exit(1)
+        return description
+
+    def children(self, stack):
+        """Return a dict of the nested stacks of a stack by logical id."""
+        parent = self.find(stack)
+        if parent["StackId"] not in self._children:
+            nested = self.by_parent.get(parent["StackId"], [])
+            children = {_logical_id(parent, s): s for s in nested}
+            if None in children:
+                resources = nested_stacks(cfn_client(self.region), parent["StackId"])
+                logical_ids = {r["PhysicalResourceId"]: r["LogicalResourceId"] for r in resources}
+                children = {
+                    logical_ids[s["StackId"]]: s for s in nested if s["StackId"] in logical_ids
+                }
+            self._children[parent["StackId"]] = children
+        return self._children[parent["StackId"]]
+
+    def outputs(self, stack, nested=True):
+        """
+        Return the outputs of a stack and its nested stacks, like `stack_outputs`.
+
+        If `nested` is False, only return the outputs of the stack itself.
+        """
+        outputs = {o["OutputKey"]: o["OutputValue"] for o in self.find(stack).get("Outputs", [])}
+        if not nested:
+            return outputs
+        for logical_id, child in self.children(stack).items():
+            outputs[logical_id] = self.outputs(child["StackId"])
+        return outputs
+
+    def parameters(self, stack):
+        """Return the parameters of a stack and its direct nested stacks, like `Stack.params`."""
+        stacks = [stack] + [s["StackId"] for s in self.children(stack).values()]
+        return {
+            s: {p["ParameterKey"]: p["ParameterValue"] for p in self.find(s).get("Parameters", [])}
+            for s in stacks
+        }
@@ -1,41 +1,24 @@
 """Stack."""
 
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import click
 import crayons
 import pytz
 from botocore.exceptions import ClientError
-from brume.boto_client import cfn_client
+from brume import events as event_sinks
+from brume import profiling, ratelimit, snapshot
+from brume.boto_client import cfn_client, does_not_exist, exit_if_stack_missing
 from brume.color import Color
 from brume.config import Config
-from brume.output import stack_outputs
+from brume.output import WALKER_MAX_WORKERS, nested_stacks, stack_outputs
 from brume.template import Template
 
 TZ = pytz.timezone("UTC")
 
 
-def _print_log_headers():
-    click.echo(
-        "{:23s} {:36s} {:30s} {:30s} {}".format(
-            "Timestamp", "Status", "Resource", "Type", "Reason"
-        )
-    )
-
-
-def _log_event(event):
-    click.echo(
-        "{:23s} {:36s} {:30s} {:30s} {}".format(
-            event["Timestamp"].strftime("%Y-%m-%d %H:%M:%S UTC"),
-            Color.for_status(event["ResourceStatus"]),
-            event["LogicalResourceId"],
-            event["ResourceType"],
-            event.get("ResourceStatusReason", ""),
-        )
-    )
-
-
 def _make_tags(tags_list):
     return [{"Key": k, "Value": v} for k, v in tags_list.items()]
 
@@ -50,15 +33,16 @@ class Stack:
     stack_name = None
     capabilities = []
 
-    def __init__(self, region, conf):
+    def __init__(self, region, conf, label=None, templates=None):
         self.stack_name = conf["stack_name"]
         self.template_body = conf["template_body"]
         self.on_failure = conf.get("on_failure", "ROLLBACK")
         self.capabilities = conf.get("capabilities", [])
         self.parameters = _make_parameters(conf.get("parameters", {}))
         self.tags = _make_tags(conf.get("tags", {}))
-        self.main_template = Template(self.template_body, Config.config["templates"])
+        self.main_template = Template(self.template_body, templates or Config.config["templates"])
         self.region = region
+        self.log_prefix = "[{}] ".format(label) if label else ""
 
         # Check the events 10 seconds before if the stack update starts way too soon
         self.update_started_at = datetime.now(TZ) - timedelta(seconds=10)
@@ -86,31 +70,38 @@ class Stack:
         """
         return cfn_client(self.region)
 
-    def get_stacks(self):
-        """Return a list of stacks containing the current stack and its nested stack resources."""
-        stacks = [self.stack_name]
-        substacks = self.cloudformation_client().describe_stack_resources(
-            StackName=self.stack_name
-        )
-        stacks.extend(
-            [
-                s["PhysicalResourceId"]
-                for s in substacks["StackResources"]
-                if s["ResourceType"] == "AWS::CloudFormation::Stack"
-            ]
-        )
+    def get_stacks(self, recursive=False):
+        """
+        Return a list of stacks containing the current stack and its nested stack resources,
+        and theirs with `recursive` (the stacks of a nesting level are listed concurrently).
+        """
+        client = self.cloudformation_client()
+        stacks = []
+        level = [self.stack_name]
+        with ThreadPoolExecutor(max_workers=WALKER_MAX_WORKERS) as executor:
+            while level:
+                stacks.extend(level)
+                resources = executor.map(lambda stack: nested_stacks(client, stack), level)
+                level = [s["PhysicalResourceId"] for nested in resources for s in nested]
+                if not recursive:
+                    stacks.extend(level)
+                    break
         return stacks
 
     def outputs(self):
         """
         Return a dict containing the outputs of the current stack and its nested stacks.
         """
+        if snapshot.enabled:
+            return snapshot.get(self.region).outputs(self.stack_name)
         return stack_outputs(region=self.region, stack_name=self.stack_name)
 
     def params(self):
         """
         Return a dict containing the parameters of the current stack and its nested stacks.
         """
+        if snapshot.enabled:
+            return snapshot.get(self.region).parameters(self.stack_name)
         try:
             return {
                 stack: {
@@ -122,13 +113,8 @@ class Stack:
                 for stack in self.get_stacks()
             }
         except ClientError as e:
-            if "does not exist" in e.response["Error"]["Message"]:
-                click.secho(
-                    "Stack [{0}] does not exist".format(self.stack_name), err=True, fg="red"
-                )
-                exit(1)
-            else:
-                raise e
+            exit_if_stack_missing(e, self.stack_name)
+            raise e
 
     def exists(self, stack_name):
         """
@@ -137,7 +123,7 @@ class Stack:
         try:
             self.cloudformation_client().describe_stacks(StackName=stack_name)
         except ClientError as e:
-            if "does not exist" in e.response["Error"]["Message"]:
+            if does_not_exist(e):
                 return False
         else:
             return True
@@ -146,7 +132,7 @@ class Stack:
         """
         Create the stack in CloudFormation.
         """
-        click.echo("Creating stack {0}...".format(self.stack_name))
+        click.echo("{0}Creating stack {1}...".format(self.log_prefix, self.stack_name))
         try:
             self.cloudformation_client().create_stack(**self.configuration)
             time.sleep(5)
@@ -161,38 +147,37 @@ class Stack:
             else:
                 click.secho(error_message, err=True, fg="red")
 
-    def update(self):
+    def update(self, allow_no_op=False):
         """
         Update the stack in CloudFormation if it exists.
+
+        If `allow_no_op` is True, an update with no changes is not considered as an error.
         """
-        click.echo("Updating stack {0}...".format(self.stack_name))
+        click.echo("{0}Updating stack {1}...".format(self.log_prefix, self.stack_name))
         try:
             self.cloudformation_client().update_stack(**self.configuration)
             self.tail()
         except ClientError as err:
+            exit_if_stack_missing(err, self.stack_name)
             error_message = err.response["Error"]["Message"]
-            if "does not exist" in error_message:
-                click.secho(
-                    "Stack [{0}] does not exist".format(self.stack_name), err=True, fg="red"
-                )
-                exit(1)
-            elif "No updates are to be performed." in error_message:
+            if "No updates are to be performed." in error_message:
                 click.echo(
                     crayons.yellow(
                         "No updates are to be performed on stack [{}]".format(self.stack_name)
                     ),
                     err=True,
                 )
-                exit(1)
+                if not allow_no_op:
+                    exit(1)
             else:
                 click.secho(error_message, err=True, fg="red")
 
-    def create_or_update(self):
+    def create_or_update(self, allow_no_op=False):
         """
         Create or update the stack in CloudFormation if it already exists.
         """
         if self.exists(self.stack_name):
-            self.update()
+            self.update(allow_no_op=allow_no_op)
         else:
             self.create()
 
@@ -212,22 +197,34 @@ class Stack:
             click.secho("Stack [{0}] does not exist".format(self.stack_name), err=True, fg="red")
             exit(1)
 
+    def stack_status(self):
+        """
+        Return the current status of the stack in CloudFormation.
+        """
+        stacks = self.cloudformation_client().describe_stacks(StackName=self.stack_name)
+        return next(s["StackStatus"] for s in stacks["Stacks"])
+
+    def is_deployed(self):
+        """
+        Return True if the last create or update operation of the stack succeeded.
+        """
+        try:
+            status = self.stack_status()
+        except ClientError:
+            return False
+        return status in ("CREATE_COMPLETE", "UPDATE_COMPLETE", "IMPORT_COMPLETE")
+
     def status(self):
         """
         Return the status of the stack in CloudFormation, based on the last stack event.
         """
         try:
-            stacks = self.cloudformation_client().describe_stacks(StackName=self.stack_name)
-            click.echo(Color.for_status(next(s["StackStatus"] for s in stacks["Stacks"])))
+            click.echo(Color.for_status(self.stack_status()))
         except KeyError as err:
             click.secho(err, err=True, fg="red")
             exit(1)
         except ClientError as err:
-            if "does not exist" in err.response["Error"]["Message"]:
-                click.secho(
-                    "Stack [{}] does not exist".format(self.stack_name), err=True, fg="red"
-                )
-                exit(1)
+            exit_if_stack_missing(err, self.stack_name)
 
     def get_events(self):
         """
@@ -236,25 +233,44 @@ class Stack:
         events = self.cloudformation_client().describe_stack_events(StackName=self.stack_name)
         return reversed(events["StackEvents"])
 
+    def _emit_events(self, events, seen, sinks):
+        """
+        Emit the `events` not `seen` yet to the `sinks`.
+
+        Return the last event and True if a new event reports a failure.
+        """
+        error = False
+        event = None
+        for event in events:
+            if event["Timestamp"] < self.update_started_at:
+                seen.add(event["EventId"])
+            if event["EventId"] in seen:
+                continue
+            if "FAILED" in event["ResourceStatus"]:
+                error = True
+            for sink in sinks:
+                sink.emit(self, event)
+            seen.add(event["EventId"])
+        for sink in sinks:
+            sink.flush()
+        return event, error
+
+    @profiling.timed("stack.tail")
+    @ratelimit.priority(ratelimit.INTERACTIVE)
     def tail(self, sleep_time=3, catch_error=False):
         """
         Tail the event log of the stack.
         """
         error = False
         seen = set()
+        sinks = event_sinks.sinks()
         try:
             events = self.get_events()
-            _print_log_headers()
+            for sink in sinks:
+                sink.start(self)
             while True:
-                for event in events:
-                    if event["Timestamp"] < self.update_started_at:
-                        seen.add(event["EventId"])
-                    if event["EventId"] in seen:
-                        continue
-                    if "FAILED" in event["ResourceStatus"]:
-                        error = True
-                    _log_event(event)
-                    seen.add(event["EventId"])
+                event, failed = self._emit_events(events, seen, sinks)
+                error = error or failed
                 if self.stack_complete(event):
                     if error:
                         exit(1)
@@ -262,7 +278,7 @@ class Stack:
                 time.sleep(sleep_time)
                 events = self.get_events()
         except ClientError as err:
-            if "does not exist" in err.response["Error"]["Message"] and catch_error:
+            if does_not_exist(err) and catch_error:
                 return False
             raise err
 
@@ -0,0 +1,106 @@
+"""
+Bulk deletion of stacks.
+
+"""
+
+import re
+import time
+from datetime import datetime, timedelta
+
+import click
+import crayons
+import pytz
+from brume.boto_client import cfn_client
+from brume.inventory import last_updated, select_stacks, stack_name
+from brume.parallel import run_concurrently
+
+AGE_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+AGE_RE = re.compile(r"^(\d+)([mhdw])$")
+
+
+def parse_age(value):
+    """Return a timedelta from an age like `30m`, `12h`, `7d` or `2w`."""
+    match = AGE_RE.match(value or "")
+    if not match:
+        raise click.BadParameter("{} is not an age like 30m, 12h, 7d or 2w".format(value))
+    return timedelta(**{AGE_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def stacks_to_delete(region, prefix=None, tags=None, older_than=None):
+    """Return the stacks of `region` matching `prefix` and `tags`, not updated since `older_than`."""
+    stacks = select_stacks(region, prefix=prefix, tags=tags)
+    if older_than is None:
+        return list(stacks)
+    limit = datetime.now(pytz.utc) - older_than
+    return [s for s in stacks if last_updated(s) < limit]
+
+
+def _last_status_event(client, stack_id):
+    """Return the id of the last event of the status of the stack itself."""
+    for event in client.describe_stack_events(StackName=stack_id)["StackEvents"]:
+        if event["PhysicalResourceId"] == stack_id:
+            return event["EventId"]
+    return None
+
+
+def wait_for_deletion(region, stack_ids, sleep_time=10, previous_failures=None):
+    """
+    Wait until every stack of `stack_ids` is deleted.
+
+    All the stacks are polled together with a paginated `list_stacks` of the stacks being
+    deleted. `previous_failures` maps the stacks already in DELETE_FAILED before their
+    deletion was requested to the id of their last status event: this stale status is
+    ignored until a new one is reported.
+    Return a dict of the stacks that could not be deleted with their status reason.
+    """
+    client = cfn_client(region)
+    paginator = client.get_paginator("list_stacks")
+    pending = set(stack_ids)
+    stale = dict(previous_failures or {})
+    failed = {}
+    while pending:
+        time.sleep(sleep_time)
+        deleting = {}
+        for page in paginator.paginate(StackStatusFilter=["DELETE_IN_PROGRESS", "DELETE_FAILED"]):
+            deleting.update({s["StackId"]: s for s in page["StackSummaries"]})
+        for stack_id in list(pending):
+            summary = deleting.get(stack_id)
+            if summary is not None and summary["StackStatus"] == "DELETE_IN_PROGRESS":
+                stale.pop(stack_id, None)
+                continue
+            if summary is not None and stack_id in stale:
+                if _last_status_event(client, stack_id) == stale[stack_id]:
+                    continue
+                del stale[stack_id]
+            pending.discard(stack_id)
+            if summary is None:
+                click.echo("Stack [{}] is deleted".format(crayons.yellow(stack_name(stack_id))))
+            else:
+                failed[summary["StackName"]] = summary.get("StackStatusReason", "DELETE_FAILED")
+    return failed
+
+
+def delete_stacks(region, stacks, parallelism, sleep_time=10):
+    """
+    Delete `stacks` with at most `parallelism` concurrent calls and wait for their deletion.
+
+    Return a dict of the stacks that could not be deleted with the reason of the failure.
+    """
+    client = cfn_client(region)
+    previous_failures = {}
+
+    def _delete(stack):
+        click.echo("Deleting stack {}...".format(stack["StackName"]))
+        if stack.get("StackStatus") == "DELETE_FAILED":
+            previous_failures[stack["StackId"]] = _last_status_event(client, stack["StackId"])
+        client.delete_stack(StackName=stack["StackId"])
+
+    failed = {}
+    deleting = []
+    for stack, _, error in run_concurrently(_delete, stacks, parallelism):
+        if error is None:
+            deleting.append(stack["StackId"])
+        else:
+            failed[stack["StackName"]] = str(error)
+    failed.update(wait_for_deletion(region, deleting, sleep_time, previous_failures))
+    return failed
@@ -1,12 +1,17 @@
 """Template module."""
 
+import hashlib
+import json
 import logging
+import os
 from os import path
 
 import click
 import crayons
+import yaml
 from botocore.exceptions import ClientError
-from brume.boto_client import cfn_client, s3_client
+from brume import profiling, ratelimit, transfer
+from brume.boto_client import cfn_client
 
 logging.getLogger("botocore").setLevel(logging.WARNING)
 
@@ -16,6 +21,114 @@ DEFAULT_TEMPLATE_LOCAL_PATH = ""
 TEMPLATE_COPY_SUFFIX = ".copy"
 DEFAULT_TEMPLATE_REGION = "us-east-1"
 
+# only select the templates reachable from the main templates of the stacks
+reachable_only = True
+
+# parsed templates, by path and version of the file
+_parsed = {}
+# validation results of the templates, by region and content
+_validations = {}
+
+
+class _CfnLoader(yaml.SafeLoader):  # pylint: disable=too-many-ancestors
+    """YAML loader that accepts the CloudFormation short form functions (!Ref, !Sub...)."""
+
+
+def _construct_function(loader, _suffix, node):
+    if isinstance(node, yaml.SequenceNode):
+        return loader.construct_sequence(node, deep=True)
+    if isinstance(node, yaml.MappingNode):
+        return loader.construct_mapping(node, deep=True)
+    return loader.construct_scalar(node)
+
+
+_CfnLoader.add_multi_constructor("!", _construct_function)
+
+
+def load_template(file_path):
+    """
+    Return the content of a JSON or YAML CloudFormation template as a dict.
+
+    Templates are parsed again only when the file changes.
+    """
+    stat = os.stat(file_path)
+    key = (path.abspath(file_path), stat.st_mtime, stat.st_size)
+    if key not in _parsed:
+        with open(file_path, "r") as _file:
+            _parsed[key] = parse_template(_file.read())
+    return _parsed[key]
+
+
+def parse_template(content):
+    """Return the content of a JSON or YAML CloudFormation template body as a dict."""
+    try:
+        return json.loads(content)
+    except ValueError:
+        return yaml.load(content, Loader=_CfnLoader)
+
+
+def template_strings(node):
+    """Yield every string found in a template node."""
+    if isinstance(node, dict):
+        for k, v in node.items():
+            for string in template_strings(k):
+                yield string
+            for string in template_strings(v):
+                yield string
+    elif isinstance(node, list):
+        for v in node:
+            for string in template_strings(v):
+                yield string
+    elif isinstance(node, str):
+        yield node
+
+
+def nested_template_names(template):
+    """
+    Return the file names the nested stacks of a template may refer to: the last part of
+    the strings of their `TemplateURL`, and their logical id.
+    """
+    names = set()
+    for logical_id, resource in (template.get("Resources") or {}).items():
+        if resource.get("Type") != "AWS::CloudFormation::Stack":
+            continue
+        names.add(logical_id)
+        template_url = (resource.get("Properties") or {}).get("TemplateURL", "")
+        names.update(s.rstrip("/").split("/")[-1] for s in template_strings(template_url))
+    return names
+
+
+def reachable_templates(main_templates, template_paths):
+    """
+    Return the paths of `template_paths` reachable from `main_templates` by following the
+    `TemplateURL` of their nested stacks, or None if a template cannot be parsed.
+    """
+    by_name = {}
+    for template_path in template_paths:
+        filename = path.basename(template_path)
+        by_name[filename] = template_path
+        by_name.setdefault(path.splitext(filename)[0], template_path)
+    candidates = {path.normpath(t): t for t in template_paths}
+    reached = set()
+    queue = [path.normpath(t) for t in main_templates]
+    while queue:
+        current = queue.pop()
+        if current in reached:
+            continue
+        reached.add(current)
+        try:
+            template = load_template(current)
+        except (IOError, yaml.YAMLError):
+            return None
+        if not isinstance(template, dict):
+            return None
+        queue.extend(
+            path.normpath(by_name[name])
+            for name in nested_template_names(template)
+            if name in by_name
+        )
+    return [candidates[t] for t in sorted(reached) if t in candidates]
+
 
 class Template:
     """CloudFormation template."""
@@ -63,6 +176,8 @@ class Template:
             )
             raise err
 
+    @profiling.timed("template.validate")
+    @ratelimit.priority(ratelimit.BACKGROUND)
     def validate(self):
         """
         Validate the template on CloudFormation.
@@ -70,30 +185,38 @@ class Template:
         If the template is larger than CFN_TEMPLATE_SIZE_LIMIT, brume uploads a
         copy of the template with the .copy suffix on S3 and performs validation
         on this template.
+
+        Valid templates are not validated again while their content does not change.
         """
+        content = self.content
+        key = (self.region, hashlib.sha1(content.encode("utf-8")).hexdigest())
         validation_path = self.local_file_path
-        params = {"TemplateBody": self.content}
         if self.template_is_too_large:
-            # Template will be copied, uploaded and validated on S3
-            self.upload(copy=True)
             validation_path = self.public_url + TEMPLATE_COPY_SUFFIX
-            params = {"TemplateURL": validation_path}
-        try:
-            click.echo("Validating {0} ... ".format(crayons.yellow(validation_path)), nl=False)
-            response = cfn_client(self.region).validate_template(**params)
-        except ClientError as error:
-            click.echo(crayons.red("invalid"))
-            click.echo(error.response["Error"]["Message"], err=True)
-            return False
-        click.echo(crayons.green("valid"), nl=False)
+        message = "Validating {0} ... ".format(crayons.yellow(validation_path))
+        response = _validations.get(key)
+        if response is None:
+            params = {"TemplateBody": content}
+            if self.template_is_too_large:
+                # Template will be copied, uploaded and validated on S3
+                self.upload(copy=True)
+                params = {"TemplateURL": validation_path}
+            try:
+                response = cfn_client(self.region).validate_template(**params)
+            except ClientError as error:
+                click.echo(message + "{}".format(crayons.red("invalid")))
+                click.echo(error.response["Error"]["Message"], err=True)
+                return False
+            _validations[key] = response
+        message += "{}".format(crayons.green("valid"))
         if "Capabilities" in response:
-            click.echo(
-                " requires capabilities: " + crayons.yellow(",".join(response["Capabilities"])),
-                nl=False,
+            message += " requires capabilities: {}".format(
+                crayons.yellow(",".join(response["Capabilities"]))
             )
-        click.echo()
+        click.echo(message)
         return True
 
+    @profiling.timed("template.upload")
     def upload(self, copy=False):
         """
         Upload the template to S3.
@@ -105,8 +228,16 @@ class Template:
         if copy:
             s3_key += TEMPLATE_COPY_SUFFIX
             public_url += TEMPLATE_COPY_SUFFIX
+        content = self.content
+        if transfer.uploaded(self.region, self.s3_bucket, s3_key, content):
+            click.echo(
+                "{0} is already published to {1}".format(
+                    crayons.yellow(self.local_file_path), public_url
+                )
+            )
+            return self
         click.echo(
             "Publishing {0} to {1}".format(crayons.yellow(self.local_file_path), public_url)
         )
-        s3_client(self.region).put_object(Bucket=self.s3_bucket, Body=self.content, Key=s3_key)
+        transfer.put_object(self.region, self.s3_bucket, s3_key, content)
         return self
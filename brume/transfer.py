@@ -0,0 +1,221 @@
+"""
+Resumable uploads to S3.
+
+With a transfer journal (`--journal` or `$BRUME_JOURNAL`), the uploads of templates and
+assets are recorded in a local JSON file: the keys uploaded with the MD5 of their content
+and the ETag and size of the object, and the multipart uploads in progress with the ETags
+of their uploaded parts. A command run again after an interruption skips the objects
+already uploaded with the same content, as long as they are still in S3 unchanged, and
+resumes the multipart uploads of the large files where they stopped.
+
+The multipart uploads of the journal started more than `ORPHAN_TIMEOUT` ago are aborted,
+so that interrupted uploads that are never resumed are not kept (and billed). The other
+multipart uploads of the buckets are never aborted.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import click
+import pytz
+from botocore.exceptions import ClientError
+from brume.boto_client import s3_client
+
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+ORPHAN_TIMEOUT = timedelta(hours=24)
+
+# transfer journal file, set by the --journal option
+journal_path = None
+
+_journal = None
+_swept = set()
+_lock = threading.Lock()
+
+
+def _load():
+    """Return the journal, read from `journal_path` the first time."""
+    global _journal  # pylint: disable=global-statement
+    if _journal is None:
+        try:
+            with open(journal_path, "r") as _file:
+                _journal = json.load(_file)
+        except (IOError, ValueError):
+            _journal = {}
+        _journal.setdefault("objects", {})
+        _journal.setdefault("uploads", {})
+    return _journal
+
+
+def _save():
+    """Write the journal atomically, so that an interruption never leaves it corrupted."""
+    directory = os.path.dirname(os.path.abspath(journal_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "w") as _file:
+        json.dump(_journal, _file, indent=2, sort_keys=True)
+    os.replace(tmp_path, journal_path)
+
+
+def _record(section, name, entry):
+    """
+    Record a copy of `entry` in the journal (or remove it when None): the entries of the
+    journal are only changed, and written, under the lock.
+    """
+    with _lock:
+        journal = _load()
+        if entry is None:
+            journal[section].pop(name, None)
+        else:
+            journal[section][name] = copy.deepcopy(entry)
+        _save()
+
+
+def _entry(section, name):
+    """Return a copy of the `name` entry of the journal, None if there is none."""
+    with _lock:
+        return copy.deepcopy(_load()[section].get(name))
+
+
+def abort_orphaned_uploads(region, bucket, older_than=None):
+    """
+    Abort the multipart uploads of `bucket` recorded in the journal and initiated more than
+    `older_than` ago (defaults to `ORPHAN_TIMEOUT`), return their keys.
+    """
+    with _lock:
+        journaled = {
+            entry["UploadId"]
+            for name, entry in _load()["uploads"].items()
+            if name.startswith(bucket + "/")
+        }
+    if not journaled:
+        return []
+    client = s3_client(region)
+    limit = datetime.now(pytz.utc) - (older_than or ORPHAN_TIMEOUT)
+    aborted = []
+    for page in client.get_paginator("list_multipart_uploads").paginate(Bucket=bucket):
+        for upload in page.get("Uploads", []):
+            if upload["UploadId"] in journaled and upload["Initiated"] < limit:
+                client.abort_multipart_upload(
+                    Bucket=bucket, Key=upload["Key"], UploadId=upload["UploadId"]
+                )
+                aborted.append(upload["Key"])
+    return aborted
+
+
+def _sweep(region, bucket):
+    """Abort the orphaned multipart uploads of the journal in `bucket` once per command."""
+    with _lock:
+        if bucket in _swept:
+            return
+        _swept.add(bucket)
+    for key in abort_orphaned_uploads(region, bucket):
+        click.echo("Aborted the orphaned multipart upload of {}/{}".format(bucket, key))
+        _record("uploads", "{}/{}".format(bucket, key), None)
+
+
+def _multipart_upload(client, bucket, key, body, digest):
+    """Upload `body` in parts, resuming the journaled multipart upload of the same content."""
+    name = "{}/{}".format(bucket, key)
+    upload = _entry("uploads", name)
+    if upload is not None and upload["md5"] != digest:
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload["UploadId"])
+        except ClientError:
+            pass
+        upload = None
+    if upload is not None:
+        try:
+            client.list_parts(Bucket=bucket, Key=key, UploadId=upload["UploadId"], MaxParts=1)
+        except ClientError:
+            # aborted or completed since it was journaled
+            upload = None
+    if upload is None:
+        response = client.create_multipart_upload(Bucket=bucket, Key=key)
+        upload = dict(UploadId=response["UploadId"], md5=digest, parts={})
+        _record("uploads", name, upload)
+    else:
+        click.echo(
+            "Resuming the upload of {} ({} parts uploaded)".format(name, len(upload["parts"]))
+        )
+    for number, offset in enumerate(range(0, len(body), PART_SIZE), 1):
+        if str(number) in upload["parts"]:
+            continue
+        response = client.upload_part(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload["UploadId"],
+            PartNumber=number,
+            Body=body[offset:offset + PART_SIZE],
+        )
+        upload["parts"][str(number)] = response["ETag"]
+        _record("uploads", name, upload)
+    response = client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload["UploadId"],
+        MultipartUpload=dict(
+            Parts=[
+                dict(PartNumber=int(number), ETag=etag)
+                for number, etag in sorted(upload["parts"].items(), key=lambda p: int(p[0]))
+            ]
+        ),
+    )
+    _record("uploads", name, None)
+    return response["ETag"]
+
+
+def _bytes(body):
+    return body.encode("utf-8") if isinstance(body, str) else body
+
+
+def uploaded(region, bucket, key, body):
+    """
+    Return True if the journal records that `body` was already uploaded to the key, and the
+    object is still in S3 with the ETag and size it was uploaded with.
+    """
+    if journal_path is None:
+        return False
+    entry = _entry("objects", "{}/{}".format(bucket, key))
+    if entry is None or entry["md5"] != hashlib.md5(_bytes(body)).hexdigest():
+        return False
+    try:
+        head = s3_client(region).head_object(Bucket=bucket, Key=key)
+    except ClientError:
+        # deleted since it was journaled (brume gc, lifecycle rules)
+        return False
+    return head["ETag"] == entry.get("ETag") and head["ContentLength"] == entry.get("size")
+
+
+def put_object(region, bucket, key, body):
+    """
+    Upload `body` (str or bytes) to `s3://{bucket}/{key}`.
+
+    With a journal, the bodies larger than `MULTIPART_THRESHOLD` are uploaded in
+    resumable parts, and the upload is recorded once completed.
+    """
+    body = _bytes(body)
+    client = s3_client(region)
+    if journal_path is None:
+        client.put_object(Bucket=bucket, Body=body, Key=key)
+        return
+    _sweep(region, bucket)
+    digest = hashlib.md5(body).hexdigest()
+    if len(body) > MULTIPART_THRESHOLD:
+        etag = _multipart_upload(client, bucket, key, body, digest)
+    else:
+        etag = client.put_object(Bucket=bucket, Body=body, Key=key)["ETag"]
+    _record("objects", "{}/{}".format(bucket, key), dict(md5=digest, ETag=etag, size=len(body)))
+
+
+def reset():
+    """Forget the loaded journal and the swept buckets."""
+    global _journal  # pylint: disable=global-statement
+    with _lock:
+        _journal = None
+        _swept.clear()
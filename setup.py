@@ -95,7 +95,7 @@ setup(
     author=', '.join(AUTHORS.values()),
     author_email=', '.join(AUTHORS.keys()),
     license='MIT',
-    packages=find_packages(exclude=['tests', 'cover']),
+    packages=find_packages(exclude=['tests', 'cover', 'benchmarks']),
     include_package_data=True,
     download_url=_download_url(),
     zip_safe=False,
@@ -103,6 +103,7 @@ setup(
     tests_require=['pytest', 'moto'],
     keywords=['AWS', 'CloudFormation'],
     install_requires=REQUIRED,
+    extras_require={'async': ['aiobotocore; python_version >= "3.7"']},
     entry_points={'console_scripts': ['brume=brume.cli:cli']},
     classifiers=[
         'Development Status :: 5 - Production/Stable',
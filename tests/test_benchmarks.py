@@ -0,0 +1,22 @@
+import unittest
+
+from benchmarks.run import run_scenario
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Test for the benchmark harness."""
+
+    def test_deploy(self):
+        """The deploy scenario runs against the fake backend."""
+        result = run_scenario('deploy', scale=0.2, repeat=1)
+        assert result['calls']['cloudformation.UpdateStack'] == 1
+        assert result['calls']['cloudformation.DescribeStackEvents'] == 1
+        assert result['peak_memory'] > 0
+
+    def test_throttling(self):
+        result = run_scenario('parameters', throttle_rate=0.5, repeat=1)
+        assert result['throttles'] > 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import shutil
+import tempfile
+import time
+import unittest
+
+from brume import cache
+
+
+class TestCache(unittest.TestCase):
+    """Test for brume.cache."""
+
+    def setUp(self):
+        self.directory = cache.directory
+        cache.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(cache.directory)
+        cache.directory = self.directory
+        cache.ttl = cache.DEFAULT_CACHE_TTL
+        cache.refresh = False
+
+    def test_get(self):
+        """A cached value can be read by another invocation."""
+        assert cache.get('outputs', 'eu-west-1', 'my-stack') is None
+        cache.put('outputs', {'VpcId': 'vpc-1'}, 'eu-west-1', 'my-stack')
+        assert cache.get('outputs', 'eu-west-1', 'my-stack') == {'VpcId': 'vpc-1'}
+        assert cache.get('outputs', 'us-east-1', 'my-stack') is None
+
+    def test_expired(self):
+        cache.put('outputs', {'VpcId': 'vpc-1'}, 'eu-west-1', 'my-stack')
+        cache.ttl = 1
+        time.sleep(1.1)
+        assert cache.get('outputs', 'eu-west-1', 'my-stack') is None
+
+    def test_refresh(self):
+        cache.put('outputs', {'VpcId': 'vpc-1'}, 'eu-west-1', 'my-stack')
+        cache.refresh = True
+        assert cache.get('outputs', 'eu-west-1', 'my-stack') is None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from brume import cli, config
+from brume.assets import send_assets
+from brume.config import Config
+
+CONFIG = {
+    'region': 'eu-west-1',
+    'regions': {
+        'eu-west-1': None,
+        'us-east-1': {
+            'templates': {'s3_bucket': 'acme-templates-us'},
+            'stack': {'parameters': {'ImageId': 'ami-us'}, 'tags': {'region': 'us'}},
+        },
+    },
+    'stack': {
+        'stack_name': 'acme',
+        'template_body': 'main.json',
+        'parameters': {'ImageId': 'ami-eu', 'Env': 'prod'},
+        'tags': {'team': 'infra'},
+    },
+    'templates': {'s3_bucket': 'acme-templates', 'region': 'eu-west-1'},
+    'assets': {'s3_bucket': 'acme-assets', 'local_path': 'assets'},
+}
+
+
+class TestRegions(unittest.TestCase):
+    """Test for the multi-region deployments of brume.cli."""
+
+    def test_regions_config(self):
+        regions = cli.regions_config(CONFIG)
+        self.assertEqual(sorted(regions), ['eu-west-1', 'us-east-1'])
+        self.assertEqual(cli.regions_config({'regions': ['eu-west-1']}), {'eu-west-1': {}})
+        self.assertEqual(cli.regions_config({}), {})
+
+    def test_regions_config_selected(self):
+        regions = cli.regions_config(CONFIG, ['us-east-1', 'ap-south-1'])
+        self.assertEqual(regions, {'us-east-1': CONFIG['regions']['us-east-1'], 'ap-south-1': {}})
+
+    def test_region_config(self):
+        regional = cli.region_config(CONFIG, 'us-east-1', CONFIG['regions']['us-east-1'])
+        self.assertEqual(regional['region'], 'us-east-1')
+        self.assertEqual(
+            regional['templates'], {'s3_bucket': 'acme-templates-us', 'region': 'us-east-1'}
+        )
+        self.assertEqual(regional['assets'], CONFIG['assets'])
+        self.assertEqual(CONFIG['templates']['region'], 'eu-west-1')
+
+    def test_region_config_stack(self):
+        """The parameters and tags of a region are merged with those of the stack."""
+        regional = cli.region_config(CONFIG, 'us-east-1', CONFIG['regions']['us-east-1'])
+        self.assertEqual(regional['stack']['parameters'], {'ImageId': 'ami-us', 'Env': 'prod'})
+        self.assertEqual(regional['stack']['tags'], {'team': 'infra', 'region': 'us'})
+        self.assertEqual(regional['stack']['stack_name'], 'acme')
+        self.assertEqual(CONFIG['stack']['parameters']['ImageId'], 'ami-eu')
+
+    def test_inherited_parameters(self):
+        self.assertEqual(cli.inherited_parameters(CONFIG, 'eu-west-1', {}), [])
+        self.assertEqual(
+            cli.inherited_parameters(CONFIG, 'us-east-1', CONFIG['regions']['us-east-1']),
+            ['Env'],
+        )
+        self.assertEqual(cli.inherited_parameters(CONFIG, 'ap-south-1', {}), ['Env', 'ImageId'])
+
+    @mock.patch('brume.cli.process_assets')
+    @mock.patch('brume.cli.collect_templates', return_value=[])
+    @mock.patch('brume.cli.Stack')
+    def test_deploy_regions(self, stack, _templates, process_assets):
+        stack.return_value.is_deployed.return_value = True
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                cli.deploy_regions(CONFIG, cli.regions_config(CONFIG), 2)
+        self.assertEqual(
+            sorted(c[0][0] for c in process_assets.call_args_list), ['eu-west-1', 'us-east-1']
+        )
+        buckets = sorted(c[1]['templates']['s3_bucket'] for c in stack.call_args_list)
+        self.assertEqual(buckets, ['acme-templates', 'acme-templates-us'])
+        images = sorted(c[0][1]['parameters']['ImageId'] for c in stack.call_args_list)
+        self.assertEqual(images, ['ami-eu', 'ami-us'])
+        self.assertIn('Parameters of eu-west-1 deployed unchanged to us-east-1: Env', stderr.getvalue())
+        self.assertIn('us-east-1', stdout.getvalue())
+
+    @mock.patch('brume.cli.process_assets')
+    @mock.patch('brume.cli.collect_templates', return_value=[])
+    @mock.patch('brume.cli.Stack')
+    def test_deploy_regions_failed(self, stack, _templates, _process_assets):
+        stack.return_value.create_or_update.side_effect = [None, RuntimeError('throttled')]
+        stack.return_value.is_deployed.return_value = True
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            with mock.patch('sys.stderr', new_callable=io.StringIO):
+                with self.assertRaises(SystemExit):
+                    cli.deploy_regions(CONFIG, cli.regions_config(CONFIG), 1)
+        self.assertIn('failed', stdout.getvalue())
+
+
+PROJECT = """region: eu-west-1
+templates: {s3_bucket: acme-templates}
+stacks:
+  network: {stack_name: acme-network, template_body: network.json}
+  app:
+    stack_name: acme-app
+    template_body: app.json
+    parameters:
+      VpcId: "{{ cfn('eu-west-1', 'acme-network', 'VpcId') }}"
+"""
+
+
+class TestProject(unittest.TestCase):
+    """Test for the stacks of a project selected with brume --stack."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'brume.yml'), 'w') as _file:
+            _file.write(PROJECT)
+        os.chdir(self.directory)
+        Config.config = {}
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+        Config.config = {}
+        config.deferred_stacks = set()
+        config.resolved_outputs.clear()
+
+    @mock.patch('brume.config.prefetch_outputs')
+    @mock.patch('brume.config._stack_outputs')
+    @mock.patch('brume.project.Stack.exists', return_value=True)
+    def test_selected_config(self, _exists, stack_outputs, _prefetch):
+        """The configuration of a selected stack has the outputs of its dependencies."""
+        stack_outputs.return_value.lookup.return_value = 'vpc-1'
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            with self.assertRaises(SystemExit) as exit_:
+                cli.cli.main(args=['--stack', 'app', 'config'], prog_name='brume')
+        self.assertEqual(exit_.exception.code, 0)
+        self.assertIn('VpcId: vpc-1', stdout.getvalue())
+        self.assertNotIn('pending output', stdout.getvalue())
+
+
+class TestPipeline(unittest.TestCase):
+    """Test for brume.cli.run_pipeline."""
+
+    def setUp(self):
+        self.started = threading.Event()
+        self.stopped = threading.Event()
+
+    def background(self, cancelled):
+        """Asset sync running until it is cancelled."""
+        self.started.set()
+        if cancelled.wait(5):
+            self.stopped.set()
+
+    def process(self, template):
+        self.started.wait(5)
+        if template == 'error':
+            raise RuntimeError('throttled')
+        return template != 'invalid'
+
+    def test_pipeline(self):
+        processed = []
+        cli.run_pipeline(['a', 'b'], processed.append, lambda cancelled: processed.append('c'))
+        self.assertEqual(sorted(processed), ['a', 'b', 'c'])
+
+    def test_invalid_template_cancels_background(self):
+        with self.assertRaises(SystemExit):
+            cli.run_pipeline(['a', 'invalid', 'b'], self.process, self.background)
+        self.assertTrue(self.stopped.is_set())
+
+    def test_error_cancels_background(self):
+        """An error of a template stops the asset sync, then is raised."""
+        with self.assertRaises(RuntimeError):
+            cli.run_pipeline(['a', 'error'], self.process, self.background)
+        self.assertTrue(self.stopped.is_set())
+
+    def test_background_error(self):
+        def _background(_cancelled):
+            raise RuntimeError('access denied')
+
+        with self.assertRaises(RuntimeError):
+            cli.run_pipeline(['a'], lambda template: True, _background)
+
+    @mock.patch('brume.transfer.put_object')
+    def test_cancelled_assets(self, put_object):
+        """The remaining assets are not sent once the sync is cancelled."""
+        directory = tempfile.mkdtemp()
+        try:
+            for name in ['a.sh', 'b.sh']:
+                with open(os.path.join(directory, name), 'w') as _file:
+                    _file.write('echo')
+            cancelled = threading.Event()
+            put_object.side_effect = lambda *args: cancelled.set()
+            with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                send_assets('eu-west-1', directory, 'acme-assets', 'assets', cancelled)
+            self.assertEqual(put_object.call_count, 1)
+            self.assertIn('Cancelled', stdout.getvalue())
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,12 @@
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
-from brume.config import Config
+import jinja2
+from brume import cache, config
+from brume.config import Config, cfn_lookups
 
 
 class TestConfig(unittest.TestCase):
@@ -14,6 +20,82 @@ class TestConfig(unittest.TestCase):
         assert isinstance(conf['stack'], dict)
         assert isinstance(conf['templates'], dict)
 
+    def test_lazy_context(self):
+        """Git metadata is only read when the template uses it."""
+        directory = tempfile.mkdtemp()
+        try:
+            config_file = os.path.join(directory, 'brume.yml')
+            with open(config_file, 'w') as f:
+                f.write("region: {{ env('REGION', 'eu-west-1') }}\n")
+            with mock.patch('brume.git.metadata') as metadata:
+                template = Config.render(config_file)
+                assert Config._render_config(template, config_file) == {'region': 'eu-west-1'}
+                metadata.assert_not_called()
+            with open(config_file, 'a') as f:
+                f.write("branch: {{ git_branch }}\n")
+            with mock.patch('brume.git.metadata', return_value={'branch': 'master'}) as metadata:
+                template = Config.render(config_file)
+                assert Config._render_config(template, config_file)['branch'] == 'master'
+                metadata.assert_called()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_cfn_lookups(self):
+        """cfn lookups with literal arguments are found in the template."""
+        source = (
+            "{% set region = 'eu-west-1' %}\n"
+            "a: {{ cfn('eu-west-1', 'network', 'VpcId') }}\n"
+            "b: {{ cfn('us-east-1', 'network', 'Vpc', 'Subnets', 'SubnetId') }}\n"
+            "c: {{ cfn(region, 'data', 'BucketName') }}\n"
+        )
+        assert cfn_lookups(jinja2.Environment(), source) == [
+            ('eu-west-1', 'network', ('VpcId',)),
+            ('us-east-1', 'network', ('Vpc', 'Subnets', 'SubnetId')),
+        ]
+
+    def test_cfn_lookups_cached(self):
+        """cfn lookups of the included templates are found, and cached by source."""
+        environment = jinja2.Environment(
+            loader=jinja2.DictLoader(
+                {
+                    'brume.yml': "{% include 'stacks.yml' %}\n{% include 'missing.yml' %}\n",
+                    'stacks.yml': "a: {{ cfn('eu-west-1', 'network', 'VpcId') }}\n",
+                }
+            )
+        )
+        source = environment.loader.get_source(environment, 'brume.yml')[0]
+        directory = cache.directory
+        cache.directory = tempfile.mkdtemp()
+        try:
+            expected = [('eu-west-1', 'network', ('VpcId',))]
+            assert cfn_lookups(environment, source) == expected
+            with mock.patch.object(environment, 'parse') as parse:
+                assert cfn_lookups(environment, source) == expected
+            parse.assert_not_called()
+        finally:
+            shutil.rmtree(cache.directory)
+            cache.directory = directory
+
+    @mock.patch('brume.config.cfn_client')
+    def test_stack_outputs_by_region(self, cfn_client):
+        """Lookups of stacks with the same name in different regions are not mixed up."""
+        cfn_client.side_effect = lambda region: region
+        try:
+            eu_west = config._stack_outputs('eu-west-1', 'network')
+            us_east = config._stack_outputs('us-east-1', 'network')
+            assert eu_west is not us_east
+            assert (eu_west.client, us_east.client) == ('eu-west-1', 'us-east-1')
+            assert config._stack_outputs('eu-west-1', 'network') is eu_west
+        finally:
+            config.stack_outputs_definition.clear()
+
+    def test_git_not_installed(self):
+        """The Git configuration is empty, with a warning, when git is not installed."""
+        with mock.patch('brume.git.is_installed', return_value=False):
+            with mock.patch('brume.config.click.secho') as secho:
+                assert Config.git_config() == {}
+        assert 'git is not installed' in secho.call_args[0][0]
+
 
 if __name__ == '__main__':
     unittest.main()
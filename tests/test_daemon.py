@@ -0,0 +1,81 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import click
+from brume import cache, daemon
+from brume.cli import cli
+
+CONFIG = """region: eu-west-1
+stack:
+  stack_name: my-stack
+  template_body: Main.cform
+templates:
+  s3_bucket: my-bucket
+"""
+
+
+class TestDaemon(unittest.TestCase):
+    """Test for brume.daemon."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, 'brume.sock')
+        self.server = daemon.make_server(cli, self.socket_path)
+        threading.Thread(target=self.server.serve_forever).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def forward(self, args):
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                code = daemon.forward(args, self.socket_path)
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_forward(self):
+        """Commands run in the directory of the client."""
+        project = os.path.join(self.directory, 'project')
+        os.mkdir(project)
+        with open(os.path.join(project, 'brume.yml'), 'w') as _file:
+            _file.write(CONFIG)
+        os.chdir(project)
+        code, stdout, _ = self.forward(['config'])
+        assert code == 0
+        assert 'stack_name: my-stack' in stdout
+
+        os.chdir(self.directory)
+        code, stdout, stderr = self.forward(['config'])
+        assert code == 1
+        assert stdout == ''
+        assert 'No such file or directory: brume.yml' in stderr
+
+    def test_cache_environment(self):
+        """The cache directory and TTL are read from the environment of the client."""
+        seen = []
+
+        @click.command()
+        def command():
+            seen.append((cache.directory, cache.ttl))
+
+        env = dict(os.environ, BRUME_CACHE_DIR=self.directory, BRUME_CACHE_TTL='5')
+        request = {'args': [], 'cwd': self.directory, 'env': env}
+        assert daemon.run(command, request, io.BytesIO()) == 0
+        assert seen == [(self.directory, 5)]
+        assert cache.directory != self.directory
+
+    def test_no_daemon(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO):
+            assert daemon.forward(['config'], self.socket_path + '.missing') == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
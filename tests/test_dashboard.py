@@ -0,0 +1,68 @@
+import io
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import boto3
+from brume.dashboard import print_status_table, status_dashboard
+from moto import mock_cloudformation
+
+REGION = 'eu-west-1'
+
+with open('tests/test_stack/main.json', 'r') as f:
+    TEMPLATE = f.read()
+
+
+def _stack(name, status, drift=None):
+    stack = {
+        'StackName': name,
+        'StackStatus': status,
+        'CreationTime': datetime(2019, 5, 1, 12, 0, 0),
+    }
+    if drift:
+        stack['DriftInformation'] = {'StackDriftStatus': drift}
+    return stack
+
+
+def _rows(output):
+    """Return the cells of the rows of a status table, without its headers."""
+    return [line.split() for line in output.splitlines()[1:]]
+
+
+class TestDashboard(unittest.TestCase):
+    """Test for brume.dashboard."""
+
+    def test_print_status_table(self):
+        """Stacks are sorted by name, with their drift status."""
+        stacks = [
+            _stack('pr-2', 'UPDATE_COMPLETE', 'DRIFTED'),
+            _stack('main', 'CREATE_COMPLETE', 'IN_SYNC'),
+            _stack('pr-1', 'ROLLBACK_COMPLETE'),
+        ]
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            print_status_table(stacks)
+        rows = _rows(stdout.getvalue())
+        assert [r[0] for r in rows] == ['main', 'pr-1', 'pr-2']
+        assert [r[-1] for r in rows] == ['IN_SYNC', 'NOT_CHECKED', 'DRIFTED']
+        assert rows[0][2:4] == ['2019-05-01', '12:00:00']
+
+    @mock_cloudformation
+    def test_status_dashboard(self):
+        """Only the stacks matching the prefix and tags are printed."""
+        client = boto3.client('cloudformation', region_name=REGION)
+        for name, env in [('pr-2', 'pr'), ('pr-1', 'pr'), ('main', 'prod')]:
+            client.create_stack(
+                StackName=name,
+                TemplateBody=TEMPLATE.replace('my-bucket', name),
+                Tags=[{'Key': 'Env', 'Value': env}],
+            )
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            status_dashboard(REGION, prefix='pr-')
+        assert [r[0] for r in _rows(stdout.getvalue())] == ['pr-1', 'pr-2']
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            status_dashboard(REGION, tags={'Env': 'prod'})
+        assert [r[0] for r in _rows(stdout.getvalue())] == ['main']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import io
+import unittest
+from unittest import mock
+
+from benchmarks.fake_aws import FakeAWS
+from brume import drift
+
+REGION = 'eu-west-1'
+
+
+class TestDrift(unittest.TestCase):
+    """Test for brume.drift."""
+
+    def test_detect_drift(self):
+        with FakeAWS(drift_time=0.05) as backend:
+            root = backend.add_stack('acme', breadth=2, depth=1)
+            backend.add_drift('acme', 'Topic')
+            backend.add_drift('acme', 'Queue', 'AWS::SQS::Queue', status='DELETED')
+            child = backend.resources[root['StackId']][0]['PhysicalResourceId']
+            stacks = ['acme'] + [
+                r['PhysicalResourceId'] for r in backend.resources[root['StackId']]
+            ]
+
+            report = drift.detect_drift(REGION, stacks, min_sleep=0.01, max_sleep=0.02)
+
+        self.assertEqual(
+            [r['StackDriftStatus'] for r in report], ['DRIFTED', 'IN_SYNC', 'IN_SYNC']
+        )
+        self.assertEqual(report[1]['StackName'], child.split('/')[1])
+        self.assertEqual(
+            [r['LogicalResourceId'] for r in report[0]['Resources']], ['Topic', 'Queue']
+        )
+        self.assertEqual(backend.calls['cloudformation.DetectStackDrift'], 3)
+        self.assertEqual(backend.calls['cloudformation.DescribeStackResourceDrifts'], 1)
+
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            drift.print_drift_report(report)
+        output = stdout.getvalue()
+        self.assertIn('/DisplayName: expected Topic, actual changed', output)
+        self.assertIn('1 of 3 stacks drifted', output)
+
+    def test_failed_detection(self):
+        with FakeAWS():
+            report = drift.detect_drift(REGION, ['missing'], min_sleep=0)
+        self.assertEqual(report[0]['StackDriftStatus'], 'UNKNOWN')
+        self.assertIn('does not exist', report[0]['Reason'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from collections import namedtuple
+from datetime import datetime
+from unittest import mock
+
+import boto3
+from brume.cli import cli
+from brume.config import Config
+from brume.events import JsonSink
+from moto import mock_cloudformation, mock_s3
+
+FakeStack = namedtuple('FakeStack', ['region', 'log_prefix'])
+
+EVENT = {
+    'EventId': 'a1b2',
+    'StackName': 'my-stack',
+    'LogicalResourceId': 'MyBucket',
+    'ResourceType': 'AWS::S3::Bucket',
+    'ResourceStatus': 'CREATE_COMPLETE',
+    'Timestamp': datetime(2019, 5, 1, 12, 0, 0),
+}
+
+
+class TestJsonSink(unittest.TestCase):
+    """Test for brume.events.JsonSink."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'events.ndjson')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_emit(self):
+        """Events are written as NDJSON once flushed."""
+        sink = JsonSink(self.path)
+        sink.emit(FakeStack('eu-west-1', ''), EVENT)
+        sink.emit(FakeStack('eu-west-1', ''), dict(EVENT, EventId='c3d4'))
+        assert os.path.getsize(self.path) == 0
+        sink.close()
+        with open(self.path, 'r') as f:
+            records = [json.loads(line) for line in f]
+        assert [r['EventId'] for r in records] == ['a1b2', 'c3d4']
+        assert records[0]['Region'] == 'eu-west-1'
+        assert records[0]['Timestamp'] == '2019-05-01T12:00:00'
+
+
+class TestEventsOut(unittest.TestCase):
+    """Test for the events written to stdout by brume --events-out -."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        shutil.copy('tests/test_stack/main.json', os.path.join(self.directory, 'Main.json'))
+        with open(os.path.join(self.directory, 'brume.yml'), 'w') as _file:
+            _file.write(
+                'region: us-east-1\n'
+                'stack:\n  stack_name: my-stack\n  template_body: Main.json\n'
+                'templates:\n  s3_bucket: my-bucket\n'
+            )
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+        Config.config = {}
+
+    @mock_s3
+    @mock_cloudformation
+    def test_deploy(self):
+        """The other messages of a deploy go to stderr: stdout is only NDJSON."""
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket='my-bucket')
+        with mock.patch('brume.template.Template.validate', return_value=True):
+            with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                    with self.assertRaises(SystemExit) as exit_:
+                        cli.main(args=['--events-out', '-', 'deploy'], prog_name='brume')
+                    records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        assert exit_.exception.code == 0
+        assert records[-1]['ResourceStatus'] == 'CREATE_COMPLETE'
+        assert 'Creating stack my-stack' in stderr.getvalue()
+
+
+if __name__ == '__main__':
+    unittest.main()
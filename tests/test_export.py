@@ -0,0 +1,69 @@
+import sys
+import unittest
+
+import boto3
+from brume import boto_client
+from brume.export import stack_record, stack_records
+from moto import mock_cloudformation
+
+with open('tests/test_stack/main.json', 'r') as f:
+    TEMPLATE = f.read()
+
+
+class TestExport(unittest.TestCase):
+    """Test for brume.export."""
+
+    def test_stack_record(self):
+        stack = {
+            'StackName': 'pr-1',
+            'StackId': 'arn:pr-1',
+            'Outputs': [{'OutputKey': 'VpcId', 'OutputValue': 'vpc-1'}],
+            'Parameters': [
+                {'ParameterKey': 'Env', 'ParameterValue': 'pr'},
+                {'ParameterKey': 'Ami', 'ParameterValue': '/ami/latest', 'ResolvedValue': 'ami-1'},
+            ],
+        }
+        assert stack_record('eu-west-1', stack, 'outputs') == {
+            'Region': 'eu-west-1',
+            'StackName': 'pr-1',
+            'StackId': 'arn:pr-1',
+            'Outputs': {'VpcId': 'vpc-1'},
+        }
+        # like Stack.params, the SSM parameters are reported by name
+        assert stack_record('eu-west-1', stack, 'parameters')['Parameters'] == {
+            'Env': 'pr',
+            'Ami': '/ami/latest',
+        }
+
+    @mock_cloudformation
+    def test_stack_records(self):
+        """The stacks of every region are exported."""
+        self._check_stack_records('threads')
+
+    @unittest.skipIf(sys.version_info < boto_client.ASYNCIO_MIN_VERSION, 'requires Python 3.7')
+    @mock_cloudformation
+    def test_stack_records_asyncio(self):
+        """The asyncio engine exports the same stacks."""
+        boto_client.engine = 'asyncio'
+        try:
+            self._check_stack_records('asyncio')
+        finally:
+            boto_client.engine = 'threads'
+
+    def _check_stack_records(self, engine):
+        for region in ('eu-west-1', 'us-east-1'):
+            client = boto3.client('cloudformation', region_name=region)
+            for name in ('pr-1', 'main'):
+                bucket = '{}-{}-{}'.format(engine, region, name)
+                client.create_stack(
+                    StackName=name, TemplateBody=TEMPLATE.replace('my-bucket', bucket)
+                )
+        records = stack_records(['eu-west-1', 'us-east-1'], 'outputs', prefix='pr-')
+        assert sorted((r['Region'], r['StackName']) for r in records) == [
+            ('eu-west-1', 'pr-1'),
+            ('us-east-1', 'pr-1'),
+        ]
+
+
+if __name__ == '__main__':
+    unittest.main()
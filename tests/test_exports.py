@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import boto3
+from brume import cache, config, exports
+from brume.config import Config
+from moto import mock_cloudformation, mock_sts
+
+REGION = 'eu-west-1'
+
+TEMPLATE = {
+    'Resources': {'Topic': {'Type': 'AWS::SNS::Topic'}},
+    'Outputs': {
+        'TopicArn': {'Value': {'Ref': 'Topic'}, 'Export': {'Name': 'acme-topic-arn'}},
+        'Env': {'Value': 'dev', 'Export': {'Name': 'acme-env'}},
+    },
+}
+
+
+class TestExports(unittest.TestCase):
+    """Test for brume.exports."""
+
+    def setUp(self):
+        self.directory = cache.directory
+        cache.directory = tempfile.mkdtemp()
+        exports._indexes.clear()
+
+    def tearDown(self):
+        shutil.rmtree(cache.directory)
+        cache.directory = self.directory
+        exports._indexes.clear()
+
+    @mock_sts
+    @mock_cloudformation
+    def test_export_value(self):
+        """Exports are resolved from the index of the region."""
+        client = boto3.client('cloudformation', region_name=REGION)
+        client.create_stack(StackName='acme', TemplateBody=json.dumps(TEMPLATE))
+        assert exports.export_value('acme-env', REGION) == 'dev'
+        assert exports.export_value('acme-topic-arn', REGION).startswith('arn:aws:sns:')
+        with self.assertRaises(SystemExit):
+            exports.export_value('unknown', REGION)
+
+    @mock_sts
+    @mock_cloudformation
+    def test_cached_index(self):
+        """The index is listed again when an export is missing from the cached index."""
+        client = boto3.client('cloudformation', region_name=REGION)
+        assert exports.exports_index(REGION) == {}
+        exports._indexes.clear()
+        client.create_stack(StackName='acme', TemplateBody=json.dumps(TEMPLATE))
+        assert exports.exports_index(REGION) == {}
+        assert exports.export_value('acme-env', REGION) == 'dev'
+
+    @mock_sts
+    @mock_cloudformation
+    def test_cached_index_by_account(self):
+        """The index cached for an account is not used with the credentials of another."""
+        client = boto3.client('cloudformation', region_name=REGION)
+        with mock.patch('brume.exports.account_id', return_value='111111111111'):
+            assert exports.exports_index(REGION) == {}
+        exports._indexes.clear()
+        client.create_stack(StackName='acme', TemplateBody=json.dumps(TEMPLATE))
+        with mock.patch('brume.exports.account_id', return_value='222222222222'):
+            assert exports.exports_index(REGION)['acme-env'] == 'dev'
+
+    @mock.patch('brume.exports.time.time', return_value=1000.0)
+    def test_expire(self, _time):
+        """The indexes listed by a previous command are kept for the cache TTL."""
+        exports._indexes.update(
+            {
+                ('1', 'eu-west-1'): ({'a': '1'}, True, 1000.0 - cache.ttl + 1),
+                ('1', 'us-east-1'): ({'b': '2'}, True, 1000.0 - cache.ttl),
+                ('1', 'us-west-2'): ({'c': '3'}, False, None),
+            }
+        )
+        exports.expire()
+        assert exports._indexes == {('1', 'eu-west-1'): ({'a': '1'}, False, 1000.0 - cache.ttl + 1)}
+
+    @mock.patch('brume.exports.export_value', return_value='dev')
+    def test_config_region(self, export_value):
+        """Exports are resolved in the region of the configuration by default."""
+        config.config_region = 'us-east-1'
+        try:
+            assert Config.export('acme-env') == 'dev'
+            assert Config.export('acme-env', REGION) == 'dev'
+        finally:
+            config.config_region = None
+            config.resolved_outputs.clear()
+        assert [c[0][1] for c in export_value.call_args_list] == ['us-east-1', REGION]
+
+    @mock.patch('brume.exports.export_value', return_value='dev')
+    def test_unknown_config_region(self, export_value):
+        """Without a literal region in the configuration, the region must be passed."""
+        with mock.patch('click.secho') as secho:
+            with self.assertRaises(SystemExit):
+                Config.export('acme-env')
+        assert 'No region for export acme-env' in secho.call_args[0][0]
+        export_value.assert_not_called()
+
+    def test_rendered_config_region(self):
+        """The region of a templated configuration is the one it was rendered with."""
+        directory = tempfile.mkdtemp()
+        config_file = os.path.join(directory, 'brume.yml')
+        with open(config_file, 'w') as _file:
+            _file.write("region: {{ env('BRUME_TEST_REGION') }}\nstack: {stack_name: acme}\n")
+        Config.config = {}
+        try:
+            with mock.patch.dict(os.environ, BRUME_TEST_REGION='eu-west-1'):
+                Config.load(config_file, reload=True)
+                assert config.config_region is None
+                Config.load(config_file, reload=True)
+            assert config.config_region == 'eu-west-1'
+        finally:
+            shutil.rmtree(directory)
+            Config.config = {}
+            config.config_region = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import unittest
+
+import boto3
+from brume import gc
+from moto import mock_cloudformation, mock_s3
+
+REGION = 'us-east-1'
+BUCKET = 'acme-templates'
+
+
+class TestGc(unittest.TestCase):
+    """Test for brume.gc."""
+
+    def test_collected_prefixes(self):
+        self.assertEqual(gc.collected_prefixes(['acme-dev', 'acme-dev/assets']), ['acme-dev/'])
+        self.assertEqual(
+            gc.collected_prefixes(['/acme/dev/', 'acme/prod']), ['acme/dev/', 'acme/prod/']
+        )
+        self.assertEqual(
+            gc.collected_prefixes(['acme-dev', 'acme-dev2']), ['acme-dev/', 'acme-dev2/']
+        )
+        self.assertEqual(gc.collected_prefixes(['', '/']), [])
+
+    def test_is_garbage(self):
+        """Only the live keys are kept under the s3_path of the project."""
+        keys = {'dev/Main.yaml'}
+        own = ['dev']
+        self.assertFalse(gc.is_garbage('dev/Main.yaml', keys, own))
+        self.assertFalse(gc.is_garbage('/dev/Main.yaml', keys, own))
+        self.assertTrue(gc.is_garbage('dev/Main.yaml.copy', keys, own))
+        self.assertTrue(gc.is_garbage('dev/Old.yaml', keys, own))
+
+    def test_is_garbage_siblings(self):
+        """Under an explicit prefix, the prefixes of the existing stacks are kept."""
+        keys = {'acme/dev/Main.yaml'}
+        stacks = {'dev', 'prod'}
+        own = ['acme/dev']
+        self.assertFalse(gc.is_garbage('acme/dev/Main.yaml', keys, own, 'acme/', stacks))
+        self.assertTrue(gc.is_garbage('acme/dev/Old.yaml', keys, own, 'acme/', stacks))
+        self.assertFalse(gc.is_garbage('acme/prod/Main.yaml', keys, own, 'acme/', stacks))
+        self.assertTrue(gc.is_garbage('acme/feature/Main.yaml', keys, own, 'acme/', stacks))
+
+    def test_s3_references(self):
+        text = json.dumps(
+            {
+                'TemplateURL': 'https://acme-templates.s3.amazonaws.com/dev/Network.yaml',
+                'Script': 's3://acme-assets/dev/assets/init%20script.sh',
+                'Legacy': 'https://s3.eu-west-1.amazonaws.com/acme-templates/dev/Old.yaml',
+            }
+        )
+        self.assertEqual(
+            gc.s3_references(text),
+            {
+                ('acme-templates', 'dev/Network.yaml'),
+                ('acme-assets', 'dev/assets/init script.sh'),
+                ('acme-templates', 'dev/Old.yaml'),
+            },
+        )
+
+    @mock_cloudformation
+    def test_referenced_keys(self):
+        """The keys referenced by the templates and parameters of the stacks are live."""
+        client = boto3.client('cloudformation', region_name=REGION)
+        client.create_stack(
+            StackName='dev',
+            TemplateBody=json.dumps(
+                {
+                    'Parameters': {'Script': {'Type': 'String'}},
+                    'Resources': {'Topic': {'Type': 'AWS::SNS::Topic'}},
+                    'Outputs': {
+                        'Url': {'Value': 'https://{}.s3.amazonaws.com/dev/App.yaml'.format(BUCKET)}
+                    },
+                }
+            ),
+            Parameters=[{'ParameterKey': 'Script', 'ParameterValue': 's3://acme-assets/a.sh'}],
+        )
+        keys, strings = gc.referenced_keys(REGION, gc.live_stacks(REGION))
+        self.assertEqual(keys, {BUCKET: {'dev/App.yaml'}, 'acme-assets': {'a.sh'}})
+        self.assertIn('s3://acme-assets/a.sh', strings)
+
+    @mock_s3
+    @mock_cloudformation
+    def test_referenced_s3_key(self):
+        """An object named by a bucket and key pair (S3Key) is live."""
+        client = boto3.client('cloudformation', region_name=REGION)
+        client.create_stack(
+            StackName='dev',
+            TemplateBody=json.dumps(
+                {
+                    'Parameters': {'Artifact': {'Type': 'String'}},
+                    'Metadata': {'Code': {'S3Bucket': 'acme-assets', 'S3Key': 'dev/fn-v1.zip'}},
+                    'Resources': {'Topic': {'Type': 'AWS::SNS::Topic'}},
+                }
+            ),
+            Parameters=[{'ParameterKey': 'Artifact', 'ParameterValue': 'dev/fn-v2.zip'}],
+        )
+        s3 = boto3.client('s3', region_name=REGION)
+        s3.create_bucket(Bucket='acme-assets')
+        for key in ['dev/fn-v1.zip', 'dev/fn-v2.zip', 'dev/fn-v0.zip']:
+            s3.put_object(Bucket='acme-assets', Key=key, Body=b'')
+        _, strings = gc.referenced_keys(REGION, gc.live_stacks(REGION))
+        garbage = gc.collect_garbage(REGION, 'acme-assets', 'dev/', strings, ['dev'])
+        self.assertEqual([o['Key'] for o in garbage], ['dev/fn-v0.zip'])
+
+    @mock_s3
+    def test_collect_and_delete(self):
+        s3 = boto3.client('s3', region_name=REGION)
+        s3.create_bucket(Bucket=BUCKET)
+        for key in ['dev/Main.yaml', 'dev/Old.yaml', 'prod/Main.yaml', 'other/data.csv']:
+            s3.put_object(Bucket=BUCKET, Key=key, Body=b'{}')
+        garbage = gc.collect_garbage(REGION, BUCKET, 'dev/', {'dev/Main.yaml'}, ['dev'])
+        self.assertEqual([o['Key'] for o in garbage], ['dev/Old.yaml'])
+
+        self.assertEqual(gc.delete_objects(REGION, BUCKET, [o['Key'] for o in garbage]), {})
+        remaining = [o['Key'] for o in gc.list_objects(REGION, BUCKET, '')]
+        self.assertEqual(remaining, ['dev/Main.yaml', 'other/data.csv', 'prod/Main.yaml'])
+
+    @mock_s3
+    def test_delete_in_batches(self):
+        s3 = boto3.client('s3', region_name=REGION)
+        s3.create_bucket(Bucket=BUCKET)
+        keys = ['acme/old/{}.yaml'.format(i) for i in range(gc.DELETE_BATCH_SIZE + 5)]
+        for key in keys:
+            s3.put_object(Bucket=BUCKET, Key=key, Body=b'')
+        self.assertEqual(gc.delete_objects(REGION, BUCKET, keys), {})
+        self.assertEqual(list(gc.list_objects(REGION, BUCKET, 'acme/')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
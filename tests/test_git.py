@@ -0,0 +1,59 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from brume import git
+
+
+def _git(*args):
+    return subprocess.check_output(('git',) + args).decode('utf-8').strip()
+
+
+class TestGit(unittest.TestCase):
+    """Test for brume.git."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        _git('init', '-q', '-b', 'feature')
+        _git('-c', 'user.name=brume', '-c', 'user.email=brume@example.com',
+             'commit', '-q', '--allow-empty', '-m', 'Initial commit')
+        git._metadata.clear()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+        git._metadata.clear()
+
+    def test_metadata(self):
+        """Metadata is read from the .git directory."""
+        assert git.metadata() == {
+            'branch': 'feature',
+            'sha1': _git('rev-parse', 'HEAD'),
+            'subject': 'Initial commit',
+        }
+
+    def test_packed(self):
+        """Packed refs and objects are supported."""
+        _git('gc', '-q')
+        assert git.metadata() == {
+            'branch': 'feature',
+            'sha1': _git('rev-parse', 'HEAD'),
+            'subject': 'Initial commit',
+        }
+
+    def test_detached_head(self):
+        _git('checkout', '-q', '--detach')
+        assert git.metadata()['branch'] == 'HEAD'
+        assert git.metadata()['sha1'] == _git('rev-parse', 'HEAD')
+
+    def test_not_a_repository(self):
+        shutil.rmtree(os.path.join(self.directory, '.git'))
+        assert git.metadata() is None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+import boto3
+import click
+from brume.inventory import parse_tags, select_stacks
+from moto import mock_cloudformation
+
+REGION = 'eu-west-1'
+
+with open('tests/test_stack/main.json', 'r') as f:
+    TEMPLATE = f.read()
+
+
+class TestInventory(unittest.TestCase):
+    """Test for brume.inventory."""
+
+    def test_parse_tags(self):
+        assert parse_tags(['Env=pr', 'Team=ops=dev']) == {'Env': 'pr', 'Team': 'ops=dev'}
+        with self.assertRaises(click.BadParameter):
+            parse_tags(['Env'])
+
+    @mock_cloudformation
+    def test_select_stacks(self):
+        """Stacks can be selected by prefix and tags."""
+        client = boto3.client('cloudformation', region_name=REGION)
+        for name, env in [('pr-1', 'pr'), ('pr-2', 'pr'), ('main', 'prod')]:
+            client.create_stack(
+                StackName=name,
+                TemplateBody=TEMPLATE.replace('my-bucket', name),
+                Tags=[{'Key': 'Env', 'Value': env}],
+            )
+        assert sorted(s['StackName'] for s in select_stacks(REGION, prefix='pr-')) == ['pr-1', 'pr-2']
+        assert [s['StackName'] for s in select_stacks(REGION, tags={'Env': 'prod'})] == ['main']
+        assert len(list(select_stacks(REGION))) == 3
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from brume import config, lock
+from brume.cli import collect_templates
+from brume.config import Config
+
+CONFIG = {
+    'region': 'eu-west-1',
+    'stack': {'stack_name': 'acme', 'template_body': 'main.json', 'parameters': {'VpcId': 'vpc-1'}},
+    'templates': {'s3_bucket': 'acme-templates'},
+}
+
+
+class TestLock(unittest.TestCase):
+    """Test for brume.lock."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_file = self.path('brume.yml')
+        self.template = self.path('main.json')
+        self.lock_file = self.path(lock.DEFAULT_LOCK_FILE)
+        self.write(self.config_file, "VpcId: {{ cfn('eu-west-1', 'network', 'VpcId') }}\n")
+        self.write(self.template, '{"Resources": {}}')
+        with mock.patch('click.echo'):
+            lock.freeze(
+                self.lock_file,
+                self.config_file,
+                CONFIG,
+                [self.template],
+                {'network': {'VpcId': 'vpc-1'}},
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        config.lock = None
+        Config.config = {}
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def write(path, content):
+        with open(path, 'w') as _file:
+            _file.write(content)
+
+    def test_round_trip(self):
+        """The frozen configuration is loaded without rendering it nor calling AWS."""
+        config.lock = lock.load(self.lock_file)
+        with mock.patch.object(Config, 'render', side_effect=AssertionError('rendered')):
+            with mock.patch('brume.config.prefetch_outputs') as prefetch:
+                with mock.patch('brume.boto_client.boto_client') as boto_client:
+                    assert Config.load(reload=True) == CONFIG
+                    templates = collect_templates(Config.config)
+        prefetch.assert_not_called()
+        boto_client.assert_not_called()
+        assert [t.local_file_path for t in templates] == [self.template]
+        assert config.lock['outputs'] == {'network': {'VpcId': 'vpc-1'}}
+
+    def test_changed_template(self):
+        self.write(self.template, '{"Resources": {"Topic": {}}}')
+        with mock.patch('click.secho') as secho:
+            lock.load(self.lock_file)
+        assert 'Template {} changed'.format(self.template) in secho.call_args[0][0]
+
+    def test_changed_config(self):
+        """A lock file written for another version of the configuration is rejected."""
+        self.write(self.config_file, "VpcId: {{ cfn('eu-west-1', 'network', 'Vpc') }}\n")
+        with mock.patch('click.secho') as secho:
+            with self.assertRaises(SystemExit):
+                lock.load(self.lock_file)
+        assert 'brume.yml changed' in secho.call_args[0][0]
+
+    def test_unsupported_version(self):
+        with open(self.lock_file) as _file:
+            content = json.load(_file)
+        content['version'] = lock.LOCK_VERSION - 1
+        self.write(self.lock_file, json.dumps(content))
+        with mock.patch('click.secho'):
+            with self.assertRaises(SystemExit):
+                lock.load(self.lock_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import json
+import shutil
+import tempfile
+import sys
+import unittest
+from unittest import mock
+
+import boto3
+from botocore.exceptions import ClientError
+from brume import boto_client, cache
+from brume.output import StackOutputs, stack_outputs
+from moto import mock_cloudformation, mock_s3
+
+REGION = 'us-east-1'
+BUCKET = 'dummy-bucket'
+
+
+def _template(outputs, substacks=None):
+    resources = {'Topic': {'Type': 'AWS::SNS::Topic'}}
+    for name in substacks or []:
+        resources[name] = {
+            'Type': 'AWS::CloudFormation::Stack',
+            'Properties': {
+                'TemplateURL': 'https://{}.s3.amazonaws.com/{}.json'.format(BUCKET, name)
+            },
+        }
+    return json.dumps(
+        {
+            'Resources': resources,
+            'Outputs': {k: {'Value': v} for k, v in outputs.items()},
+        }
+    )
+
+
+def _create_stacks():
+    s3 = boto3.client('s3', region_name=REGION)
+    s3.create_bucket(Bucket=BUCKET)
+    s3.put_object(Bucket=BUCKET, Key='Vpc.json', Body=_template({'VpcId': 'vpc-1'}, ['Subnets']))
+    s3.put_object(Bucket=BUCKET, Key='Subnets.json', Body=_template({'SubnetId': 'subnet-1'}))
+    s3.put_object(Bucket=BUCKET, Key='App.json', Body=_template({'Url': 'https://app'}))
+    boto3.client('cloudformation', region_name=REGION).create_stack(
+        StackName='main', TemplateBody=_template({'Name': 'main'}, ['Vpc', 'App'])
+    )
+
+
+class TestOutput(unittest.TestCase):
+    """Test for brume.output."""
+
+    @mock_s3
+    @mock_cloudformation
+    def test_stack_outputs(self):
+        """Outputs of nested stacks are collected under their logical id."""
+        _create_stacks()
+        assert stack_outputs(REGION, 'main') == {
+            'Name': 'main',
+            'Vpc': {'VpcId': 'vpc-1', 'Subnets': {'SubnetId': 'subnet-1'}},
+            'App': {'Url': 'https://app'},
+        }
+
+    @unittest.skipIf(sys.version_info < boto_client.ASYNCIO_MIN_VERSION, 'requires Python 3.7')
+    @mock_s3
+    @mock_cloudformation
+    def test_stack_outputs_asyncio(self):
+        """The asyncio engine collects the same outputs."""
+        _create_stacks()
+        boto_client.engine = 'asyncio'
+        try:
+            outputs = stack_outputs(REGION, 'main')
+        finally:
+            boto_client.engine = 'threads'
+        assert outputs == {
+            'Name': 'main',
+            'Vpc': {'VpcId': 'vpc-1', 'Subnets': {'SubnetId': 'subnet-1'}},
+            'App': {'Url': 'https://app'},
+        }
+
+    @mock_s3
+    @mock_cloudformation
+    def test_lookup(self):
+        """Outputs of nested stacks can be looked up at any depth."""
+        _create_stacks()
+        outputs = StackOutputs(boto3.client('cloudformation', region_name=REGION), 'main')
+        assert outputs.lookup('Name') == 'main'
+        assert outputs.lookup('Vpc', 'Subnets', 'SubnetId') == 'subnet-1'
+        assert outputs.lookup('App') == {'Url': 'https://app'}
+        assert outputs.nested('App') is outputs.nested('App')
+        with self.assertRaises(KeyError):
+            outputs.lookup('Vpc', 'Missing')
+
+    @mock_s3
+    @mock_cloudformation
+    def test_to_dict_cached(self):
+        """The outputs of a whole stack are cached on disk like stack_outputs."""
+        _create_stacks()
+        directory = cache.directory
+        cache.directory = tempfile.mkdtemp()
+        try:
+            client = boto3.client('cloudformation', region_name=REGION)
+            expected = StackOutputs(client, 'main').lookup('Vpc')
+            outputs = stack_outputs(REGION, 'main')
+            with mock.patch('brume.output._stack_walker') as walker:
+                assert StackOutputs(client, 'main').lookup('Vpc') == expected
+                assert StackOutputs(client, 'main').to_dict() == outputs
+            walker.assert_not_called()
+        finally:
+            shutil.rmtree(cache.directory)
+            cache.directory = directory
+
+    def test_expire(self):
+        """Expired outputs are fetched again, the nested stacks until the stack is updated."""
+        client = mock.Mock()
+
+        def describe_stacks(StackName):
+            outputs = [{'OutputKey': 'Name', 'OutputValue': StackName + '-' + version[0]}]
+            return {'Stacks': [{'LastUpdatedTime': version[0], 'Outputs': outputs}]}
+
+        version = ['1']
+        client.describe_stacks.side_effect = describe_stacks
+        client.describe_stack_resource.return_value = {
+            'StackResourceDetail': {
+                'ResourceType': 'AWS::CloudFormation::Stack',
+                'PhysicalResourceId': 'vpc',
+            }
+        }
+        outputs = StackOutputs(client, 'main')
+        assert outputs.lookup('Vpc', 'Name') == 'vpc-1'
+        outputs.expire()
+        version[0] = '2'
+        assert outputs.lookup('Name') == 'main-2'
+        assert client.describe_stack_resource.call_count == 1
+        assert outputs.lookup('Vpc', 'Name') == 'vpc-2'
+        assert client.describe_stack_resource.call_count == 2
+        outputs.expire()
+        assert outputs.lookup('Vpc', 'Name') == 'vpc-2'
+        assert client.describe_stack_resource.call_count == 2
+        assert client.describe_stacks.call_count == 5
+
+    def test_nested_error(self):
+        """Only a missing nested stack is reported as a missing key."""
+        client = mock.Mock()
+        client.describe_stack_resource.side_effect = ClientError(
+            {'Error': {'Code': 'ValidationError', 'Message': 'Resource Vpc does not exist'}},
+            'DescribeStackResource',
+        )
+        assert StackOutputs(client, 'main').nested('Vpc') is None
+        client.describe_stack_resource.side_effect = ClientError(
+            {'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}}, 'DescribeStackResource'
+        )
+        with self.assertRaises(ClientError):
+            StackOutputs(client, 'main').nested('Vpc')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from moto import mock_cloudformation
+
+from brume import profiling
+from brume.boto_client import cfn_client
+
+
+class TestProfiling(unittest.TestCase):
+    """Test for brume.profiling."""
+
+    def setUp(self):
+        profiling.enable()
+
+    def tearDown(self):
+        profiling.reset()
+
+    def test_phase(self):
+        with profiling.phase('config.load'):
+            pass
+        with profiling.phase('config.load'):
+            pass
+        phases = profiling.summary()['phases']
+        assert [(p['name'], p['count']) for p in phases] == [('config.load', 2)]
+
+    @mock_cloudformation
+    def test_api_calls(self):
+        """API calls are counted by service, operation and outcome."""
+        client = cfn_client('eu-west-1')
+        client.list_stacks()
+        client.list_stacks()
+        calls = profiling.summary()['calls']
+        assert [(c['service'], c['operation'], c['outcome'], c['count']) for c in calls] == [
+            ('cloudformation', 'ListStacks', 'ok', 2)
+        ]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+
+from brume import config
+from brume.config import PENDING_OUTPUT, Config
+from brume.project import Project
+
+CONFIG = {
+    'region': 'eu-west-1',
+    'stacks': {
+        'network': {'stack_name': 'acme-network', 'template_body': 'network.json'},
+        'data': {
+            'stack_name': 'acme-data',
+            'template_body': 'data.json',
+            'parameters': {'VpcId': PENDING_OUTPUT.format('acme-network')},
+        },
+        'app': {
+            'stack_name': 'acme-app',
+            'template_body': 'app.json',
+            'depends_on': ['data'],
+        },
+        'monitoring': {'stack_name': 'acme-monitoring', 'template_body': 'monitoring.json'},
+    },
+}
+
+
+class TestProject(unittest.TestCase):
+    """Test for brume.Project."""
+
+    def test_dependencies(self):
+        """Dependencies are declared explicitly or inferred from cfn lookups."""
+        dependencies = Project('eu-west-1', CONFIG).dependencies()
+        assert dependencies['network'] == set()
+        assert dependencies['data'] == {'network'}
+        assert dependencies['app'] == {'data'}
+
+    def test_waves(self):
+        """Independent stacks are grouped in the same wave."""
+        waves = Project('eu-west-1', CONFIG).waves()
+        assert waves == [['monitoring', 'network'], ['data'], ['app']]
+
+    def test_circular_dependency(self):
+        conf = {
+            'stacks': {
+                'a': {'stack_name': 'a', 'template_body': 'a.json', 'depends_on': ['b']},
+                'b': {'stack_name': 'b', 'template_body': 'b.json', 'depends_on': ['a']},
+            }
+        }
+        with self.assertRaises(SystemExit):
+            Project('eu-west-1', conf).waves()
+
+    def test_select_defers_undeployed_siblings(self):
+        """Only the dependencies of the selected stack and the deployed stacks are resolved."""
+        project = Project('eu-west-1', CONFIG)
+        deployed = {'acme-network'}
+
+        def _load(*_args, **_kwargs):
+            self.assertEqual(config.deferred_stacks, {'acme-app', 'acme-data', 'acme-monitoring'})
+            return CONFIG
+
+        templates = {'templates': {'s3_bucket': 'acme-templates'}}
+        with mock.patch('brume.project.Stack.exists', side_effect=lambda n: n in deployed):
+            with mock.patch('brume.project.Config.load', side_effect=_load):
+                with mock.patch.object(Config, 'config', templates):
+                    stack = project.select('data')
+        self.assertEqual(stack.stack_name, 'acme-data')
+        config.deferred_stacks = set()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from brume import ratelimit
+
+REGION = 'us-east-1'
+
+
+class TestRateLimit(unittest.TestCase):
+    """Test for brume.ratelimit."""
+
+    def setUp(self):
+        ratelimit.reset()
+
+    def tearDown(self):
+        ratelimit.reset()
+
+    def test_token_bucket(self):
+        bucket = ratelimit.TokenBucket(rate=50, burst=2)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        # the burst is free, the next tokens come at 50 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.035)
+
+    def test_aimd(self):
+        bucket = ratelimit.TokenBucket(rate=10)
+        bucket.penalize()
+        bucket.penalize()
+        self.assertEqual(bucket.rate, 2.5)
+        self.assertLessEqual(bucket.tokens, 0)
+        for _ in range(100):
+            bucket.reward()
+        self.assertEqual(bucket.rate, 10)
+
+    def test_priority(self):
+        bucket = ratelimit.TokenBucket(rate=20, burst=1)
+        bucket.acquire()
+        order = []
+
+        def _acquire(level):
+            bucket.acquire(level)
+            order.append(level)
+
+        background = threading.Thread(target=_acquire, args=(ratelimit.BACKGROUND,))
+        interactive = threading.Thread(target=_acquire, args=(ratelimit.INTERACTIVE,))
+        background.start()
+        time.sleep(0.01)
+        interactive.start()
+        background.join()
+        interactive.join()
+        self.assertEqual(order, [ratelimit.INTERACTIVE, ratelimit.BACKGROUND])
+
+    def test_priority_context(self):
+        self.assertEqual(ratelimit.current_priority(), ratelimit.NORMAL)
+        with ratelimit.priority(ratelimit.BACKGROUND):
+            self.assertEqual(ratelimit.current_priority(), ratelimit.BACKGROUND)
+        self.assertEqual(ratelimit.current_priority(), ratelimit.NORMAL)
+
+    def test_throttled_call(self):
+        client = boto3.client('cloudformation', region_name=REGION)
+        operation = client.meta.service_model.operation_model('DescribeStacks')
+        response = (None, {'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}})
+        ratelimit._needs_retry(response, operation)
+        bucket = ratelimit.bucket('cloudformation', 'DescribeStacks')
+        self.assertEqual(bucket.rate, ratelimit.RATES['cloudformation.DescribeStacks'] / 2)
+        self.assertIsNone(ratelimit.bucket('s3', 'PutObject'))
+
+    def test_throttled_retries(self):
+        """Every attempt takes a token, and every throttled attempt halves the rate once."""
+        client = ratelimit.instrument(
+            boto3.client(
+                'cloudformation',
+                region_name=REGION,
+                aws_access_key_id='testing',
+                aws_secret_access_key='testing',
+                config=Config(retries={'mode': 'standard', 'max_attempts': 3}),
+            )
+        )
+        body = (
+            b'<ErrorResponse><Error><Type>Sender</Type><Code>Throttling</Code>'
+            b'<Message>Rate exceeded</Message></Error></ErrorResponse>'
+        )
+
+        class _Raw:
+            def stream(self, **_kwargs):
+                yield body
+
+        response = AWSResponse('https://cloudformation', 400, {}, _Raw())
+        with mock.patch('botocore.endpoint.Endpoint._send', return_value=response) as send:
+            with mock.patch('botocore.endpoint.time.sleep'):
+                with mock.patch.object(
+                    ratelimit.TokenBucket, 'acquire', autospec=True
+                ) as acquire:
+                    with self.assertRaises(ClientError):
+                        client.describe_stacks()
+        self.assertGreater(send.call_count, 1)
+        self.assertEqual(acquire.call_count, send.call_count)
+        bucket = ratelimit.bucket('cloudformation', 'DescribeStacks')
+        self.assertEqual(
+            bucket.rate, ratelimit.RATES['cloudformation.DescribeStacks'] / 2 ** send.call_count
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from brume.snapshot import Snapshot
+
+ROOT_ID = 'arn:aws:cloudformation:eu-west-1:123456789012:stack/main/1'
+VPC_ID = 'arn:aws:cloudformation:eu-west-1:123456789012:stack/main-Vpc-1A2B3C/2'
+SUBNETS_ID = 'arn:aws:cloudformation:eu-west-1:123456789012:stack/main-Vpc-1A2B3C-Subnets-4D5E/3'
+
+
+def _stack(stack_id, outputs, parent=None, parameters=None):
+    return {
+        'StackId': stack_id,
+        'StackName': stack_id.split('/')[1],
+        'ParentId': parent,
+        'RootId': ROOT_ID if parent else None,
+        'Outputs': [{'OutputKey': k, 'OutputValue': v} for k, v in outputs.items()],
+        'Parameters': [{'ParameterKey': k, 'ParameterValue': v} for k, v in (parameters or {}).items()],
+    }
+
+
+STACKS = [
+    _stack(ROOT_ID, {'Name': 'main'}, parameters={'Env': 'dev'}),
+    _stack(VPC_ID, {'VpcId': 'vpc-1'}, parent=ROOT_ID, parameters={'Cidr': '10.0.0.0/16'}),
+    _stack(SUBNETS_ID, {'SubnetId': 'subnet-1'}, parent=VPC_ID),
+    _stack('arn:aws:cloudformation:eu-west-1:123456789012:stack/other/4', {'Name': 'other'}),
+]
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test for brume.snapshot.Snapshot."""
+
+    def setUp(self):
+        self.snapshot = Snapshot('eu-west-1', STACKS)
+
+    def test_outputs(self):
+        """Outputs resolved from a snapshot have the same shape as stack_outputs."""
+        assert self.snapshot.outputs('main') == {
+            'Name': 'main',
+            'Vpc': {'VpcId': 'vpc-1', 'Subnets': {'SubnetId': 'subnet-1'}},
+        }
+        assert self.snapshot.outputs('main', nested=False) == {'Name': 'main'}
+
+    def test_parameters(self):
+        assert self.snapshot.parameters('main') == {
+            'main': {'Env': 'dev'},
+            VPC_ID: {'Cidr': '10.0.0.0/16'},
+        }
+
+    def test_missing_stack(self):
+        with self.assertRaises(SystemExit):
+            self.snapshot.find('missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
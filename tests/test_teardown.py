@@ -0,0 +1,77 @@
+import io
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+import click
+from brume import teardown
+
+STACK_ID = 'arn:aws:cloudformation:eu-west-1:123456789012:stack/acme/1'
+
+
+def summary(status, reason=None):
+    stack = {'StackId': STACK_ID, 'StackName': 'acme', 'StackStatus': status}
+    if reason:
+        stack['StackStatusReason'] = reason
+    return stack
+
+
+def event(event_id):
+    return {'EventId': event_id, 'PhysicalResourceId': STACK_ID}
+
+
+class TestTeardown(unittest.TestCase):
+    """Test for brume.teardown."""
+
+    def test_parse_age(self):
+        self.assertEqual(teardown.parse_age('30m'), timedelta(minutes=30))
+        self.assertEqual(teardown.parse_age('12h'), timedelta(hours=12))
+        self.assertEqual(teardown.parse_age('7d'), timedelta(days=7))
+        self.assertEqual(teardown.parse_age('2w'), timedelta(weeks=2))
+        for value in ['7', 'd', '7y', '-7d', None]:
+            with self.assertRaises(click.BadParameter):
+                teardown.parse_age(value)
+
+    def wait(self, polls, events=None, previous_failures=None):
+        client = mock.Mock()
+        client.get_paginator.return_value.paginate.side_effect = [
+            [{'StackSummaries': stacks}] for stacks in polls
+        ]
+        client.describe_stack_events.side_effect = [
+            {'StackEvents': [event(e)]} for e in events or []
+        ]
+        with mock.patch('brume.teardown.cfn_client', return_value=client):
+            with mock.patch('sys.stdout', new_callable=io.StringIO):
+                failed = teardown.wait_for_deletion(
+                    'eu-west-1', [STACK_ID], 0, previous_failures
+                )
+        return failed, client
+
+    def test_wait_for_deletion(self):
+        failed, client = self.wait([[summary('DELETE_IN_PROGRESS')], []])
+        self.assertEqual(failed, {})
+        self.assertEqual(client.get_paginator.return_value.paginate.call_count, 2)
+
+    def test_wait_for_failed_deletion(self):
+        failed, _ = self.wait([[summary('DELETE_FAILED', 'Bucket not empty')]])
+        self.assertEqual(failed, {'acme': 'Bucket not empty'})
+
+    def test_ignore_previous_failure(self):
+        """The DELETE_FAILED status of a previous deletion is not reported."""
+        failed, client = self.wait(
+            [[summary('DELETE_FAILED', 'old')], [summary('DELETE_FAILED', 'new')]],
+            events=['1', '2'],
+            previous_failures={STACK_ID: '1'},
+        )
+        self.assertEqual(failed, {'acme': 'new'})
+        self.assertEqual(client.describe_stack_events.call_count, 2)
+
+    def test_previous_failure_deleted(self):
+        failed, _ = self.wait(
+            [[summary('DELETE_IN_PROGRESS')], []], previous_failures={STACK_ID: '1'}
+        )
+        self.assertEqual(failed, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
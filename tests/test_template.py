@@ -1,9 +1,12 @@
+import json
 import os
+import shutil
+import tempfile
 import unittest
 
 import boto3
 import pytest
-from brume.template import Template
+from brume.template import Template, reachable_templates
 from moto import mock_s3
 
 CONFIG = {
@@ -81,5 +84,43 @@ class TestTemplate(unittest.TestCase):
         assert self.template.validate()
 
 
+class TestReachableTemplates(unittest.TestCase):
+    """Test for brume.template.reachable_templates."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self._write('Main.json', json.dumps({'Resources': {
+            'Network': {'Type': 'AWS::CloudFormation::Stack', 'Properties': {
+                'TemplateURL': {'Fn::Join': ['/', ['https://bucket.s3.amazonaws.com', 'cfn', 'Vpc.json']]},
+            }},
+            'App': {'Type': 'AWS::CloudFormation::Stack', 'Properties': {
+                'TemplateURL': {'Fn::Sub': 'https://${Bucket}.s3.amazonaws.com/cfn/App.yml'},
+            }},
+        }}))
+        self._write('Vpc.json', json.dumps({'Resources': {}}))
+        self._write('App.yml', 'Resources:\n  Queue:\n    Type: AWS::SQS::Queue\n'
+                    '    Properties:\n      QueueName: !Sub "${AWS::StackName}-queue"\n'
+                    '  Db:\n    Type: AWS::CloudFormation::Stack\n'
+                    '    Properties:\n      TemplateURL: !Sub "${Url}/Db.json"\n')
+        self._write('Db.json', json.dumps({'Resources': {}}))
+        self._write('Draft.json', json.dumps({'Resources': {}}))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(content)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_reachable_templates(self):
+        """Only templates reachable through nested stacks are selected."""
+        paths = [self._path(n) for n in ['App.yml', 'Db.json', 'Draft.json', 'Main.json', 'Vpc.json']]
+        reachable = reachable_templates([self._path('Main.json')], paths)
+        assert sorted(reachable) == [self._path(n) for n in ['App.yml', 'Db.json', 'Main.json', 'Vpc.json']]
+
+
 if __name__ == '__main__':
     unittest.main()
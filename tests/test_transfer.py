@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+import boto3
+from brume import transfer
+from moto import mock_s3
+
+REGION = 'us-east-1'
+BUCKET = 'acme-assets'
+PART_SIZE = 5 * 1024 * 1024
+
+
+class TestTransfer(unittest.TestCase):
+    """Test for brume.transfer."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        transfer.journal_path = os.path.join(self.directory, 'journal.json')
+        transfer.reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        transfer.journal_path = None
+        transfer.reset()
+
+    def journal(self):
+        with open(transfer.journal_path) as _file:
+            return json.load(_file)
+
+    @mock_s3
+    def test_skip_uploaded(self):
+        s3 = boto3.client('s3', region_name=REGION)
+        s3.create_bucket(Bucket=BUCKET)
+        self.assertFalse(transfer.uploaded(REGION, BUCKET, 'a/b.sh', 'echo'))
+        transfer.put_object(REGION, BUCKET, 'a/b.sh', 'echo')
+
+        transfer.reset()
+        self.assertTrue(transfer.uploaded(REGION, BUCKET, 'a/b.sh', 'echo'))
+        self.assertTrue(transfer.uploaded(REGION, BUCKET, 'a/b.sh', b'echo'))
+        self.assertFalse(transfer.uploaded(REGION, BUCKET, 'a/b.sh', 'echo changed'))
+        self.assertEqual(s3.get_object(Bucket=BUCKET, Key='a/b.sh')['Body'].read(), b'echo')
+
+    def test_record_copies(self):
+        """The journal entries are never changed outside of the lock."""
+        upload = dict(UploadId='1', md5='abc', parts={})
+        transfer._record('uploads', 'acme-assets/a.zip', upload)
+        upload['parts']['1'] = 'etag-1'
+        self.assertEqual(transfer._entry('uploads', 'acme-assets/a.zip')['parts'], {})
+        entry = transfer._entry('uploads', 'acme-assets/a.zip')
+        entry['parts']['2'] = 'etag-2'
+        self.assertEqual(self.journal()['uploads']['acme-assets/a.zip']['parts'], {})
+
+    @mock_s3
+    def test_uploaded_object_changed(self):
+        """An object deleted or changed since it was journaled is uploaded again."""
+        s3 = boto3.client('s3', region_name=REGION)
+        s3.create_bucket(Bucket=BUCKET)
+        transfer.put_object(REGION, BUCKET, 'a/b.sh', 'echo')
+        s3.put_object(Bucket=BUCKET, Key='a/b.sh', Body=b'echo other')
+        self.assertFalse(transfer.uploaded(REGION, BUCKET, 'a/b.sh', 'echo'))
+        s3.delete_object(Bucket=BUCKET, Key='a/b.sh')
+        self.assertFalse(transfer.uploaded(REGION, BUCKET, 'a/b.sh', 'echo'))
+
+    @mock_s3
+    @mock.patch('brume.transfer.PART_SIZE', PART_SIZE)
+    @mock.patch('brume.transfer.MULTIPART_THRESHOLD', PART_SIZE)
+    @mock.patch('brume.transfer.ORPHAN_TIMEOUT', timedelta(days=36500))
+    def test_resume_multipart_upload(self):
+        s3 = boto3.client('s3', region_name=REGION)
+        s3.create_bucket(Bucket=BUCKET)
+        body = b'0' * PART_SIZE + b'1' * PART_SIZE + b'2' * 10
+
+        # interrupted after the first part
+        upload_part = s3.upload_part
+
+        def _interrupted(**kwargs):
+            if kwargs['PartNumber'] > 1:
+                raise KeyboardInterrupt()
+            return upload_part(**kwargs)
+
+        with mock.patch('brume.transfer.s3_client', return_value=s3):
+            with mock.patch.object(s3, 'upload_part', side_effect=_interrupted):
+                with self.assertRaises(KeyboardInterrupt):
+                    transfer.put_object(REGION, BUCKET, 'large.zip', body)
+        uploads = self.journal()['uploads']
+        self.assertEqual(list(uploads['{}/large.zip'.format(BUCKET)]['parts']), ['1'])
+
+        # resumed from the second part
+        transfer.reset()
+        with mock.patch('brume.transfer.s3_client', return_value=s3):
+            with mock.patch.object(s3, 'upload_part', wraps=s3.upload_part) as upload_part:
+                transfer.put_object(REGION, BUCKET, 'large.zip', body)
+        self.assertEqual([c[1]['PartNumber'] for c in upload_part.call_args_list], [2, 3])
+        self.assertEqual(s3.get_object(Bucket=BUCKET, Key='large.zip')['Body'].read(), body)
+        self.assertEqual(self.journal()['uploads'], {})
+        self.assertTrue(transfer.uploaded(REGION, BUCKET, 'large.zip', body))
+
+    @mock_s3
+    def test_abort_orphaned_uploads(self):
+        """Only the multipart uploads of the journal are aborted."""
+        s3 = boto3.client('s3', region_name=REGION)
+        s3.create_bucket(Bucket=BUCKET)
+        upload = s3.create_multipart_upload(Bucket=BUCKET, Key='orphan.zip')
+        s3.create_multipart_upload(Bucket=BUCKET, Key='other-tool.zip')
+        self.assertEqual(transfer.abort_orphaned_uploads(REGION, BUCKET), [])
+        transfer._record(
+            'uploads',
+            '{}/orphan.zip'.format(BUCKET),
+            dict(UploadId=upload['UploadId'], md5='', parts={}),
+        )
+        # moto initiates every upload in 2010
+        recent = transfer.abort_orphaned_uploads(REGION, BUCKET, timedelta(days=36500))
+        self.assertEqual(recent, [])
+        self.assertEqual(transfer.abort_orphaned_uploads(REGION, BUCKET), ['orphan.zip'])
+        uploads = s3.list_multipart_uploads(Bucket=BUCKET)['Uploads']
+        self.assertEqual([u['Key'] for u in uploads], ['other-tool.zip'])
+
+
+if __name__ == '__main__':
+    unittest.main()